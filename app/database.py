@@ -1,12 +1,65 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+
+# DB_PROFILE=production turns on WAL, relaxed fsync, mmap, a larger page
+# cache and busy waiting, and sizes/warms the connection pool.
+# DB_PROFILE=default keeps the plain driver settings.
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)), # negative = KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "temp_store": "MEMORY",
+}
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, profile: str = DB_PROFILE):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    if profile != "production":
+        return create_engine(url, connect_args=connect_args)
+
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    )
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, record):
+            cursor = dbapi_conn.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+    return engine
+
+
+def warm_up(engine, connections: int = None):
+    """Open (and return to the pool) enough connections to serve the first burst of requests."""
+    if not isinstance(engine.pool, QueuePool):
+        return
+    held = []
+    try:
+        for _ in range(connections or engine.pool.size()):
+            conn = engine.connect()
+            conn.exec_driver_sql("SELECT 1")
+            held.append(conn)
+    finally:
+        for conn in held:
+            conn.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
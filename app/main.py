@@ -5,11 +5,13 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from datetime import date
 
-from app.database import get_db, engine, Base
+from app.database import get_db, engine, Base, DB_PROFILE, warm_up
 from app.models import Project, Employee, Customer, ProjectStatus, ProjectAssignment
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+if DB_PROFILE == "production":
+    warm_up(engine)
 
 app = FastAPI()
 templates = Jinja2Templates(directory="app/templates")
@@ -0,0 +1,120 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .clients import fetch_errors
+
+CACHE_TTL = float(os.getenv("BFF_CACHE_TTL", 60))
+CACHE_SIZE = int(os.getenv("BFF_CACHE_SIZE", 256))
+
+
+class _Entry:
+    __slots__ = ("body", "media_type", "etag", "tags", "expires")
+
+    def __init__(self, body: bytes, media_type: str, tags: set, ttl: float):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self.tags = tags
+        self.expires = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """TTL + LRU cache of rendered pages, invalidated by change topics.
+
+    Each entry carries the topics it was built from ("projects", "project:5",
+    "employees", ...); `invalidate(topics)` drops exactly the entries sharing
+    one of them. The TTL is only a backstop for missed notifications.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._by_tag = {} # topic -> set of keys
+
+    def get(self, key) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: _Entry):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, topics: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for topic in topics:
+                keys |= self._by_tag.get(topic, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+response_cache = ResponseCache()
+
+
+def cached(tags: Callable[..., Iterable[str]]):
+    """Cache a GET page per path + query string, answering If-None-Match with 304.
+
+    `tags` receives the route's keyword arguments and returns the change
+    topics the page depends on.
+    """
+    def decorator(route):
+        @functools.wraps(route)
+        async def wrapper(request: Request, **kwargs):
+            key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+            entry = response_cache.get(key)
+            if entry is None:
+                errors = []
+                token = fetch_errors.set(errors)
+                try:
+                    response = await route(request, **kwargs)
+                finally:
+                    fetch_errors.reset(token)
+                if response.status_code != 200 or errors:
+                    return response
+                entry = _Entry(response.body, response.media_type, set(tags(**kwargs)), response_cache.ttl)
+                response_cache.put(key, entry)
+            headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+            if entry.etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+                return Response(status_code=304, headers=headers)
+            return Response(entry.body, media_type=entry.media_type, headers=headers)
+        return wrapper
+    return decorator
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import httpx
+
+RESOURCE_SERVICE_URL = os.getenv("RESOURCE_SERVICE_URL", "http://resource-service:8000")
+PROJECT_SERVICE_URL = os.getenv("PROJECT_SERVICE_URL", "http://project-service:8000")
+
+
+def _service_config(prefix: str, base_url: str) -> dict:
+    # Per-service pool/timeouts, overridable e.g. PROJECT_SERVICE_MAX_CONNECTIONS=50
+    env = lambda key, default: os.getenv(f"{prefix}_SERVICE_{key}", default)
+    return {
+        "base_url": base_url,
+        "limits": httpx.Limits(
+            max_connections=int(env("MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(env("MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(env("KEEPALIVE_EXPIRY", 30.0)),
+        ),
+        "timeout": httpx.Timeout(
+            float(env("TIMEOUT", 10.0)),
+            connect=float(env("CONNECT_TIMEOUT", 2.0)),
+        ),
+    }
+
+
+SERVICES = {
+    "resource": _service_config("RESOURCE", RESOURCE_SERVICE_URL),
+    "project": _service_config("PROJECT", PROJECT_SERVICE_URL),
+}
+
+
+class ClientRegistry:
+    """One pooled AsyncClient per downstream service, shared by all requests."""
+
+    def __init__(self, services: dict):
+        self._services = services
+        self._clients = {}
+
+    async def start(self):
+        for name, conf in self._services.items():
+            self._clients[name] = httpx.AsyncClient(**conf)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(c.aclose() for c in clients.values()))
+
+    def __getitem__(self, name: str) -> httpx.AsyncClient:
+        if name not in self._clients:
+            # Outside the lifespan (e.g. scripts/tests) create lazily
+            self._clients[name] = httpx.AsyncClient(**self._services[name])
+        return self._clients[name]
+
+
+clients = ClientRegistry(SERVICES)
+
+# Per-request list of failed downstream calls; pages rendered with fallbacks are not cached
+fetch_errors: ContextVar[list] = ContextVar("fetch_errors", default=None)
+
+
+def note_failure(message: str):
+    print(message)
+    errors = fetch_errors.get()
+    if errors is not None:
+        errors.append(message)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await clients.start()
+    try:
+        yield
+    finally:
+        await clients.close()
+
+
+class RevalidationStore:
+    """Last body + ETag per downstream GET, so unchanged payloads come back as 304s."""
+
+    def __init__(self, maxsize: int = int(os.getenv("BFF_REVALIDATION_SIZE", 512))):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    @staticmethod
+    def key(service: str, path: str, params) -> tuple:
+        items = params.items() if isinstance(params, dict) else (params or [])
+        return (service, path, tuple(sorted((k, str(v)) for k, v in items)))
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, etag: str, content: bytes):
+        self._entries[key] = (etag, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+revalidation = RevalidationStore()
+
+
+async def get_json(service: str, path: str, default=None, **kwargs):
+    """GET a JSON body, falling back to `default` on errors or non-200s.
+
+    Bodies served with an ETag are kept and revalidated with If-None-Match;
+    every call parses a fresh copy, so callers may mutate the result.
+    """
+    key = revalidation.key(service, path, kwargs.get("params"))
+    stored = revalidation.get(key)
+    if stored:
+        kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": stored[0]}
+    try:
+        resp = await clients[service].get(path, **kwargs)
+    except httpx.HTTPError as e:
+        note_failure(f"{service} GET {path} failed: {e}")
+        return default
+    if resp.status_code == 304 and stored:
+        return json.loads(stored[1])
+    if resp.status_code != 200:
+        note_failure(f"{service} GET {path} returned {resp.status_code}")
+        return default
+    if "etag" in resp.headers:
+        revalidation.put(key, resp.headers["etag"], resp.content)
+    return resp.json()
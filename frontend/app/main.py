@@ -1,114 +1,76 @@
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from pydantic import BaseModel
+from typing import List
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.templating import Jinja2Templates
+import asyncio
 import httpx
-from datetime import date, timedelta
+from datetime import date
 
-app = FastAPI()
+from .cache import cached, response_cache
+from .clients import clients, get_json, lifespan, note_failure
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="app/templates")
 
-RESOURCE_SERVICE_URL = "http://resource-service:8000"
-PROJECT_SERVICE_URL = "http://project-service:8000"
+# Mock customers for now (Project Service only stores customer_id)
+CUSTOMERS = [{"id": 1, "name": "株式会社A", "industry": "IT"}, {"id": 2, "name": "株式会社B", "industry": "IT"}]
+CUSTOMER_MAP = {c["id"]: c for c in CUSTOMERS}
+PAGE_SIZE = 50
+
+async def fetch_projects_page(params: dict):
+    try:
+        resp = await clients["project"].get("/projects/", params=params)
+        if resp.status_code == 200:
+            return resp.json(), resp.headers.get("X-Next-Cursor")
+    except httpx.HTTPError as e:
+        note_failure(f"Error fetching projects: {e}")
+    return [], None
 
 @app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request):
-    # In microservices, we might need a dedicated Customer Service or fetch from Project Service
-    # Assuming Project Service handles projects and basic customer info for now
-    # We need an endpoint in Project Service to list projects
-    # Let's mock the data fetching or assume we add list endpoint to Project Service
-    # Ideally: GET PROJECT_SERVICE_URL/projects
-    
-    # Check if Project Service has list endpoint. We added POST /projects/ but maybe not GET list in TDD step?
-    # Let's assume we need to add it or it exists.
-    # Quick fix: Add GET /projects to Project Service.
-    
-    async with httpx.AsyncClient() as client:
-        # Try to fetch projects. If fail, show empty list.
-        try:
-            resp = await client.get(f"{PROJECT_SERVICE_URL}/projects/") # Need to ensure this exists
-            projects = resp.json() if resp.status_code == 200 else []
-        except:
-            projects = []
-            
-    return templates.TemplateResponse("dashboard.html", {"request": request, "projects": projects})
-
-from calendar import monthrange
-
-# ... imports ...
+@cached(lambda **_: ["projects", "dashboard"])
+async def dashboard(request: Request, after: int = None):
+    # One keyset page of project summaries per view keeps latency flat as the portfolio grows;
+    # the KPIs come precomputed from project-service's dashboard snapshot
+    params = {"view": "summary", "limit": PAGE_SIZE}
+    if after:
+        params["after"] = after
+    (projects, next_cursor), summary = await asyncio.gather(
+        fetch_projects_page(params),
+        get_json("project", "/dashboard", default=None),
+    )
+
+    for p in projects:
+        p["customer"] = CUSTOMER_MAP.get(p["customer_id"], {"name": "-"})
+    return templates.TemplateResponse("dashboard.html", {
+        "request": request, "projects": projects, "next_cursor": next_cursor, "summary": summary
+    })
 
 @app.get("/employees", response_class=HTMLResponse)
+@cached(lambda **_: ["employees", "utilization"])
 async def employee_list(request: Request, q: str = None):
-    async with httpx.AsyncClient() as client:
-        params = {"skill": q} if q else {}
-        resp = await client.get(f"{RESOURCE_SERVICE_URL}/employees/", params=params)
-        employees = resp.json() if resp.status_code == 200 else []
-        
-        today = date.today()
-        # approx 6 months end
-        end_date = today + timedelta(days=180) 
-        
-        try:
-            # Fetch daily allocations
-            alloc_resp = await client.get(f"{PROJECT_SERVICE_URL}/allocations", params={"start_date": today.isoformat(), "end_date": str(end_date)})
-            allocations = alloc_resp.json() if alloc_resp.status_code == 200 else []
-            
-            assign_resp = await client.get(f"{PROJECT_SERVICE_URL}/assignments")
-            assignments = assign_resp.json() if assign_resp.status_code == 200 else []
-            assign_map = {a['id']: a['employee_id'] for a in assignments}
-            
-            # Heatmap Aggregation (Daily to Monthly Average)
-            heatmap_map = {} # {emp_id: { "2026-04": 75, ... }}
-            
-            # Helper to generate month keys for the next 6 months
-            target_months = []
-            curr = today.replace(day=1)
-            for _ in range(6):
-                _, last_day = monthrange(curr.year, curr.month)
-                target_months.append({
-                    "key": curr.strftime("%Y-%m"),
-                    "year": curr.year,
-                    "month": curr.month,
-                    "days": last_day,
-                    "start": curr,
-                    "end": curr.replace(day=last_day)
-                })
-                if curr.month == 12:
-                    curr = curr.replace(year=curr.year+1, month=1)
-                else:
-                    curr = curr.replace(month=curr.month+1)
-
-            for alloc in allocations:
-                emp_id = assign_map.get(alloc['assignment_id'])
-                if not emp_id: continue
-                if emp_id not in heatmap_map: heatmap_map[emp_id] = {}
-                
-                alloc_start = date.fromisoformat(alloc['start_date'])
-                alloc_end = date.fromisoformat(alloc['end_date'])
-                
-                for tm in target_months:
-                    # Calculate overlap days
-                    overlap_start = max(alloc_start, tm["start"])
-                    overlap_end = min(alloc_end, tm["end"])
-                    
-                    if overlap_start <= overlap_end:
-                        overlap_days = (overlap_end - overlap_start).days + 1
-                        monthly_contribution = (overlap_days / tm["days"]) * alloc['effort_percent']
-                        
-                        heatmap_map[emp_id][tm["key"]] = heatmap_map[emp_id].get(tm["key"], 0) + monthly_contribution
-                        
-        except Exception as e:
-            print(f"Error calculating heatmap: {e}")
-            heatmap_map = {}
-            target_months = [] # Fallback
-
-        month_headers = [m["key"] for m in target_months] if target_months else []
-
-        for emp in employees:
-            emp_map = heatmap_map.get(emp['id'], {})
-            emp['heatmap'] = []
-            for m in month_headers:
-                percent = round(emp_map.get(m, 0)) # Round to nearest integer
-                emp['heatmap'].append({"label": m, "percent": percent})
+    # Heatmap (6 months from the current month) is aggregated by project-service
+    util_params = {"from": date.today().isoformat(), "months": 6}
+    if q:
+        employees = await get_json("resource", "/employees/search", default=[], params={"q": q, "limit": 200})
+        util_params["employee_ids"] = ",".join(str(e["id"]) for e in employees)
+        utilization = await get_json("project", "/utilization", default=None, params=util_params) if employees else None
+    else:
+        employees, utilization = await asyncio.gather(
+            get_json("resource", "/employees/", default=[]),
+            get_json("project", "/utilization", default=None, params=util_params),
+        )
+
+    month_headers = utilization["months"] if utilization else []
+    heatmap_map = {row["employee_id"]: row["percents"] for row in utilization["rows"]} if utilization else {}
+
+    for emp in employees:
+        percents = heatmap_map.get(emp['id'], [0] * len(month_headers))
+        emp['heatmap'] = [
+            {"label": m, "percent": round(p)} # Round to nearest integer
+            for m, p in zip(month_headers, percents)
+        ]
 
     return templates.TemplateResponse("employees.html", {
         "request": request, 
@@ -118,8 +80,7 @@ async def employee_list(request: Request, q: str = None):
 
 @app.get("/projects/new", response_class=HTMLResponse)
 async def new_project_form(request: Request):
-    # Mock customers for now
-    customers = [{"id": 1, "name": "株式会社A"}, {"id": 2, "name": "株式会社B"}]
+    customers = CUSTOMERS
     statuses = [{"value": "Lead"}, {"value": "Contracted"}, {"value": "Completed"}]
     return templates.TemplateResponse("project_form.html", {"request": request, "customers": customers, "statuses": statuses})
 
@@ -141,45 +102,56 @@ async def create_project(
         "start_date": start_date,
         "end_date": end_date
     }
-    async with httpx.AsyncClient() as client:
-        await client.post(f"{PROJECT_SERVICE_URL}/projects/", json=payload)
+    await clients["project"].post("/projects/", json=payload)
+    response_cache.invalidate(["projects"])
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/projects/{project_id}", response_class=HTMLResponse)
+@cached(lambda project_id, **_: [f"project:{project_id}", "employees", "unit_costs"])
 async def project_detail(request: Request, project_id: int):
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{PROJECT_SERVICE_URL}/projects/{project_id}")
-        if resp.status_code != 200:
-            return RedirectResponse(url="/")
-        project = resp.json()
-        
-        # Add mock customer name since Project Service only stores ID
-        project["customer"] = {"name": "株式会社A", "industry": "IT"} # Mock
-        
-        # Calculate summary (Simplified logic for BFF, or fetch from Project Service if it computes)
-        # Project Service currently doesn't return summary in GET /projects/{id} unless we implemented it.
-        # We implemented it in Monolith but maybe not fully in Microservice Project Service GET?
-        # Let's assume Project Service GET returns basic info and we need to fetch assignments to calculate.
-        # OR Project Service GET should return summary.
-        
-        # For now, let's pass a dummy summary to avoid template errors
-        summary = {"revenue": project["contract_amount"], "cost": 0, "profit": 0, "margin_percent": 0, "breakdown": []}
-        
+    resp, pnl = await asyncio.gather(
+        clients["project"].get(f"/projects/{project_id}"),
+        get_json("project", f"/projects/{project_id}/pnl", default=None),
+    )
+    if resp.status_code != 200:
+        return RedirectResponse(url="/")
+    project = resp.json()
+
+    # Add mock customer name since Project Service only stores ID
+    project["customer"] = CUSTOMER_MAP.get(project["customer_id"], {"name": "-", "industry": "-"}) # Mock
+
+    # Cost / profit are computed by project-service from allocations and unit cost history
+    summary = {"revenue": project["contract_amount"], "cost": 0, "profit": project["contract_amount"], "margin_percent": 0, "breakdown": []}
+    if pnl:
+        summary.update({k: pnl[k] for k in ("revenue", "cost", "profit", "margin_percent")})
+        # Resolve the whole team in one round trip
+        team = {}
+        employee_ids = sorted({item["employee_id"] for item in pnl["breakdown"]})
+        if employee_ids:
+            try:
+                resp = await clients["resource"].post("/employees:batch", json={"ids": employee_ids, "fields": ["id", "name", "role"]})
+                if resp.status_code == 200:
+                    team = {e["id"]: e for e in resp.json()}
+            except httpx.HTTPError as e:
+                note_failure(f"Error fetching team: {e}")
+        for item in pnl["breakdown"]:
+            member = team.get(item["employee_id"], {})
+            summary["breakdown"].append({**item, "name": member.get("name", f"#{item['employee_id']}"), "role": member.get("role", "-")})
+
     return templates.TemplateResponse("project_detail.html", {
-        "request": request, 
-        "project": project, 
+        "request": request,
+        "project": project,
         "summary": summary
     })
 
 @app.get("/projects/{project_id}/edit", response_class=HTMLResponse)
 async def edit_project_form(request: Request, project_id: int):
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{PROJECT_SERVICE_URL}/projects/{project_id}")
-        if resp.status_code != 200:
-            return RedirectResponse(url="/")
-        project = resp.json()
-        
-    customers = [{"id": 1, "name": "株式会社A"}, {"id": 2, "name": "株式会社B"}]
+    resp = await clients["project"].get(f"/projects/{project_id}")
+    if resp.status_code != 200:
+        return RedirectResponse(url="/")
+    project = resp.json()
+
+    customers = CUSTOMERS
     statuses = [{"value": "Lead"}, {"value": "Contracted"}, {"value": "Completed"}]
     return templates.TemplateResponse("project_edit.html", {
         "request": request,
@@ -207,24 +179,54 @@ async def update_project(
         "start_date": start_date,
         "end_date": end_date
     }
-    async with httpx.AsyncClient() as client:
-        await client.put(f"{PROJECT_SERVICE_URL}/projects/{project_id}", json=payload)
-        
+    await clients["project"].put(f"/projects/{project_id}", json=payload)
+    response_cache.invalidate(["projects", f"project:{project_id}"])
+
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/billings", response_class=HTMLResponse)
+@cached(lambda **_: ["billings", "projects"])
 async def billing_list(request: Request):
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{PROJECT_SERVICE_URL}/billings")
-        billings = resp.json() if resp.status_code == 200 else []
-        
-        # We need project names. In a real app, join or fetch.
-        # Here we mock or fetch projects to map.
-        proj_resp = await client.get(f"{PROJECT_SERVICE_URL}/projects/")
-        projects = proj_resp.json() if proj_resp.status_code == 200 else []
-        proj_map = {p['id']: p['name'] for p in projects}
-        
-        for b in billings:
-            b['project_name'] = proj_map.get(b['project_id'], 'Unknown Project')
-            
-    return templates.TemplateResponse("billings.html", {"request": request, "billings": billings})
+    # Resolve names for only the projects referenced by these billings
+    billings, summary = await asyncio.gather(
+        get_json("project", "/billings", default=[]),
+        get_json("project", "/billings/summary", default=None, params={"group_by": "status"}),
+    )
+    project_ids = sorted({b['project_id'] for b in billings})
+    chunks = [project_ids[i:i + 1000] for i in range(0, len(project_ids), 1000)]
+    pages = await asyncio.gather(*(
+        get_json("project", "/projects/", default=[], params={"ids": ",".join(map(str, chunk)), "limit": len(chunk)})
+        for chunk in chunks
+    ))
+    proj_map = {p['id']: p['name'] for page in pages for p in page}
+
+    for b in billings:
+        b['project_name'] = proj_map.get(b['project_id'], 'Unknown Project')
+
+    return templates.TemplateResponse("billings.html", {"request": request, "billings": billings, "summary": summary})
+
+EXPORTS = {"billings", "allocations", "utilization"}
+
+@app.get("/exports/{name}")
+async def download_export(request: Request, name: str):
+    # Relay project-service's streaming CSV/XLSX export chunk by chunk
+    if name not in EXPORTS:
+        return HTMLResponse("Not found", status_code=404)
+    client = clients["project"]
+    upstream = await client.send(
+        client.build_request("GET", f"/{name}/export", params=request.query_params), stream=True
+    )
+    headers = {k: v for k, v in upstream.headers.items() if k.lower() == "content-disposition"}
+    return StreamingResponse(
+        upstream.aiter_bytes(), status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type"), headers=headers,
+        background=BackgroundTask(upstream.aclose)
+    )
+
+class Invalidation(BaseModel):
+    topics: List[str]
+
+@app.post("/internal/invalidate")
+async def invalidate(event: Invalidation):
+    # Change notifications published by project-service / resource-service (see their app/events.py)
+    return {"invalidated": response_cache.invalidate(event.topics)}
@@ -0,0 +1,495 @@
+"""Background job queue shared by project-service and resource-service.
+
+POST /jobs queues a job in a service's `jobs` table and returns its id at
+once. A dispatcher thread claims queued jobs (one atomic UPDATE each, so
+several processes can drain the same queue) and runs them on a process
+pool, keeping heavy work off the request threads and the GIL. Jobs
+report progress into their row; results are stored as JSON, or as a file
+for jobs returning {"path", "filename", "media_type"}.
+
+Each service builds one JobQueue over its own Job model and database in
+its app/jobs.py and registers its job kinds there with `@queue.kind`:
+
+    queue = JobQueue(models.Job, SessionLocal, make_engine, versions.current, module="app.jobs")
+
+    @queue.kind("conflicts", cache=True, tables=["assignments", "allocations"])
+    def _conflicts(db, params, progress):
+        ...
+
+Results are reused: submitting a cacheable kind with the same params
+returns the earlier job while the tables it reads are unchanged (see the
+services' app/versions.py) and it is younger than JOB_RESULT_TTL.
+Identical jobs still queued or running are never started twice: a
+partial unique index on the Job model allows one queued or running row
+per key, and a submit losing that race returns the winner's job.
+
+Jobs run in `python -m app.jobs worker` processes. JOB_RUNNER=off is the
+default, so an API served by several processes doesn't start a process
+pool in each; JOB_RUNNER=embedded runs the dispatcher inside the API and
+is meant for single-process deployments. With neither, queued jobs wait.
+
+Any number of workers may share the queue: a claim records the claiming
+process as the job's owner, and the owner keeps the job's heartbeat_at
+current while it runs. A running job is queued again only once its owner
+has exited (checked on the same host) or its heartbeat is older than
+JOB_HEARTBEAT_TIMEOUT, so starting another worker never re-runs jobs in
+flight. Old jobs and their files are removed with
+`python -m app.jobs prune --keep-days N`.
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable, Dict, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+JOB_RUNNER = os.getenv("JOB_RUNNER", "off")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 600)) # seconds
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 10.0))
+HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", 60.0))
+
+# run(db, params, progress) -> JSON-serializable result. It may run in any
+# worker process, so in-memory caches of the API must notice its writes
+# through table versions rather than hooks here.
+JobKind = namedtuple("JobKind", "run cache tables")
+
+
+class UnknownJobKind(ValueError):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+class JobQueue:
+    """The jobs table of one service and the job kinds it can run.
+
+    `table_versions(db, tables) -> {table: version}` keys cached results;
+    `module` names the importable module holding this queue as `queue`, so
+    pool processes can find it (and its registered kinds) again.
+    """
+
+    def __init__(self, model, session_factory: sessionmaker, make_engine: Callable,
+                 table_versions: Callable, module: str):
+        self.Job = model
+        self.Session = session_factory
+        self.make_engine = make_engine
+        self.table_versions = table_versions
+        self.module = module
+        self.kinds: Dict[str, JobKind] = {}
+        self.runner: Optional["Runner"] = None
+        self._sessions: Dict[str, sessionmaker] = {}
+
+    def kind(self, name: str, cache: bool = False, tables: Sequence[str] = ()):
+        def register(run):
+            self.kinds[name] = JobKind(run, cache, tuple(tables))
+            return run
+        return register
+
+    def install(self, conn):
+        """Create the jobs indexes on databases whose jobs table predates them (create_all skips those)."""
+        for index in self.Job.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+    def _key(self, db: Session, name: str, params: dict) -> str:
+        spec = self.kinds[name]
+        state = sorted(self.table_versions(db, spec.tables).items()) if spec.tables else []
+        raw = json.dumps([name, params, state], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def submit(self, db: Session, name: str, params: Optional[dict] = None):
+        """Queue a job, or return a matching queued / running / fresh cached one. Returns (job, reused)."""
+        if name not in self.kinds:
+            raise UnknownJobKind(f"Unknown job kind {name!r}; expected one of {', '.join(sorted(self.kinds))}")
+        params = params or {}
+        key = self._key(db, name, params)
+        job = self.Job
+        pending = self._pending(db, key)
+        if pending:
+            return pending, True
+        if self.kinds[name].cache:
+            cached = (
+                db.query(job)
+                .filter(job.key == key, job.status == "succeeded", job.finished_at >= _now() - timedelta(seconds=RESULT_TTL))
+                .order_by(job.finished_at.desc())
+                .first()
+            )
+            if cached:
+                return cached, True
+
+        new_job = job(id=uuid.uuid4().hex, kind=name, params=json.dumps(params, default=str), key=key,
+                      status="queued", progress=0.0, created_at=_now())
+        db.add(new_job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent submit queued the same key between our lookup and INSERT
+            db.rollback()
+            pending = self._pending(db, key)
+            if pending is None:
+                raise
+            return pending, True
+        if self.runner is not None:
+            self.runner.wake()
+        return new_job, False
+
+    def _pending(self, db: Session, key: str):
+        job = self.Job
+        return db.query(job).filter(job.key == key, job.status.in_(["queued", "running"])).first()
+
+    def claim(self, db: Session, owner: Optional[str] = None) -> Optional[str]:
+        """Mark the oldest queued job running for `owner` and return its id (None when the queue is empty)."""
+        job = self.Job
+        oldest = select(job.id).where(job.status == "queued").order_by(job.created_at, job.id).limit(1).scalar_subquery()
+        now = _now()
+        job_id = db.execute(
+            update(job).where(job.id == oldest, job.status == "queued")
+            .values(status="running", started_at=now, owner=owner, heartbeat_at=now).returning(job.id)
+        ).scalar()
+        db.commit()
+        return job_id
+
+    def requeue_stale(self, db: Session, timeout: float = HEARTBEAT_TIMEOUT) -> int:
+        """Queue running jobs again whose owner exited or stopped heartbeating. Returns how many."""
+        job = self.Job
+        cutoff = _now() - timedelta(seconds=timeout)
+        running = db.query(job.id, job.owner, job.heartbeat_at).filter(job.status == "running").all()
+        gone = {owner for _, owner, _ in running if _owner_gone(owner)}
+        stale = [job_id for job_id, owner, beat in running if owner in gone or beat is None or beat < cutoff]
+        if not stale:
+            return 0
+        # Re-checked in the UPDATE: a heartbeat may have landed since the read
+        count = db.execute(
+            update(job).where(
+                job.id.in_(stale), job.status == "running",
+                job.owner.in_(gone) | job.heartbeat_at.is_(None) | (job.heartbeat_at < cutoff),
+            ).values(status="queued", owner=None, started_at=None, heartbeat_at=None)
+        ).rowcount
+        db.commit()
+        return count
+
+    def cancel(self, db: Session, job_id: str) -> bool:
+        """Cancel a queued job; False if it already started."""
+        job = self.Job
+        done = db.execute(
+            update(job).where(job.id == job_id, job.status == "queued").values(status="cancelled", finished_at=_now())
+        ).rowcount
+        db.commit()
+        return bool(done)
+
+    def _progress(self, engine, job_id: str, fraction: float, message: Optional[str] = None):
+        # Best effort: a busy database only costs a progress update
+        if not _can_report(engine):
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    update(self.Job).where(self.Job.id == job_id)
+                    .values(progress=round(min(max(fraction, 0.0), 1.0), 4), message=message)
+                )
+        except OperationalError:
+            pass
+
+    def run_job(self, db: Session, job_id: str) -> str:
+        """Run a claimed job in this process and record the outcome. Returns the final status."""
+        job = db.get(self.Job, job_id)
+        spec = self.kinds.get(job.kind)
+        params = json.loads(job.params or "{}")
+        try:
+            if spec is None:
+                raise UnknownJobKind(f"Unknown job kind {job.kind!r}")
+            result = spec.run(db, params, partial(self._progress, db.get_bind(), job_id))
+        except Exception as e:
+            db.rollback()
+            values = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        else:
+            db.commit()
+            values = {"status": "succeeded", "progress": 1.0, "result": json.dumps(result, default=str)}
+        db.execute(update(self.Job).where(self.Job.id == job_id).values(finished_at=_now(), **values))
+        db.commit()
+        return values["status"]
+
+    def execute(self, url: str, job_id: str) -> str:
+        # Runs in pool processes: one engine per database URL per process
+        if url not in self._sessions:
+            self._sessions[url] = sessionmaker(autocommit=False, autoflush=False, bind=self.make_engine(url))
+        db = self._sessions[url]()
+        try:
+            return self.run_job(db, job_id)
+        finally:
+            db.close()
+
+    def fail(self, db: Session, job_id: str, error: BaseException):
+        db.execute(update(self.Job).where(self.Job.id == job_id).values(
+            status="failed", error=f"{type(error).__name__}: {error}", finished_at=_now()))
+        db.commit()
+
+    def run_next(self, db: Session) -> Optional[str]:
+        """Claim and run one job inline (CLI, tests). Returns its id, or None when the queue is empty."""
+        heartbeat = Heartbeat(self, db.get_bind(), make_owner()).start()
+        try:
+            job_id = self.claim(db, heartbeat.owner)
+            if job_id:
+                self.run_job(db, job_id)
+        finally:
+            heartbeat.stop()
+        return job_id
+
+    def result_file(self, job) -> Optional[dict]:
+        """{"path", "filename", "media_type"} for jobs whose result is a file."""
+        result = json.loads(job.result) if job.result else None
+        return result if isinstance(result, dict) and "path" in result else None
+
+    def prune(self, db: Session, keep_days: int) -> int:
+        job = self.Job
+        old = db.query(job).filter(job.status.in_(["succeeded", "failed", "cancelled"]),
+                                   job.finished_at < _now() - timedelta(days=keep_days)).all()
+        for row in old:
+            found = self.result_file(row)
+            if found and os.path.exists(found["path"]):
+                os.remove(found["path"])
+            db.delete(row)
+        db.commit()
+        return len(old)
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        if JOB_RUNNER == "embedded":
+            self.runner = Runner(self)
+            self.runner.start()
+        try:
+            yield
+        finally:
+            if self.runner is not None:
+                self.runner.stop()
+                self.runner = None
+
+    def main(self, argv=None):
+        parser = argparse.ArgumentParser(description="Background job queue")
+        sub = parser.add_subparsers(dest="command", required=True)
+        worker = sub.add_parser("worker", help="Drain the queue with a process pool until interrupted")
+        worker.add_argument("--workers", type=int, default=JOB_WORKERS)
+        sub.add_parser("run-once", help="Run queued jobs inline until the queue is empty")
+        prune_cmd = sub.add_parser("prune", help="Delete finished jobs and their files")
+        prune_cmd.add_argument("--keep-days", type=int, default=7)
+        args = parser.parse_args(argv)
+
+        bind = self.Session.kw["bind"]
+        self.Job.metadata.create_all(bind=bind)
+        with bind.begin() as conn:
+            self.install(conn)
+        if args.command == "worker":
+            worker_runner = Runner(self, workers=args.workers)
+            worker_runner.start()
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                worker_runner.stop()
+            return
+
+        db = self.Session()
+        try:
+            if args.command == "run-once":
+                count = 0
+                while self.run_next(db):
+                    count += 1
+                print(f"Ran {count} jobs")
+            else:
+                print(f"Pruned {self.prune(db, args.keep_days)} jobs")
+        finally:
+            db.close()
+
+
+# --- Ownership ---------------------------------------------------------------
+
+_live_owners = set() # owners with a heartbeat running in this process
+
+
+def make_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    host, _, rest = (owner or "").partition(":")
+    pid, _, _ = rest.partition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False # can't tell from here; the heartbeat decides
+    if int(pid) == os.getpid():
+        return owner not in _live_owners
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class Heartbeat:
+    """Thread refreshing heartbeat_at of the running jobs `owner` claimed."""
+
+    def __init__(self, queue: JobQueue, engine, owner: str, interval: float = HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.engine = engine
+        self.owner = owner
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        _live_owners.add(self.owner)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="job-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        _live_owners.discard(self.owner)
+
+    def beat(self):
+        job = self.queue.Job
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    update(job).where(job.owner == self.owner, job.status == "running").values(heartbeat_at=_now())
+                )
+        except OperationalError as e:
+            print(f"Job heartbeat: {e}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.beat()
+
+
+_reports_progress: Dict[str, bool] = {}
+
+
+def _can_report(engine) -> bool:
+    # Progress is written from a second connection while the job's own transaction is
+    # open; outside WAL mode SQLite would make that wait for the job, so skip it there
+    key = str(engine.url)
+    if key not in _reports_progress:
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                _reports_progress[key] = conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        else:
+            _reports_progress[key] = True
+    return _reports_progress[key]
+
+
+def _execute(module: str, url: str, job_id: str) -> str:
+    # Entry point in pool processes; importing the service module registers its kinds
+    return importlib.import_module(module).queue.execute(url, job_id)
+
+
+class Runner:
+    """Dispatcher thread feeding a process pool from a queue's jobs table."""
+
+    def __init__(self, queue: JobQueue, session_factory: Optional[sessionmaker] = None, workers: int = JOB_WORKERS):
+        self.queue = queue
+        self.Session = session_factory or queue.Session
+        self.url = self.Session.kw["bind"].url.render_as_string(hide_password=False)
+        self.workers = workers
+        self.owner = make_owner()
+        self.heartbeat = Heartbeat(queue, self.Session.kw["bind"], self.owner)
+        self._checked = 0.0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        # spawn: children must not inherit the parent's connections or threads
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+        self.heartbeat.start()
+        self.requeue_stale()
+        self._thread = threading.Thread(target=self._loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        self.heartbeat.stop()
+
+    def requeue_stale(self) -> int:
+        # Jobs of workers that died (here or elsewhere); never those another live worker is running
+        self._checked = time.monotonic()
+        db = self.Session()
+        try:
+            return self.queue.requeue_stale(db)
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if time.monotonic() - self._checked >= HEARTBEAT_INTERVAL:
+                try:
+                    self.requeue_stale()
+                except OperationalError as e:
+                    print(f"Job dispatcher: {e}")
+            db = self.Session()
+            try:
+                while self._running < self.workers and not self._stop.is_set():
+                    job_id = self.queue.claim(db, self.owner)
+                    if not job_id:
+                        break
+                    with self._lock:
+                        self._running += 1
+                    try:
+                        future = self._pool.submit(_execute, self.queue.module, self.url, job_id)
+                    except Exception as e:
+                        with self._lock:
+                            self._running -= 1
+                        self.queue.fail(db, job_id, e)
+                        continue
+                    future.add_done_callback(partial(self._done, job_id))
+            except OperationalError as e:
+                print(f"Job dispatcher: {e}")
+            finally:
+                db.close()
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _done(self, job_id: str, future):
+        with self._lock:
+            self._running -= 1
+        db = self.Session()
+        try:
+            error = future.exception()
+            if error is not None:
+                # The worker process died or the job could not be sent to it
+                self.queue.fail(db, job_id, error)
+        except Exception as e:
+            print(f"Job {job_id} completion handling failed: {e}")
+        finally:
+            db.close()
+        self._wake.set()
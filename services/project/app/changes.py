@@ -0,0 +1,126 @@
+"""Change log feeding GET /changes.
+
+On SQLite, triggers on the tracked tables append one change_log row per
+inserted, updated or deleted row, with a JSON image of the row after the
+change. ORM writes, Core bulk inserts and cascades are all captured, in
+the writing transaction. change_log.id is AUTOINCREMENT, so cursors only
+ever grow and are never reused.
+
+Old entries can be pruned with python -m app.changes prune --keep-days N;
+consumers whose cursor falls before the retained window get a 410 and
+must resync from the list endpoints.
+"""
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+
+TRACKED_TABLES = ["assignments", "allocations", "billings"]
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+
+class CursorExpired(Exception):
+    """The requested cursor predates the oldest retained change."""
+
+
+def _triggers(table_name: str, columns):
+    image = "json_object(" + ", ".join(f"'{c}', NEW.{c}" for c in columns) + ")"
+    insert = f"INSERT INTO change_log (table_name, row_id, op, data, changed_at) VALUES ('{table_name}', {{id}}, '{{op}}', {{data}}, {_NOW});"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table_name}_changes_ai AFTER INSERT ON {table_name} BEGIN
+            {insert.format(id="NEW.id", op="insert", data=image)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table_name}_changes_au AFTER UPDATE ON {table_name} BEGIN
+            {insert.format(id="NEW.id", op="update", data=image)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table_name}_changes_ad AFTER DELETE ON {table_name} BEGIN
+            {insert.format(id="OLD.id", op="delete", data="NULL")}
+        END""",
+    ]
+
+
+def install(connection):
+    """Create the change-capture triggers if missing."""
+    if connection.dialect.name != "sqlite":
+        return
+    existing = set(inspect(connection).get_table_names())
+    for table_name in TRACKED_TABLES:
+        if table_name not in existing:
+            continue
+        # Only columns both the model and the (possibly older) database have
+        stored = {c["name"] for c in inspect(connection).get_columns(table_name)}
+        columns = [c.name for c in models.Base.metadata.tables[table_name].columns if c.name in stored]
+        for ddl in _triggers(table_name, columns):
+            connection.exec_driver_sql(ddl)
+
+
+@event.listens_for(models.Base.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+def read(db: Session, since: int = 0, limit: int = 1000) -> dict:
+    log = models.ChangeLog
+    if since:
+        oldest = db.query(log.id).order_by(log.id).limit(1).scalar()
+        if oldest is not None and since + 1 < oldest:
+            raise CursorExpired(f"Cursor {since} is older than the retained change log (starts at {oldest})")
+    rows = db.query(log).filter(log.id > since).order_by(log.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "changes": [
+            {
+                "cursor": row.id,
+                "table": row.table_name,
+                "row_id": row.row_id,
+                "op": row.op,
+                "data": json.loads(row.data) if row.data else None,
+                "changed_at": row.changed_at,
+            }
+            for row in rows
+        ],
+        "next_cursor": rows[-1].id if rows else since,
+        "has_more": has_more,
+    }
+
+
+def prune(db: Session, keep_days: int) -> int:
+    """Delete entries older than `keep_days`, always keeping the newest one so cursors stay monotonic."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).strftime("%Y-%m-%dT%H:%M:%fZ")
+    newest: Optional[int] = db.query(models.ChangeLog.id).order_by(models.ChangeLog.id.desc()).limit(1).scalar()
+    if newest is None:
+        return 0
+    deleted = (
+        db.query(models.ChangeLog)
+        .filter(models.ChangeLog.changed_at < cutoff, models.ChangeLog.id < newest)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the change_log table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    prune_cmd = sub.add_parser("prune", help="Delete old change log entries")
+    prune_cmd.add_argument("--keep-days", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        deleted = prune(db, args.keep_days)
+    finally:
+        db.close()
+    print(f"Deleted {deleted} change log entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Over-allocation detection.
+
+An employee is over-allocated on the days where the effort_percent of
+their overlapping allocations adds up to more than THRESHOLD. Per
+employee, allocation boundaries are sorted into +effort / -effort points
+and swept once, so finding every such period is O(n log n).
+
+The same sweep runs as a before_flush validation hook (writes that would
+push an employee over the threshold raise OverAllocated, answered with
+409) and as the batch audit behind GET /conflicts. Set
+OVERALLOCATION_CHECK=off, or session.info["check_allocations"] = False,
+to accept over-allocating writes.
+"""
+import os
+from collections import defaultdict, namedtuple
+from datetime import date
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import intervals, models, rollup
+
+THRESHOLD = float(os.getenv("OVERALLOCATION_THRESHOLD", 100))
+CHECK_WRITES = os.getenv("OVERALLOCATION_CHECK", "reject") != "off"
+
+# Day ordinals, inclusive; allocation_id is None for rows not yet written
+Interval = namedtuple("Interval", "start end effort allocation_id")
+Conflict = namedtuple("Conflict", "employee_id start_date end_date peak_percent allocation_ids")
+
+
+class OverAllocated(Exception):
+    """A write would book employees above the threshold."""
+
+    def __init__(self, conflicts: List[Conflict], threshold: float = THRESHOLD):
+        self.conflicts = conflicts
+        self.threshold = threshold
+        employees = sorted({c.employee_id for c in conflicts})
+        super().__init__(f"Employees {employees} would be allocated above {threshold:g}%")
+
+
+def sweep(rows: List[Interval], threshold: float = THRESHOLD, pending_only: bool = False) -> List[tuple]:
+    """(start, end, peak, [row indexes]) for each maximal run of days whose summed effort exceeds `threshold`.
+
+    With pending_only, only runs involving a row without an allocation_id are returned.
+    """
+    points = []
+    for i, row in enumerate(rows):
+        if row.effort and row.start <= row.end:
+            points.append((row.start, row.effort, i))
+            points.append((row.end + 1, -row.effort, i))
+    points.sort(key=lambda p: p[0])
+
+    runs, current = [], None
+    load, active = 0, set()
+    i = 0
+    while i < len(points):
+        day = points[i][0]
+        while i < len(points) and points[i][0] == day:
+            _, delta, index = points[i]
+            load += delta
+            if delta > 0:
+                active.add(index)
+            else:
+                active.discard(index)
+            i += 1
+        if load > threshold and i < len(points):
+            last = points[i][0] - 1
+            if current and current[1] == day - 1:
+                current[1], current[2] = last, max(current[2], load)
+                current[3].update(active)
+            else:
+                current = [day, last, load, set(active)]
+                runs.append(current)
+        else:
+            current = None
+
+    if pending_only:
+        runs = [run for run in runs if any(rows[index].allocation_id is None for index in run[3])]
+    return [(start, end, peak, sorted(indexes)) for start, end, peak, indexes in runs]
+
+
+def employee_conflicts(employee_id: int, rows: List[Interval], threshold: float = THRESHOLD,
+                       pending_only: bool = False) -> List[Conflict]:
+    return [
+        Conflict(
+            employee_id=employee_id,
+            start_date=date.fromordinal(start),
+            end_date=date.fromordinal(end),
+            peak_percent=peak,
+            allocation_ids=sorted(rows[i].allocation_id for i in indexes if rows[i].allocation_id is not None),
+        )
+        for start, end, peak, indexes in sweep(rows, threshold, pending_only)
+    ]
+
+
+def load_intervals(db: Session, employee_ids: Optional[Iterable[int]] = None, start: Optional[date] = None,
+                   end: Optional[date] = None, exclude_ids: Iterable[int] = ()) -> Iterator[tuple]:
+    """(employee_id, [Interval, ...]) for stored allocations overlapping [start, end], in employee order."""
+    query = intervals.filter_overlapping(
+        db.query(models.Assignment.employee_id, models.Allocation.start_date, models.Allocation.end_date,
+                 models.Allocation.effort_percent, models.Allocation.id)
+        .join(models.Assignment, models.Assignment.id == models.Allocation.assignment_id)
+        .order_by(models.Assignment.employee_id),
+        db, start, end,
+    )
+    if employee_ids is not None:
+        query = query.filter(models.Assignment.employee_id.in_(list(employee_ids)))
+    exclude_ids = set(exclude_ids)
+    for employee_id, rows in groupby(query.yield_per(1000), key=lambda r: r[0]):
+        yield employee_id, [
+            Interval(s.toordinal(), e.toordinal(), effort or 0, alloc_id)
+            for _, s, e, effort, alloc_id in rows
+            if s is not None and e is not None and alloc_id not in exclude_ids
+        ]
+
+
+def audit(db: Session, employee_ids: Optional[List[int]] = None, start: Optional[date] = None,
+          end: Optional[date] = None, threshold: float = THRESHOLD) -> List[Conflict]:
+    """Every over-allocated period overlapping [start, end], clipped to it."""
+    found = []
+    for employee_id, rows in load_intervals(db, employee_ids, start, end):
+        for conflict in employee_conflicts(employee_id, rows, threshold):
+            if start and conflict.start_date < start:
+                conflict = conflict._replace(start_date=start)
+            if end and conflict.end_date > end:
+                conflict = conflict._replace(end_date=end)
+            found.append(conflict)
+    return found
+
+
+def check_pending(db: Session, pending: Dict[int, List[Interval]], exclude_ids: Iterable[int] = (),
+                  threshold: float = THRESHOLD) -> List[Conflict]:
+    """Conflicts the `pending` intervals ({employee_id: [Interval]}) would cause on top of stored allocations."""
+    pending = {emp: rows for emp, rows in pending.items() if rows}
+    if not pending:
+        return []
+    starts = [r.start for rows in pending.values() for r in rows]
+    ends = [r.end for rows in pending.values() for r in rows]
+    stored = dict(load_intervals(
+        db, pending.keys(), date.fromordinal(min(starts)), date.fromordinal(max(ends)), exclude_ids
+    ))
+    found = []
+    for employee_id, rows in sorted(pending.items()):
+        found.extend(employee_conflicts(employee_id, stored.get(employee_id, []) + rows, threshold, pending_only=True))
+    return found
+
+
+def _validate_allocations(session, flush_context, instances):
+    if not CHECK_WRITES or not session.info.get("check_allocations", True):
+        return
+    written = [obj for obj in session.new if isinstance(obj, models.Allocation)]
+    written += [obj for obj in session.dirty if isinstance(obj, models.Allocation) and session.is_modified(obj)]
+    pending = defaultdict(list)
+    for obj in written:
+        employee_id = rollup.allocation_employee_id(session, obj)
+        if employee_id is None or obj.start_date is None or obj.end_date is None:
+            continue
+        pending[employee_id].append(Interval(obj.start_date.toordinal(), obj.end_date.toordinal(), obj.effort_percent or 0, None))
+    if not pending:
+        return
+    # Rows being rewritten or deleted in this flush are replaced by their new values / dropped
+    replaced = [obj.id for obj in written if obj.id is not None]
+    replaced += [obj.id for obj in session.deleted if isinstance(obj, models.Allocation)]
+    with session.no_autoflush:
+        conflicts = check_pending(session, pending, replaced)
+    if conflicts:
+        raise OverAllocated(conflicts)
+
+
+# Ahead of the rollup / versions hooks, so a rejected flush writes nothing
+event.listen(Session, "before_flush", _validate_allocations, insert=True)
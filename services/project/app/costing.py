@@ -0,0 +1,187 @@
+"""Vectorized project cost / P&L engine.
+
+Cost of an allocation day = monthly unit cost / days in that month * effort%.
+The unit cost in force on a day is the employee's latest UnitCost record
+starting on or before it (days before the first record use the first one).
+Allocations are expanded to days and priced in a handful of NumPy passes,
+so one project or the whole portfolio costs the same number of queries.
+"""
+from collections import namedtuple
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models, scenarios
+
+_EPOCH_ORDINAL = 719163 # date(1970, 1, 1).toordinal()
+_KEY_SHIFT = np.int64(1 << 32)
+
+AllocationRows = namedtuple("AllocationRows", "allocation_ids assignment_ids project_ids employee_ids starts ends efforts")
+
+
+class CostTable:
+    """UnitCost history as arrays sorted by (employee_id, start day)."""
+
+    def __init__(self, cost_rows: Iterable[dict]):
+        rows = sorted(
+            (int(r["employee_id"]), _ordinal(r["start_date"]), float(r["amount"]))
+            for r in cost_rows
+        )
+        self.employee_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.keys = self.employee_ids * _KEY_SHIFT + np.array([r[1] for r in rows], dtype=np.int64)
+        self.amounts = np.array([r[2] for r in rows], dtype=np.float64)
+
+    def rates(self, employee_ids: np.ndarray, days: np.ndarray):
+        """Monthly unit cost in force for each (employee, day) pair, and a mask of pairs with no cost history."""
+        if not len(self.keys):
+            return np.zeros(len(days)), np.ones(len(days), dtype=bool)
+        idx = np.searchsorted(self.keys, employee_ids * _KEY_SHIFT + days, side="right") - 1
+        # Before the employee's first record: fall back to that first record
+        first = np.searchsorted(self.keys, employee_ids * _KEY_SHIFT, side="left")
+        wrong_employee = (idx < 0) | (self.employee_ids[np.clip(idx, 0, None)] != employee_ids)
+        idx = np.where(wrong_employee, first, idx)
+        missing = (idx >= len(self.keys)) | (self.employee_ids[np.clip(idx, 0, len(self.keys) - 1)] != employee_ids)
+        idx = np.clip(idx, 0, len(self.keys) - 1)
+        return np.where(missing, 0.0, self.amounts[idx]), missing
+
+
+def _ordinal(value) -> int:
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+def allocation_costs(rows: AllocationRows, costs: CostTable):
+    """Exact cost per allocation row, plus the employee ids lacking cost history."""
+    n = len(rows.starts)
+    if n == 0:
+        return np.zeros(0), set()
+    lengths = np.maximum(rows.ends - rows.starts + 1, 0)
+    alloc_idx = np.repeat(np.arange(n), lengths)
+    offsets = np.arange(len(alloc_idx)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    days = rows.starts[alloc_idx] + offsets
+
+    calendar = (days - _EPOCH_ORDINAL).astype("datetime64[D]")
+    month = calendar.astype("datetime64[M]")
+    days_in_month = ((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")).astype(np.int64)
+
+    employees = rows.employee_ids[alloc_idx]
+    monthly, missing = costs.rates(employees, days)
+    daily = monthly / days_in_month * rows.efforts[alloc_idx] / 100.0
+    return np.bincount(alloc_idx, weights=daily, minlength=n), set(employees[missing].tolist())
+
+
+def load_allocations(db: Session, project_ids) -> AllocationRows:
+    """Allocation rows of the given projects (a list of ids or an id subquery)."""
+    query = (
+        db.query(models.Assignment.id, models.Assignment.project_id, models.Assignment.employee_id,
+                 models.Allocation.start_date, models.Allocation.end_date, models.Allocation.effort_percent,
+                 models.Allocation.id)
+        .join(models.Allocation, models.Allocation.assignment_id == models.Assignment.id)
+        .filter(models.Assignment.project_id.in_(project_ids))
+    )
+    records = query.all()
+    return AllocationRows(
+        allocation_ids=np.array([r[6] for r in records], dtype=np.int64),
+        assignment_ids=np.array([r[0] for r in records], dtype=np.int64),
+        project_ids=np.array([r[1] for r in records], dtype=np.int64),
+        employee_ids=np.array([r[2] for r in records], dtype=np.int64),
+        starts=np.array([r[3].toordinal() for r in records], dtype=np.int64),
+        ends=np.array([r[4].toordinal() for r in records], dtype=np.int64),
+        efforts=np.array([r[5] or 0 for r in records], dtype=np.float64),
+    )
+
+
+def employee_ranges(rows: AllocationRows) -> Dict[int, Tuple[date, date]]:
+    """{employee_id: (first day, last day)} covered by the allocation rows."""
+    if not len(rows.employee_ids):
+        return {}
+    employees, inverse = np.unique(rows.employee_ids, return_inverse=True)
+    first = np.full(len(employees), np.iinfo(np.int64).max)
+    last = np.full(len(employees), np.iinfo(np.int64).min)
+    np.minimum.at(first, inverse, rows.starts)
+    np.maximum.at(last, inverse, rows.ends)
+    return {
+        emp_id: (date.fromordinal(start), date.fromordinal(end))
+        for emp_id, start, end in zip(employees.tolist(), first.tolist(), last.tolist())
+    }
+
+
+def summarize(projects: List[models.Project], rows: AllocationRows, cost_rows: Iterable[dict],
+              breakdown: bool = True) -> Tuple[List[dict], List[int]]:
+    """Per-project revenue / cost / profit / margin, plus employee ids without cost history."""
+    costs, missing = allocation_costs(rows, CostTable(cost_rows))
+
+    project_codes = {p.id: i for i, p in enumerate(projects)}
+    codes = np.array([project_codes[pid] for pid in rows.project_ids.tolist()], dtype=np.int64)
+    project_costs = np.bincount(codes, weights=costs, minlength=len(projects)) if len(codes) else np.zeros(len(projects))
+
+    by_assignment = {}
+    if breakdown and len(costs):
+        assignment_ids, inverse = np.unique(rows.assignment_ids, return_inverse=True)
+        days = np.maximum(rows.ends - rows.starts + 1, 0)
+        assignment_costs = np.bincount(inverse, weights=costs)
+        assignment_days = np.bincount(inverse, weights=days)
+        assignment_effort = np.bincount(inverse, weights=days * rows.efforts)
+        first_row = np.unique(inverse, return_index=True)[1]
+        for i, assignment_id in enumerate(assignment_ids.tolist()):
+            row = first_row[i]
+            by_assignment.setdefault(int(rows.project_ids[row]), []).append({
+                "assignment_id": assignment_id,
+                "employee_id": int(rows.employee_ids[row]),
+                "effort": round(assignment_effort[i] / assignment_days[i]) if assignment_days[i] else 0,
+                "cost": int(round(assignment_costs[i])),
+            })
+
+    results = []
+    for proj, cost in zip(projects, project_costs.tolist()):
+        revenue = proj.contract_amount or 0
+        cost = int(round(cost))
+        profit = revenue - cost
+        results.append({
+            "project_id": proj.id,
+            "revenue": revenue,
+            "cost": cost,
+            "profit": profit,
+            "margin_percent": round(profit / revenue * 100, 2) if revenue > 0 else 0.0,
+            "breakdown": by_assignment.get(proj.id, []),
+        })
+    return results, sorted(missing)
+
+
+def portfolio_pnl(db: Session, resource_client, project_ids: Optional[List[int]] = None,
+                  statuses: Optional[List[str]] = None, breakdown: bool = True, scenario_id: Optional[int] = None):
+    """P&L for the selected projects (all when no filter) with one DB query and one cost lookup.
+
+    With scenario_id, the scenario's allocation overlay is merged into the rows before pricing.
+    """
+    query = db.query(models.Project).order_by(models.Project.id)
+    if project_ids:
+        query = query.filter(models.Project.id.in_(project_ids))
+    if statuses:
+        query = query.filter(models.Project.status.in_(statuses))
+    projects = query.all()
+    if not projects:
+        return [], []
+
+    rows = load_allocations(db, query.with_entities(models.Project.id).order_by(None).scalar_subquery())
+    if scenario_id is not None:
+        rows = scenarios.merge_rows(db, scenario_id, rows, [p.id for p in projects])
+    cost_rows = resource_client.unit_costs(employee_ranges(rows))
+    return summarize(projects, rows, cost_rows, breakdown)
+
+
+def portfolio_totals(results: List[dict], missing: List[int]) -> dict:
+    """PortfolioPnl body for portfolio_pnl() results."""
+    revenue = sum(r["revenue"] for r in results)
+    cost = sum(r["cost"] for r in results)
+    return {
+        "revenue": revenue,
+        "cost": cost,
+        "profit": revenue - cost,
+        "margin_percent": round((revenue - cost) / revenue * 100, 2) if revenue > 0 else 0.0,
+        "projects": results,
+        "missing_cost_employee_ids": missing,
+    }
@@ -0,0 +1,206 @@
+"""Precomputed dashboard KPIs.
+
+The portfolio dashboard (project totals by status, pipeline value and
+monthly utilization) is read from a single dashboard_snapshots row, so a
+page view is one primary-key lookup instead of aggregating projects and
+the utilization rollup on every request.
+
+The row records the table versions it was computed from (see
+app/versions.py); reads report it as stale once those tables have moved
+on. A refresher thread in the API process queues a refresh_dashboard job
+(app/jobs.py) shortly after committed changes to projects or allocations,
+and at startup and every DASHBOARD_REFRESH_INTERVAL seconds checks for
+changes made by other processes (workers, CLI imports) and for the month
+rolling over. Months are UTC months, like computed_at.
+
+Reads never compute or write: until the first refresh job has run there
+is no snapshot to serve. The jobs run in a job worker
+(`python -m app.jobs worker`, or JOB_RUNNER=embedded in the API), so a
+deployment without one never gets a snapshot past the manual refresh.
+
+Manual refresh: python -m app.dashboard refresh
+"""
+import argparse
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import conflicts, events, models, versions
+from .database import SessionLocal
+from .utilization import month_windows
+
+MONTHS = int(os.getenv("DASHBOARD_MONTHS", 6))
+PIPELINE_STATUSES = [s.strip() for s in os.getenv("DASHBOARD_PIPELINE_STATUSES", "Lead").split(",") if s.strip()]
+REFRESH_INTERVAL = float(os.getenv("DASHBOARD_REFRESH_INTERVAL", 300)) # seconds; 0 disables the refresher
+DEBOUNCE = float(os.getenv("DASHBOARD_REFRESH_DEBOUNCE", 1.0)) # seconds to coalesce bursts of writes
+
+PORTFOLIO = 1 # snapshot id
+TABLES = ("projects", "employee_month_utilization")
+TOPICS = {"projects", "utilization"} # change topics (app/events.py) that affect the snapshot
+
+
+def compute(db: Session, today: Optional[date] = None) -> dict:
+    today = today or versions.utc_today() # computed_at is UTC too
+    project = models.Project
+    statuses = [
+        {"status": status, "projects": count, "contract_amount": int(amount)}
+        for status, count, amount in db.execute(
+            select(project.status, func.count(), func.coalesce(func.sum(project.contract_amount), 0))
+            .group_by(project.status).order_by(project.status)
+        )
+    ]
+    pipeline = [s for s in statuses if s["status"] in PIPELINE_STATUSES]
+
+    windows = month_windows(today.replace(day=1), MONTHS)
+    rollup = models.EmployeeMonthUtilization
+    by_month = {
+        month: (count, average, over)
+        for month, count, average, over in db.execute(
+            select(rollup.month, func.count(), func.avg(rollup.effort_percent),
+                   func.sum(case((rollup.effort_percent > conflicts.THRESHOLD, 1), else_=0)))
+            .where(rollup.month >= windows[0][0], rollup.month <= windows[-1][0], rollup.effort_percent > 0)
+            .group_by(rollup.month)
+        )
+    }
+    utilization = []
+    for first, _ in windows:
+        count, average, over = by_month.get(first, (0, 0.0, 0))
+        utilization.append({
+            "month": first.strftime("%Y-%m"), "employees": count,
+            "average_percent": round(average or 0.0, 1), "over_allocated": int(over or 0),
+        })
+
+    return {
+        "projects": sum(s["projects"] for s in statuses),
+        "contract_amount": sum(s["contract_amount"] for s in statuses),
+        "statuses": statuses,
+        "pipeline_statuses": PIPELINE_STATUSES,
+        "pipeline_projects": sum(s["projects"] for s in pipeline),
+        "pipeline_value": sum(s["contract_amount"] for s in pipeline),
+        "utilization": utilization,
+    }
+
+
+def refresh(db: Session, today: Optional[date] = None) -> dict:
+    """Recompute the portfolio snapshot. Does not commit."""
+    # Versions first: a write landing during compute() leaves the snapshot stale rather than wrongly fresh
+    state = versions.current(db, TABLES)
+    data = compute(db, today)
+    snapshot = models.DashboardSnapshot
+    stmt = versions.upsert(db, snapshot).values(
+        id=PORTFOLIO, data=json.dumps(data), versions=json.dumps(state), computed_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[snapshot.id],
+        set_={"data": stmt.excluded.data, "versions": stmt.excluded.versions, "computed_at": stmt.excluded.computed_at},
+    )
+    db.connection().execute(stmt)
+    versions.bump(db, snapshot.__tablename__)
+    events.touch(db, "dashboard")
+    return data
+
+
+def is_stale(db: Session, row: models.DashboardSnapshot, today: Optional[date] = None) -> bool:
+    if json.loads(row.versions or "{}") != versions.current(db, TABLES):
+        return True
+    # The utilization window starts at the current month
+    today = today or versions.utc_today()
+    return row.computed_at is None or (row.computed_at.year, row.computed_at.month) != (today.year, today.month)
+
+
+def read(db: Session) -> Optional[dict]:
+    """The portfolio snapshot with computed_at and stale, or None before the first refresh."""
+    row = db.get(models.DashboardSnapshot, PORTFOLIO)
+    if row is None:
+        return None
+    return {**json.loads(row.data), "computed_at": row.computed_at, "stale": is_stale(db, row)}
+
+
+class Refresher:
+    """Queues snapshot refreshes after relevant commits and on a timer."""
+
+    def __init__(self, session_factory=SessionLocal, interval: float = REFRESH_INTERVAL):
+        self.Session = session_factory
+        self.interval = interval
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        events.subscribe(self._on_change)
+        self.check() # queues the first snapshot on a fresh database
+        self._thread = threading.Thread(target=self._loop, name="dashboard-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        events.unsubscribe(self._on_change)
+        self._stop.set()
+        self._changed.set()
+        if self._thread:
+            self._thread.join()
+
+    def _on_change(self, topics):
+        if TOPICS.intersection(topics):
+            self._changed.set()
+
+    def check(self):
+        """Queue a refresh_dashboard job if the snapshot is missing or stale."""
+        from . import jobs
+        db = self.Session()
+        try:
+            row = db.get(models.DashboardSnapshot, PORTFOLIO)
+            if row is None or is_stale(db, row):
+                jobs.submit(db, "refresh_dashboard")
+        except OperationalError as e:
+            print(f"Dashboard refresher: {e}")
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._changed.wait(self.interval):
+                self._stop.wait(DEBOUNCE)
+            self._changed.clear()
+            if self._stop.is_set():
+                break
+            self.check()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    refresher = Refresher() if REFRESH_INTERVAL > 0 else None
+    if refresher:
+        refresher.start()
+    try:
+        yield
+    finally:
+        if refresher:
+            refresher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the dashboard snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh", help="Recompute the dashboard KPIs now")
+    args = parser.parse_args(argv)
+
+    from .database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        data = refresh(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Refreshed dashboard snapshot ({data['projects']} projects)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Read/write throughput of the DB_PROFILE engine settings under concurrent threads.
+
+    python -m app.dbbench [--seconds 10] [--readers 8] [--writers 2] [--profiles default,production]
+
+Each profile gets a fresh temporary database seeded with projects,
+assignments and allocations. Reader threads load a project with its
+assignments and allocations (what GET /projects/{id} does); writer threads
+add an assignment with one allocation and commit, with the usual flush
+hooks (rollup, versions, change log) running.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from . import changes, intervals, models, rollup, versions # noqa: F401 (register hooks)
+from .database import make_engine, warm_up
+
+
+def seed(Session, projects: int = 200, assignments_per_project: int = 20):
+    db = Session()
+    start = date(2026, 1, 1)
+    for p in range(projects):
+        db.add(models.Project(
+            name=f"Project {p}", customer_id=p % 10, contract_amount=1_000_000, status="Contracted",
+            start_date=start, end_date=start + timedelta(days=364),
+            assignments=[
+                models.Assignment(
+                    employee_id=random.randint(1, 2000), start_date=start, end_date=start + timedelta(days=89),
+                    allocations=[models.Allocation(start_date=start, end_date=start + timedelta(days=89), effort_percent=50)],
+                )
+                for _ in range(assignments_per_project)
+            ],
+        ))
+    db.commit()
+    db.close()
+
+
+def run(profile: str, seconds: float, readers: int, writers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        models.Base.metadata.create_all(bind=engine)
+        # Random bookings routinely over-allocate; measure the writes, not the 409s
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"check_allocations": False})
+        seed(Session)
+        if profile == "production":
+            warm_up(engine)
+
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def reader():
+            db = Session()
+            done = 0
+            while time.perf_counter() < deadline:
+                db.query(models.Project).options(
+                    selectinload(models.Project.assignments).selectinload(models.Assignment.allocations)
+                ).filter(models.Project.id == random.randint(1, 200)).one()
+                db.rollback() # end the read transaction like a request would
+                done += 1
+            db.close()
+            with lock:
+                counts["reads"] += done
+
+        def writer():
+            db = Session()
+            done = errors = 0
+            while time.perf_counter() < deadline:
+                day = date(2026, 1, 1) + timedelta(days=random.randint(0, 300))
+                db.add(models.Assignment(
+                    project_id=random.randint(1, 200), employee_id=random.randint(1, 2000),
+                    start_date=day, end_date=day + timedelta(days=30),
+                    allocations=[models.Allocation(start_date=day, end_date=day + timedelta(days=30), effort_percent=20)],
+                ))
+                try:
+                    db.commit()
+                    done += 1
+                except OperationalError:
+                    db.rollback()
+                    errors += 1
+            db.close()
+            with lock:
+                counts["writes"] += done
+                counts["errors"] += errors
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        engine.dispose()
+    return {k: v / seconds if k != "errors" else v for k, v in counts.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DB_PROFILE engine settings")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--profiles", default="default,production")
+    args = parser.parse_args(argv)
+
+    print(f"{'profile':<12}{'reads/s':>10}{'writes/s':>10}{'errors':>8}")
+    for profile in args.profiles.split(","):
+        result = run(profile, args.seconds, args.readers, args.writers)
+        print(f"{profile:<12}{result['reads']:>10.0f}{result['writes']:>10.0f}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Change notifications for caches downstream (e.g. the frontend BFF).
+
+Committed writes publish topics such as "projects", "project:5",
+"assignments" or "utilization". In-process subscribers are called
+directly; URLs listed in CHANGE_SUBSCRIBERS (comma separated) receive
+{"topics": [...]} as a JSON POST from a background thread, so a slow or
+missing subscriber never delays the request that made the change.
+"""
+import json
+import os
+import queue
+import threading
+import urllib.request
+from typing import Callable, Iterable, List
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+SUBSCRIBER_URLS = [u.strip() for u in os.getenv("CHANGE_SUBSCRIBERS", "").split(",") if u.strip()]
+TIMEOUT = float(os.getenv("CHANGE_SUBSCRIBERS_TIMEOUT", 2.0))
+
+_listeners: List[Callable[[List[str]], None]] = []
+_outbox: "queue.Queue[List[str]]" = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def subscribe(callback: Callable[[List[str]], None]):
+    _listeners.append(callback)
+
+
+def unsubscribe(callback: Callable[[List[str]], None]):
+    _listeners.remove(callback)
+
+
+def publish(topics: Iterable[str]):
+    topics = sorted(set(topics))
+    if not topics:
+        return
+    for callback in list(_listeners):
+        try:
+            callback(topics)
+        except Exception as e:
+            print(f"Change listener failed: {e}")
+    if SUBSCRIBER_URLS:
+        _ensure_worker()
+        _outbox.put(topics)
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_deliver, name="change-publisher", daemon=True)
+            _worker.start()
+
+
+def _deliver():
+    while True:
+        topics = _outbox.get()
+        # Coalesce whatever else queued up meanwhile into one notification
+        while not _outbox.empty():
+            topics = sorted(set(topics) | set(_outbox.get()))
+        body = json.dumps({"topics": topics}).encode()
+        for url in SUBSCRIBER_URLS:
+            req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(req, timeout=TIMEOUT).close()
+            except OSError as e:
+                print(f"Change notification to {url} failed: {e}")
+
+
+def touch(session: Session, *topics: str):
+    """Publish `topics` when the session commits (for Core writes that skip the flush hooks)."""
+    session.info.setdefault("change_topics", set()).update(topics)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    topics = session.info.setdefault("change_topics", set())
+    assignment_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Project):
+            topics.update(("projects", f"project:{obj.id}"))
+        elif isinstance(obj, models.Assignment):
+            topics.update(("assignments", "utilization", f"project:{obj.project_id}"))
+        elif isinstance(obj, models.Allocation):
+            topics.update(("allocations", "utilization"))
+            assignment_ids.add(obj.assignment_id)
+        elif isinstance(obj, models.Billing):
+            topics.update(("billings", f"project:{obj.project_id}"))
+    if assignment_ids:
+        project_ids = session.connection().execute(
+            select(models.Assignment.project_id).where(models.Assignment.id.in_(assignment_ids))
+        ).scalars()
+        topics.update(f"project:{pid}" for pid in project_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    topics = session.info.pop("change_topics", None)
+    if topics:
+        publish(topics)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("change_topics", None)
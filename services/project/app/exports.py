@@ -0,0 +1,209 @@
+"""Streaming CSV / XLSX exports.
+
+Rows come from `yield_per` cursors and are encoded as they arrive, so
+memory stays flat however many rows are exported and the first bytes go
+out before the query finishes. XLSX is written as a zip stream (inline
+strings, one worksheet) without building the workbook in memory.
+"""
+import csv
+import io
+import zipfile
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import intervals, models, utilization
+
+BATCH_ROWS = 1000 # rows fetched per cursor batch / encoded per chunk
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+# --- Row sources -------------------------------------------------------------
+
+BILLING_COLUMNS = ["billing_id", "project_id", "project_name", "customer_id", "billing_date", "amount", "status"]
+
+
+def billing_rows(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[tuple]:
+    query = (
+        select(models.Billing.id, models.Billing.project_id, models.Project.name, models.Project.customer_id,
+               models.Billing.billing_date, models.Billing.amount, models.Billing.status)
+        .join(models.Project, models.Project.id == models.Billing.project_id, isouter=True)
+        .order_by(models.Billing.billing_date, models.Billing.id)
+    )
+    if start:
+        query = query.where(models.Billing.billing_date >= start)
+    if end:
+        query = query.where(models.Billing.billing_date <= end)
+    yield from db.execute(query.execution_options(yield_per=BATCH_ROWS))
+
+
+ALLOCATION_COLUMNS = ["allocation_id", "assignment_id", "project_id", "employee_id", "start_date", "end_date", "effort_percent"]
+
+
+def allocation_rows(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[tuple]:
+    query = intervals.filter_overlapping(
+        db.query(models.Allocation.id, models.Allocation.assignment_id, models.Assignment.project_id,
+                 models.Assignment.employee_id, models.Allocation.start_date, models.Allocation.end_date,
+                 models.Allocation.effort_percent)
+        .join(models.Assignment, models.Assignment.id == models.Allocation.assignment_id)
+        .order_by(models.Allocation.id),
+        db, start, end,
+    )
+    yield from query.yield_per(BATCH_ROWS)
+
+
+def utilization_columns(start: date, months: int) -> List[str]:
+    return ["employee_id"] + [first.strftime("%Y-%m") for first, _ in utilization.month_windows(start, months)]
+
+
+def utilization_rows(db: Session, start: date, months: int, employee_ids: Optional[List[int]] = None) -> Iterator[list]:
+    """One row per employee: employee_id then effort percent per month, read from the rollup in employee order."""
+    windows = utilization.month_windows(start, months)
+    index = {first: i for i, (first, _) in enumerate(windows)}
+    rollup = models.EmployeeMonthUtilization
+    query = (
+        select(rollup.employee_id, rollup.month, rollup.effort_percent)
+        .where(rollup.month >= windows[0][0], rollup.month <= windows[-1][0])
+        .order_by(rollup.employee_id, rollup.month)
+    )
+    if employee_ids:
+        query = query.where(rollup.employee_id.in_(employee_ids))
+    result = db.execute(query.execution_options(yield_per=BATCH_ROWS))
+    for emp_id, cells in groupby(result, key=lambda r: r[0]):
+        percents = [0.0] * months
+        for _, month, percent in cells:
+            percents[index[month]] = round(percent or 0.0, 2)
+        if any(percents):
+            yield [emp_id] + percents
+
+
+# --- Encoders ----------------------------------------------------------------
+
+def stream(fmt: str, columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    return stream_xlsx(columns, rows) if fmt == "xlsx" else stream_csv(columns, rows)
+
+
+def stream_csv(columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff") # BOM so Excel opens UTF-8 (Japanese names) correctly
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= BATCH_ROWS:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue().encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer drained by the generator (zipfile then streams with data descriptors)."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+_EXCEL_EPOCH = date(1899, 12, 30).toordinal()
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Style 1 = built-in date format (numFmtId 14)
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, date):
+        return f'<c s="1"><v>{value.toordinal() - _EXCEL_EPOCH}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def stream_xlsx(columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_PARTS.items():
+            zf.writestr(name, content)
+        yield sink.drain()
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(("<row>" + "".join(_cell(c) for c in columns) + "</row>").encode())
+            parts, pending = [], 0
+            for row in rows:
+                parts.append("<row>" + "".join(_cell(v) for v in row) + "</row>")
+                pending += 1
+                if pending >= BATCH_ROWS:
+                    sheet.write("".join(parts).encode())
+                    parts, pending = [], 0
+                    yield sink.drain()
+            sheet.write(("".join(parts) + "</sheetData></worksheet>").encode())
+    yield sink.drain()
@@ -0,0 +1,170 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import conflicts, events, models, rollup, schemas, versions
+
+CSV_COLUMNS = ["project_id", "employee_id", "start_date", "end_date", "effort_percent"]
+
+
+def allocation_errors(allocations: List[schemas.AllocationBase]) -> Optional[str]:
+    if not allocations:
+        return "Allocations required"
+    for alloc in allocations:
+        if alloc.start_date > alloc.end_date:
+            return f"Allocation {alloc.start_date} - {alloc.end_date} ends before it starts"
+        if not 0 <= alloc.effort_percent <= 100:
+            return f"effort_percent must be between 0 and 100, got {alloc.effort_percent}"
+    return None
+
+
+def bulk_create_assignments(db: Session, rows: List[Tuple[Optional[int], schemas.BulkAssignmentCreate]]) -> dict:
+    """Validate and insert assignments with their allocations in one transaction.
+
+    `rows` pairs each assignment with the source line it came from (None for JSON).
+    Invalid rows, and rows that would over-allocate their employee (see
+    app.conflicts), are reported and skipped; the rest are inserted with two
+    executemany INSERTs and committed together.
+    """
+    errors = []
+    project_ids = {row.project_id for _, row in rows}
+    existing = {
+        pid for (pid,) in db.query(models.Project.id).filter(models.Project.id.in_(project_ids))
+    } if project_ids else set()
+
+    valid = []
+    for index, (line, row) in enumerate(rows):
+        detail = None
+        if row.project_id not in existing:
+            detail = f"Project {row.project_id} not found"
+        else:
+            detail = allocation_errors(row.allocations)
+        if detail:
+            errors.append({"index": index, "line": line, "detail": detail})
+        else:
+            valid.append((index, line, row))
+
+    valid = _reject_overallocated(db, valid, errors)
+    if not valid:
+        return {"created": [], "errors": errors}
+
+    assignment_ids = db.scalars(
+        insert(models.Assignment).returning(models.Assignment.id, sort_by_parameter_order=True),
+        [
+            {
+                "project_id": row.project_id,
+                "employee_id": row.employee_id,
+                "start_date": min(a.start_date for a in row.allocations),
+                "end_date": max(a.end_date for a in row.allocations),
+            }
+            for row in valid
+        ],
+    ).all()
+
+    alloc_rows = []
+    deltas = defaultdict(float)
+    for assignment_id, row in zip(assignment_ids, valid):
+        for alloc in row.allocations:
+            alloc_rows.append({"assignment_id": assignment_id, **alloc.dict()})
+            rollup.add_allocation(deltas, row.employee_id, alloc.start_date, alloc.end_date, alloc.effort_percent)
+    db.execute(insert(models.Allocation), alloc_rows)
+    versions.bump(db, "assignments", "allocations")
+
+    # Bulk INSERTs bypass the flush hooks, so maintain the rollup explicitly
+    rollup.apply_deltas(db, deltas)
+    events.touch(db, "assignments", "allocations", "utilization", *(f"project:{row.project_id}" for row in valid))
+    db.commit()
+    return {"created": list(assignment_ids), "errors": errors}
+
+
+def _reject_overallocated(db: Session, valid, errors):
+    """Drop (and report) rows that would over-allocate their employee, given stored rows and earlier rows of the batch."""
+    if not conflicts.CHECK_WRITES or not db.info.get("check_allocations", True):
+        return valid
+    def to_intervals(row):
+        return [conflicts.Interval(a.start_date.toordinal(), a.end_date.toordinal(), a.effort_percent, None) for a in row.allocations]
+
+    pending = defaultdict(list)
+    for _, _, row in valid:
+        pending[row.employee_id].extend(to_intervals(row))
+    if not conflicts.check_pending(db, pending):
+        return [row for _, _, row in valid]
+
+    # Some rows conflict: accept rows one by one, treating accepted ones as stored
+    stored = dict(conflicts.load_intervals(db, pending.keys()))
+    accepted = []
+    for index, line, row in valid:
+        rows = to_intervals(row)
+        found = conflicts.employee_conflicts(row.employee_id, stored.get(row.employee_id, []) + rows, pending_only=True)
+        if found:
+            first = found[0]
+            errors.append({"index": index, "line": line, "detail": (
+                f"Employee {row.employee_id} would be allocated {first.peak_percent:g}% "
+                f"from {first.start_date} to {first.end_date} (limit {conflicts.THRESHOLD:g}%)"
+            )})
+            continue
+        # Accepted rows count as stored (non-pending) for the rows after them
+        stored.setdefault(row.employee_id, []).extend(r._replace(allocation_id=0) for r in rows)
+        accepted.append(row)
+    return accepted
+
+
+def parse_upload(content: bytes, filename: str, content_type: Optional[str]):
+    """Parse a CSV or NDJSON staffing plan into (rows, errors).
+
+    CSV has one allocation per line (see CSV_COLUMNS); lines for the same
+    project and employee are grouped into a single assignment. NDJSON has one
+    BulkAssignmentCreate object per line.
+    """
+    text = content.decode("utf-8-sig")
+    if (content_type or "").endswith("ndjson") or filename.endswith((".ndjson", ".jsonl")):
+        return _parse_ndjson(text)
+    return _parse_csv(text)
+
+
+def _parse_ndjson(text: str):
+    rows, errors = [], []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((line_no, schemas.BulkAssignmentCreate(**json.loads(line))))
+        except (ValueError, TypeError, ValidationError) as e:
+            errors.append({"index": None, "line": line_no, "detail": str(e)})
+    return rows, errors
+
+
+def _parse_csv(text: str):
+    errors = []
+    groups = {} # (project_id, employee_id) -> (first line, [allocations])
+    reader = csv.DictReader(io.StringIO(text))
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        return [], [{"index": None, "line": 1, "detail": f"Missing columns: {', '.join(sorted(missing))}"}]
+
+    for record in reader:
+        line_no = reader.line_num
+        try:
+            key = (int(record["project_id"]), int(record["employee_id"]))
+            alloc = schemas.AllocationBase(
+                start_date=date.fromisoformat(record["start_date"].strip()),
+                end_date=date.fromisoformat(record["end_date"].strip()),
+                effort_percent=int(record["effort_percent"]),
+            )
+        except (ValueError, TypeError, AttributeError, ValidationError) as e:
+            errors.append({"index": None, "line": line_no, "detail": str(e)})
+            continue
+        groups.setdefault(key, (line_no, []))[1].append(alloc)
+
+    rows = [
+        (line_no, schemas.BulkAssignmentCreate(project_id=pid, employee_id=eid, allocations=allocs))
+        for (pid, eid), (line_no, allocs) in groups.items()
+    ]
+    return rows, errors
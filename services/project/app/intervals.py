@@ -0,0 +1,116 @@
+"""Overlap queries on Allocation date ranges.
+
+On SQLite an R*Tree virtual table (`allocation_rtree`) mirrors each
+allocation's [start_date, end_date] as day ordinals and is kept in sync by
+triggers, so "overlaps [start, end]" is a logarithmic index probe. Other
+backends (or ALLOCATION_INTERVAL_INDEX=none) fall back to the composite
+(end_date, start_date) B-tree index. Whether a database has the R*Tree is
+looked up once per database and remembered, so overlap queries don't pay
+a sqlite_master lookup each.
+"""
+import os
+from datetime import date
+from typing import Dict, Optional
+
+from sqlalchemy import column, event, inspect, select, table, text
+from sqlalchemy.orm import Query, Session
+
+from . import models
+
+RTREE_TABLE = "allocation_rtree"
+ENABLED = os.getenv("ALLOCATION_INTERVAL_INDEX", "rtree") == "rtree"
+
+# julianday('0001-01-01') - 1, so that day numbers match date.toordinal()
+_DAY = "CAST(julianday({}) - 1721424.5 AS INTEGER)"
+
+_rtree = table(RTREE_TABLE, column("id"), column("start_day"), column("end_day"))
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree_i32(id, start_day, end_day)",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ai AFTER INSERT ON allocations BEGIN
+        INSERT INTO {RTREE_TABLE} SELECT NEW.id, {_DAY.format("NEW.start_date")}, {_DAY.format("NEW.end_date")}
+        WHERE NEW.start_date IS NOT NULL AND NEW.end_date IS NOT NULL AND NEW.start_date <= NEW.end_date;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_au AFTER UPDATE OF start_date, end_date ON allocations BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+        INSERT INTO {RTREE_TABLE} SELECT NEW.id, {_DAY.format("NEW.start_date")}, {_DAY.format("NEW.end_date")}
+        WHERE NEW.start_date IS NOT NULL AND NEW.end_date IS NOT NULL AND NEW.start_date <= NEW.end_date;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_ad AFTER DELETE ON allocations BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+    END""",
+]
+
+_BACKFILL = f"""INSERT INTO {RTREE_TABLE}
+    SELECT id, {_DAY.format("start_date")}, {_DAY.format("end_date")} FROM allocations
+    WHERE start_date IS NOT NULL AND end_date IS NOT NULL AND start_date <= end_date"""
+
+
+def _has_rtree(conn) -> bool:
+    # conn may be a Connection or a Session
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": RTREE_TABLE}
+    ).first() is not None
+
+
+_rtree_present: Dict[str, bool] = {} # database URL -> R*Tree installed; set by install(), dropped with the table
+
+
+def _rtree_installed(db: Session) -> bool:
+    key = str(db.get_bind().engine.url)
+    if key not in _rtree_present:
+        _rtree_present[key] = _has_rtree(db)
+    return _rtree_present[key]
+
+
+def install(connection):
+    """Create missing allocation / assignment indexes (older databases) and the R*Tree with its triggers,
+    backfilling existing rows."""
+    # create_all() skips indexes of tables that already exist
+    for index in models.Assignment.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    columns = {c["name"] for c in inspect(connection).get_columns("allocations")}
+    if not {"start_date", "end_date"} <= columns:
+        # Database predates dated allocations; nothing to index
+        return
+    for index in models.Allocation.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    if not ENABLED or connection.dialect.name != "sqlite":
+        return
+    backfill = not _has_rtree(connection)
+    for ddl in _DDL:
+        connection.exec_driver_sql(ddl)
+    if backfill:
+        connection.exec_driver_sql(_BACKFILL)
+    _rtree_present[str(connection.engine.url)] = True
+
+
+@event.listens_for(models.Allocation.__table__, "after_create")
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+@event.listens_for(models.Allocation.__table__, "before_drop")
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {RTREE_TABLE}")
+        _rtree_present.pop(str(connection.engine.url), None)
+
+
+def filter_overlapping(query: Query, db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Query:
+    """Restrict an Allocation query to rows overlapping [start, end] (either bound optional)."""
+    if start is None and end is None:
+        return query
+    if ENABLED and db.get_bind().dialect.name == "sqlite" and _rtree_installed(db):
+        ids = select(_rtree.c.id)
+        if start is not None:
+            ids = ids.where(_rtree.c.end_day >= start.toordinal())
+        if end is not None:
+            ids = ids.where(_rtree.c.start_day <= end.toordinal())
+        return query.filter(models.Allocation.id.in_(ids))
+
+    if start is not None:
+        query = query.filter(models.Allocation.end_date >= start)
+    if end is not None:
+        query = query.filter(models.Allocation.start_date <= end)
+    return query
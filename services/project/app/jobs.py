@@ -0,0 +1,110 @@
+"""Project-service background jobs: long reports and recomputations.
+
+The queue itself (claiming, heartbeats, the process pool and the CLI) is
+shared with resource-service; see services/common/jobqueue.py. This module
+builds project-service's queue over models.Job and registers the job kinds
+it runs. Export results are files under JOB_DIR.
+
+    python -m app.jobs worker [--workers N]     # drain the queue until interrupted
+    python -m app.jobs run-once                 # run queued jobs inline
+    python -m app.jobs prune --keep-days N      # delete old jobs and their files
+"""
+import os
+import time
+import uuid
+from datetime import date
+from typing import Optional
+
+from jobqueue import JobQueue, UnknownJobKind # noqa: F401 (re-exported)
+from sqlalchemy.orm import Session
+
+from . import models, versions
+from . import changes, conflicts, costing, dashboard, events, exports, revenue, rollup, scenarios # noqa: F401 (register hooks)
+from .database import SessionLocal, make_engine
+
+JOB_DIR = os.getenv("JOB_DIR", "./job_results")
+
+queue = JobQueue(models.Job, SessionLocal, make_engine, versions.current, module="app.jobs")
+kind = queue.kind
+submit = queue.submit
+claim = queue.claim
+cancel = queue.cancel
+run_next = queue.run_next
+result_file = queue.result_file
+lifespan = queue.lifespan
+
+
+def _date(value) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+# Not cached: unit costs live in resource-service, outside the table versions of the key
+@kind("pnl", tables=["projects", "assignments", "allocations", "scenario_allocations"])
+def _pnl(db: Session, params: dict, progress):
+    from .resource_client import get_resource_client
+    results, missing = costing.portfolio_pnl(
+        db, get_resource_client(), project_ids=params.get("ids"), statuses=params.get("status"),
+        breakdown=params.get("breakdown", False), scenario_id=params.get("scenario_id"),
+    )
+    return costing.portfolio_totals(results, missing)
+
+
+@kind("conflicts", cache=True, tables=["assignments", "allocations"])
+def _conflicts(db: Session, params: dict, progress):
+    found = conflicts.audit(db, params.get("employee_ids"), _date(params.get("start_date")), _date(params.get("end_date")),
+                            params.get("threshold", conflicts.THRESHOLD))
+    return {"threshold": params.get("threshold", conflicts.THRESHOLD), "conflicts": [c._asdict() for c in found]}
+
+
+@kind("rebuild_utilization")
+def _rebuild_utilization(db: Session, params: dict, progress):
+    progress(0.0, "Recomputing employee_month_utilization")
+    return {"rows": rollup.rebuild(db, params.get("employee_ids"))}
+
+
+@kind("refresh_dashboard", tables=dashboard.TABLES)
+def _refresh_dashboard(db: Session, params: dict, progress):
+    return dashboard.refresh(db)
+
+
+@kind("rebuild_billing_totals")
+def _rebuild_billing_totals(db: Session, params: dict, progress):
+    return {"rows": revenue.rebuild(db.connection())}
+
+
+EXPORT_SOURCES = {
+    "billings": lambda db, p: (exports.BILLING_COLUMNS, exports.billing_rows(db, _date(p.get("from")), _date(p.get("to")))),
+    "allocations": lambda db, p: (exports.ALLOCATION_COLUMNS, exports.allocation_rows(db, _date(p.get("start_date")), _date(p.get("end_date")))),
+    "utilization": lambda db, p: (
+        exports.utilization_columns(_month(p), p.get("months", 12)),
+        exports.utilization_rows(db, _month(p), p.get("months", 12), p.get("employee_ids")),
+    ),
+}
+
+
+def _month(params: dict) -> date:
+    return (_date(params.get("from")) or versions.utc_today()).replace(day=1)
+
+
+@kind("export", cache=True, tables=["billings", "projects", "allocations", "assignments", "employee_month_utilization"])
+def _export(db: Session, params: dict, progress):
+    name, fmt = params.get("name"), params.get("format", "csv")
+    if name not in EXPORT_SOURCES or fmt not in exports.MEDIA_TYPES:
+        raise ValueError(f"name must be one of {', '.join(EXPORT_SOURCES)} and format csv or xlsx")
+    columns, rows = EXPORT_SOURCES[name](db, params)
+    os.makedirs(JOB_DIR, exist_ok=True)
+    filename = f"{name}-{versions.utc_today().isoformat()}.{fmt}"
+    path = os.path.join(JOB_DIR, f"{uuid.uuid4().hex}.{fmt}")
+    written, reported = 0, time.monotonic()
+    with open(path, "wb") as f:
+        for chunk in exports.stream(fmt, columns, rows):
+            f.write(chunk)
+            written += len(chunk)
+            if time.monotonic() - reported >= 1.0:
+                progress(0.0, f"{written} bytes written")
+                reported = time.monotonic()
+    return {"path": os.path.abspath(path), "filename": filename, "media_type": exports.MEDIA_TYPES[fmt], "bytes": written}
+
+
+if __name__ == "__main__":
+    queue.main()
@@ -1,12 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from . import models, schemas
-from .database import engine, get_db
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, UploadFile, File
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from contextlib import asynccontextmanager
+import json
+from typing import List, Optional
+from datetime import date
+from . import models, schemas, utilization, rollup, intervals, ingest, costing, staffing, events, versions, changes, exports, revenue, conflicts, planner, scenarios, jobs, dashboard
+from .resource_client import ResourceClient, get_resource_client
+import requests
+from .database import DB_PROFILE, engine, get_async_db, get_db, warm_up
 
 models.Base.metadata.create_all(bind=engine)
+with engine.begin() as conn:
+    # create_all() skips indexes of tables that already exist (e.g. the project list filters)
+    for index in models.Project.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    intervals.install(conn)
+    revenue.install(conn)
+    jobs.queue.install(conn)
+if DB_PROFILE == "production":
+    warm_up(engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    async with jobs.lifespan(app), dashboard.lifespan(app):
+        yield
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(conflicts.OverAllocated)
+def over_allocated(request, exc: conflicts.OverAllocated):
+    # Raised by the flush hook on any allocation write; the request's session is rolled back on close
+    return JSONResponse(status_code=409, content={
+        "detail": str(exc),
+        "threshold": exc.threshold,
+        "conflicts": [schemas.OverAllocation(**c._asdict()).model_dump(mode="json") for c in exc.conflicts],
+    })
+
+# Eager-load nested assignments -> allocations serialized by schemas.Project
+# in two extra SELECT ... IN queries instead of one lazy load per assignment
+PROJECT_DETAIL_OPTIONS = selectinload(models.Project.assignments).selectinload(models.Assignment.allocations)
+ASSIGNMENT_DETAIL_OPTIONS = selectinload(models.Assignment.allocations)
+
+def get_project_detail(db: Session, project_id: int):
+    return (
+        db.query(models.Project)
+        .options(PROJECT_DETAIL_OPTIONS)
+        .filter(models.Project.id == project_id)
+        .populate_existing()
+        .first()
+    )
 
 @app.post("/projects/", response_model=schemas.Project, status_code=201)
 def create_project(proj: schemas.ProjectCreate, db: Session = Depends(get_db)):
@@ -16,9 +61,76 @@ def create_project(proj: schemas.ProjectCreate, db: Session = Depends(get_db)):
     db.refresh(new_proj)
     return new_proj
 
+def parse_ids(value: Optional[str], name: str) -> Optional[List[int]]:
+    # Comma separated integer lists, e.g. ?employee_ids=1,2,3
+    if not value:
+        return None
+    try:
+        return [int(i) for i in value.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be comma separated integers")
+
+@app.get("/projects/")
+def list_projects(
+    response: Response,
+    after: Optional[int] = Query(None, description="Keyset cursor: id of the last project already seen"),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[str] = Query(None, description="Comma separated statuses"),
+    customer_id: Optional[int] = None,
+    ids: Optional[str] = None,
+    from_date: Optional[date] = Query(None, alias="from", description="Projects running on or after this date"),
+    to_date: Optional[date] = Query(None, alias="to", description="Projects running on or before this date"),
+    view: str = Query("summary", pattern="^(summary|full)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    query = db.query(models.Project).order_by(models.Project.id)
+    if after is not None:
+        query = query.filter(models.Project.id > after)
+    if status:
+        query = query.filter(models.Project.status.in_(status.split(",")))
+    if customer_id is not None:
+        query = query.filter(models.Project.customer_id == customer_id)
+    if ids:
+        query = query.filter(models.Project.id.in_(parse_ids(ids, "ids")))
+    if from_date:
+        query = query.filter(models.Project.end_date >= from_date)
+    if to_date:
+        query = query.filter(models.Project.start_date <= to_date)
+
+    schema = schemas.ProjectSummary
+    if view == "full":
+        schema = schemas.Project
+        query = query.options(PROJECT_DETAIL_OPTIONS)
+
+    if format == "ndjson":
+        # Export: stream every matching row after the cursor, ignoring `limit`.
+        # selectinload eager loads per yielded batch, so memory stays bounded.
+        def rows():
+            for proj in query.yield_per(500):
+                yield json.dumps(schema.model_validate(proj).model_dump(mode="json"), ensure_ascii=False) + "\n"
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    page = query.limit(limit + 1).all()
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = str(page[-1].id)
+    return [schema.model_validate(proj).model_dump(mode="json") for proj in page]
+
+@app.get("/dashboard", response_model=schemas.Dashboard,
+         dependencies=[Depends(versions.conditional("dashboard_snapshots", *dashboard.TABLES))])
+def read_dashboard(db: Session = Depends(get_db)):
+    # Precomputed KPIs (see app/dashboard.py); check `stale` / `computed_at` for freshness
+    snapshot = dashboard.read(db)
+    if snapshot is None:
+        # Queued by the refresher at startup; a job worker has to run it (see app/dashboard.py)
+        raise HTTPException(status_code=503, detail="Dashboard snapshot not computed yet",
+                            headers={"Retry-After": "5"})
+    return snapshot
+
 @app.get("/projects/{project_id}", response_model=schemas.Project)
 def read_project(project_id: int, db: Session = Depends(get_db)):
-    proj = db.query(models.Project).filter(models.Project.id == project_id).first()
+    proj = get_project_detail(db, project_id)
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
     return proj
@@ -34,62 +146,439 @@ def update_project(project_id: int, proj: schemas.ProjectCreate, db: Session = D
         setattr(db_proj, key, value)
     
     db.commit()
-    db.refresh(db_proj)
-    return db_proj
+    return get_project_detail(db, project_id)
 
-@app.post("/projects/{project_id}/assignments", response_model=schemas.Assignment, status_code=201)
-def create_assignment(project_id: int, assign: schemas.AssignmentCreate, db: Session = Depends(get_db)):
-    # Verify Project Exists
-    proj = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not proj:
+def compute_pnl(db: Session, client: ResourceClient, **filters):
+    try:
+        return costing.portfolio_pnl(db, client, **filters)
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"resource-service unavailable: {e}")
+    except scenarios.ScenarioNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/projects/{project_id}/pnl", response_model=schemas.ProjectPnl)
+def read_project_pnl(
+    project_id: int,
+    scenario_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    client: ResourceClient = Depends(get_resource_client)
+):
+    results, missing = compute_pnl(db, client, project_ids=[project_id], scenario_id=scenario_id)
+    if not results:
         raise HTTPException(status_code=404, detail="Project not found")
+    return {**results[0], "missing_cost_employee_ids": missing}
+
+@app.get("/pnl", response_model=schemas.PortfolioPnl)
+def read_portfolio_pnl(
+    ids: Optional[str] = None,
+    status: Optional[str] = Query(None, description="Comma separated statuses"),
+    breakdown: bool = False,
+    scenario_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    client: ResourceClient = Depends(get_resource_client)
+):
+    results, missing = compute_pnl(
+        db, client, project_ids=parse_ids(ids, "ids"),
+        statuses=status.split(",") if status else None, breakdown=breakdown, scenario_id=scenario_id
+    )
+    return costing.portfolio_totals(results, missing)
 
+def build_assignment(project_id: int, assign: schemas.AssignmentCreate) -> models.Assignment:
     # Determine overall start/end date from allocations
-    if not assign.allocations:
-        raise HTTPException(status_code=400, detail="Allocations required")
-    
     dates = [a.start_date for a in assign.allocations] + [a.end_date for a in assign.allocations]
     min_date = min(dates)
     max_date = max(dates)
 
-    # Create Assignment
-    new_assign = models.Assignment(
+    return models.Assignment(
         project_id=project_id,
         employee_id=assign.employee_id,
         start_date=min_date,
-        end_date=max_date
+        end_date=max_date,
+        allocations=[
+            models.Allocation(
+                start_date=alloc.start_date,
+                end_date=alloc.end_date,
+                effort_percent=alloc.effort_percent
+            )
+            for alloc in assign.allocations
+        ]
     )
+
+@app.post("/projects/{project_id}/assignments", response_model=schemas.Assignment, status_code=201)
+def create_assignment(project_id: int, assign: schemas.AssignmentCreate, db: Session = Depends(get_db)):
+    # Verify Project Exists
+    proj = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not proj:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    detail = ingest.allocation_errors(assign.allocations)
+    if detail:
+        raise HTTPException(status_code=400, detail=detail)
+
+    # Assignment and its allocations in one transaction
+    new_assign = build_assignment(project_id, assign)
     db.add(new_assign)
     db.commit()
-    db.refresh(new_assign)
-
-    # Create Allocations
-    for alloc in assign.allocations:
-        new_alloc = models.Allocation(
-            assignment_id=new_assign.id,
-            start_date=alloc.start_date,
-            end_date=alloc.end_date,
-            effort_percent=alloc.effort_percent
-        )
-        db.add(new_alloc)
-    
-    db.commit()
-    db.refresh(new_assign)
-    return new_assign
-
-@app.get("/allocations", response_model=List[schemas.Allocation])
-def get_allocations(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    query = db.query(models.Allocation)
-    if start_date:
-        query = query.filter(models.Allocation.end_date >= start_date) # Overlap check
-    if end_date:
-        query = query.filter(models.Allocation.start_date <= end_date) # Overlap check
+
+    return (
+        db.query(models.Assignment)
+        .options(ASSIGNMENT_DETAIL_OPTIONS)
+        .filter(models.Assignment.id == new_assign.id)
+        .populate_existing()
+        .one()
+    )
+
+@app.post("/assignments:bulk", response_model=schemas.BulkResult)
+def bulk_create_assignments(rows: List[schemas.BulkAssignmentCreate], db: Session = Depends(get_db)):
+    return ingest.bulk_create_assignments(db, [(None, row) for row in rows])
+
+@app.post("/assignments:import", response_model=schemas.BulkResult)
+def import_assignments(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    # CSV (one allocation per line) or NDJSON (one assignment per line)
+    rows, parse_errors = ingest.parse_upload(file.file.read(), file.filename or "", file.content_type)
+    result = ingest.bulk_create_assignments(db, rows)
+    result["errors"] = parse_errors + result["errors"]
+    return result
+
+@app.get("/allocations", response_model=List[schemas.Allocation], dependencies=[Depends(versions.conditional("allocations"))])
+def get_allocations(start_date: Optional[date] = None, end_date: Optional[date] = None, db: Session = Depends(get_db)):
+    query = intervals.filter_overlapping(db.query(models.Allocation), db, start_date, end_date)
     return query.all()
 
-@app.get("/assignments", response_model=List[schemas.Assignment])
+@app.get("/assignments", response_model=List[schemas.Assignment], dependencies=[Depends(versions.conditional("assignments", "allocations"))])
 def get_assignments(db: Session = Depends(get_db)):
-    return db.query(models.Assignment).all()
+    return db.query(models.Assignment).options(ASSIGNMENT_DETAIL_OPTIONS).all()
+
+UTILIZATION_TABLES = ("employee_month_utilization", "scenario_allocations", "scenarios")
+
+@app.get("/utilization", response_model=schemas.Utilization, dependencies=[Depends(versions.conditional(*UTILIZATION_TABLES))])
+def get_utilization(
+    employee_ids: Optional[str] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    months: int = Query(6, ge=1, le=36),
+    scenario_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    return utilization_response(db, parse_ids(employee_ids, "employee_ids"), from_date, months, scenario_id)
+
+def utilization_response(db: Session, ids: Optional[List[int]], from_date: Optional[date], months: int,
+                         scenario_id: Optional[int] = None) -> dict:
+    start = (from_date or versions.utc_today()).replace(day=1)
+    windows = utilization.month_windows(start, months)
+    matrix = utilization.monthly_utilization(db, start, months, ids)
+    if scenario_id is not None:
+        try:
+            matrix = scenarios.merge_utilization(db, scenario_id, matrix, start, months, ids)
+        except scenarios.ScenarioNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "months": [first.strftime("%Y-%m") for first, _ in windows],
+        "rows": [{"employee_id": emp_id, "percents": percents} for emp_id, percents in sorted(matrix.items())]
+    }
+
+@app.get("/conflicts", response_model=schemas.OverAllocationReport,
+         dependencies=[Depends(versions.conditional("assignments", "allocations"))])
+def read_conflicts(
+    employee_ids: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    threshold: float = Query(conflicts.THRESHOLD, ge=0),
+    db: Session = Depends(get_db)
+):
+    # Audit: every period where an employee's allocations add up to more than `threshold` percent
+    found = conflicts.audit(db, parse_ids(employee_ids, "employee_ids"), start_date, end_date, threshold)
+    return {"threshold": threshold, "conflicts": [c._asdict() for c in found]}
 
-@app.get("/billings", response_model=List[schemas.Billing])
+@app.get("/staffing/search", response_model=schemas.StaffingSearch)
+def search_staffing(
+    q: str,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    months: int = Query(3, ge=1, le=36),
+    max_booked: Optional[float] = Query(None, ge=0, description="Exclude anyone booked above this percent in any month"),
+    limit: int = Query(10, ge=1, le=100),
+    fit_weight: float = Query(0.5, ge=0, le=1),
+    db: Session = Depends(get_db),
+    client: ResourceClient = Depends(get_resource_client)
+):
+    # e.g. ?q=+sap&from=2026-04-01&to=2026-06-30&max_booked=50
+    start = (from_date or versions.utc_today()).replace(day=1)
+    if to_date:
+        months = (to_date.year - start.year) * 12 + to_date.month - start.month + 1
+        if not 1 <= months <= 36:
+            raise HTTPException(status_code=400, detail="from/to must span 1 to 36 months")
+    windows = utilization.month_windows(start, months)
+    try:
+        candidates, truncated = staffing.search(db, client, q, start, months, max_booked, limit, fit_weight)
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"resource-service unavailable: {e}")
+    return {"months": [first.strftime("%Y-%m") for first, _ in windows], "candidates": candidates, "truncated": truncated}
+
+@app.post("/plans", response_model=schemas.Plan)
+def create_plan(req: schemas.PlanRequest, db: Session = Depends(get_db), client: ResourceClient = Depends(get_resource_client)):
+    # Proposes a staffing plan; committed assignments are only read
+    threshold = conflicts.THRESHOLD if req.threshold is None else req.threshold
+    try:
+        return planner.plan(db, client, req.demands, req.objective, threshold, req.max_seconds)
+    except planner.PlanningError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"resource-service unavailable: {e}")
+
+@app.post("/scenarios", response_model=schemas.Scenario, status_code=201)
+def create_scenario(scenario: schemas.ScenarioCreate, db: Session = Depends(get_db)):
+    if db.query(models.Scenario.id).filter(models.Scenario.name == scenario.name).first():
+        raise HTTPException(status_code=409, detail=f"Scenario {scenario.name!r} already exists")
+    new_scenario = models.Scenario(**scenario.model_dump())
+    db.add(new_scenario)
+    db.commit()
+    return new_scenario
+
+@app.get("/scenarios", response_model=List[schemas.Scenario], dependencies=[Depends(versions.conditional("scenarios", "scenario_allocations"))])
+def list_scenarios(db: Session = Depends(get_db)):
+    counts = dict(
+        db.query(models.ScenarioAllocation.scenario_id, func.count())
+        .group_by(models.ScenarioAllocation.scenario_id)
+    )
+    return [
+        {**schemas.Scenario.model_validate(s).model_dump(), "changes": counts.get(s.id, 0)}
+        for s in db.query(models.Scenario).order_by(models.Scenario.id)
+    ]
+
+@app.get("/scenarios/{scenario_id}", response_model=schemas.ScenarioDetail)
+def read_scenario(scenario_id: int, db: Session = Depends(get_db)):
+    try:
+        scenario = scenarios.get(db, scenario_id)
+        rows = scenarios.overlay(db, scenario_id)
+    except scenarios.ScenarioNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {**schemas.Scenario.model_validate(scenario).model_dump(), "changes": len(rows), "allocations": rows}
+
+@app.delete("/scenarios/{scenario_id}", status_code=204)
+def delete_scenario(scenario_id: int, db: Session = Depends(get_db)):
+    scenario = db.get(models.Scenario, scenario_id)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    db.delete(scenario)
+    db.commit()
+    return Response(status_code=204)
+
+@app.post("/scenarios/{scenario_id}/allocations", response_model=schemas.ScenarioAllocation, status_code=201)
+def add_scenario_change(scenario_id: int, change: schemas.ScenarioChange, db: Session = Depends(get_db)):
+    # Edits the overlay only; the real assignments and allocations are untouched
+    scenario = db.get(models.Scenario, scenario_id)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    try:
+        row = scenarios.record(db, scenario, change)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return row
+
+@app.delete("/scenarios/{scenario_id}/allocations/{change_id}", status_code=204)
+def delete_scenario_change(scenario_id: int, change_id: int, db: Session = Depends(get_db)):
+    row = db.get(models.ScenarioAllocation, change_id)
+    if row is None or row.scenario_id != scenario_id:
+        raise HTTPException(status_code=404, detail="Scenario change not found")
+    db.delete(row)
+    db.commit()
+    return Response(status_code=204)
+
+def job_response(job: models.Job, reused: bool = False) -> dict:
+    return {
+        **{c: getattr(job, c) for c in ("id", "kind", "status", "progress", "message", "error", "created_at", "started_at", "finished_at")},
+        "params": json.loads(job.params or "{}"),
+        "reused": reused,
+    }
+
+@app.post("/jobs", response_model=schemas.Job, status_code=202)
+def create_job(req: schemas.JobCreate, db: Session = Depends(get_db)):
+    # e.g. {"kind": "pnl", "params": {"status": ["Contracted"]}}; poll GET /jobs/{id}
+    try:
+        job, reused = jobs.submit(db, req.kind, req.params)
+    except jobs.UnknownJobKind as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_response(job, reused)
+
+@app.get("/jobs", response_model=List[schemas.Job])
+def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = db.query(models.Job).order_by(models.Job.created_at.desc())
+    if status:
+        query = query.filter(models.Job.status.in_(status.split(",")))
+    if kind:
+        query = query.filter(models.Job.kind == kind)
+    return [job_response(job) for job in query.limit(limit)]
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@app.get("/jobs/{job_id}/result")
+def read_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    found = jobs.result_file(job)
+    if found:
+        return FileResponse(found["path"], media_type=found["media_type"], filename=found["filename"])
+    return JSONResponse(json.loads(job.result))
+
+@app.delete("/jobs/{job_id}", status_code=204)
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    if db.get(models.Job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not jobs.cancel(db, job_id):
+        raise HTTPException(status_code=409, detail="Job already started")
+    return Response(status_code=204)
+
+@app.get("/changes", response_model=schemas.ChangeFeed)
+def read_changes(
+    since: int = Query(0, ge=0, description="Cursor from the previous page's next_cursor"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    # Inserted / updated / deleted assignments, allocations and billings, oldest first
+    try:
+        return changes.read(db, since, limit)
+    except changes.CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+def export_response(fmt: str, name: str, columns, rows):
+    filename = f"{name}-{versions.utc_today().isoformat()}.{fmt}"
+    return StreamingResponse(
+        exports.stream(fmt, columns, rows),
+        media_type=exports.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/billings/export")
+def export_billings(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    return export_response(format, "billings", exports.BILLING_COLUMNS, exports.billing_rows(db, from_date, to_date))
+
+@app.get("/allocations/export")
+def export_allocations(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    return export_response(format, "allocations", exports.ALLOCATION_COLUMNS, exports.allocation_rows(db, start_date, end_date))
+
+@app.get("/utilization/export")
+def export_utilization(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    employee_ids: Optional[str] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    months: int = Query(12, ge=1, le=36),
+    db: Session = Depends(get_db)
+):
+    # Employees with no booking in the window are left out
+    start = (from_date or versions.utc_today()).replace(day=1)
+    rows = exports.utilization_rows(db, start, months, parse_ids(employee_ids, "employee_ids"))
+    return export_response(format, "utilization", exports.utilization_columns(start, months), rows)
+
+@app.get("/billings", response_model=List[schemas.Billing], dependencies=[Depends(versions.conditional("billings"))])
 def get_billings(db: Session = Depends(get_db)):
     return db.query(models.Billing).all()
+
+@app.get("/billings/summary", response_model=schemas.BillingSummary,
+         dependencies=[Depends(versions.conditional("billings", "billing_month_totals", "projects"))])
+def get_billing_summary(
+    group_by: str = Query("month", description="Comma separated: month, project, status, customer"),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    status: Optional[str] = Query(None, description="Comma separated statuses"),
+    project_ids: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    groups = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in revenue.GROUPS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by {unknown}; expected {revenue.GROUPS}")
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    return revenue.aggregate(db, list(dict.fromkeys(groups)), from_date, to_date, statuses, parse_ids(project_ids, "project_ids"))
+
+@app.get("/revenue/forecast", response_model=schemas.RevenueForecast,
+         dependencies=[Depends(versions.conditional("billings", "billing_month_totals", "projects"))])
+def get_revenue_forecast(
+    from_date: Optional[date] = Query(None, alias="from"),
+    months: int = Query(12, ge=1, le=36),
+    status: str = Query(",".join(revenue.FORECAST_STATUSES), description="Comma separated project statuses to recognize"),
+    db: Session = Depends(get_db)
+):
+    start = (from_date or versions.utc_today()).replace(day=1)
+    statuses = [s.strip() for s in status.split(",") if s.strip()]
+    return revenue.forecast(db, start, months, statuses)
+
+# --- Async variants ---------------------------------------------------------
+# Same responses on the async session (aiosqlite / asyncpg), so a request
+# waiting on the database holds no threadpool thread. The flush hooks
+# (rollup, versions, change log, events) run unchanged: AsyncSession drives
+# the same Session underneath.
+
+@app.get("/async/projects/{project_id}", response_model=schemas.Project)
+async def read_project_async(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(models.Project).options(PROJECT_DETAIL_OPTIONS).where(models.Project.id == project_id)
+    )
+    db_proj = result.scalar_one_or_none()
+    if db_proj is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return db_proj
+
+@app.post("/async/projects/{project_id}/assignments", response_model=schemas.Assignment, status_code=201)
+async def create_assignment_async(project_id: int, assign: schemas.AssignmentCreate, db: AsyncSession = Depends(get_async_db)):
+    if await db.get(models.Project, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    detail = ingest.allocation_errors(assign.allocations)
+    if detail:
+        raise HTTPException(status_code=400, detail=detail)
+
+    new_assign = build_assignment(project_id, assign)
+    db.add(new_assign)
+    await db.commit()
+
+    result = await db.execute(
+        select(models.Assignment).options(ASSIGNMENT_DETAIL_OPTIONS)
+        .where(models.Assignment.id == new_assign.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one()
+
+@app.get("/async/allocations", response_model=List[schemas.Allocation], dependencies=[Depends(versions.async_conditional("allocations"))])
+async def get_allocations_async(start_date: Optional[date] = None, end_date: Optional[date] = None, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(
+        lambda s: intervals.filter_overlapping(s.query(models.Allocation), s, start_date, end_date).all()
+    )
+
+@app.get("/async/assignments", response_model=List[schemas.Assignment], dependencies=[Depends(versions.async_conditional("assignments", "allocations"))])
+async def get_assignments_async(db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.Assignment).options(ASSIGNMENT_DETAIL_OPTIONS))
+    return result.scalars().all()
+
+@app.get("/async/utilization", response_model=schemas.Utilization, dependencies=[Depends(versions.async_conditional(*UTILIZATION_TABLES))])
+async def get_utilization_async(
+    employee_ids: Optional[str] = None,
+    from_date: Optional[date] = Query(None, alias="from"),
+    months: int = Query(6, ge=1, le=36),
+    scenario_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    ids = parse_ids(employee_ids, "employee_ids")
+    return await db.run_sync(utilization_response, ids, from_date, months, scenario_id)
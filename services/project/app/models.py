@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -6,19 +7,19 @@ class Project(Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    customer_id = Column(Integer) # Mock foreign key (Customer is in another service or shared lib)
+    customer_id = Column(Integer, index=True) # Mock foreign key (Customer is in another service or shared lib)
     contract_amount = Column(Integer)
     start_date = Column(Date)
     end_date = Column(Date)
-    status = Column(String, default="Lead")
+    status = Column(String, default="Lead", index=True)
 
     assignments = relationship("Assignment", back_populates="project")
 
 class Assignment(Base):
     __tablename__ = "assignments"
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"))
-    employee_id = Column(Integer) # ID from Resource Service
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    employee_id = Column(Integer, index=True) # ID from Resource Service
     start_date = Column(Date)
     end_date = Column(Date)
 
@@ -27,8 +28,11 @@ class Assignment(Base):
 
 class Allocation(Base):
     __tablename__ = "allocations"
+    # Overlap queries filter on end_date >= :start AND start_date <= :end
+    # (see app.intervals for the R*Tree used on SQLite)
+    __table_args__ = (Index("ix_allocations_end_start", "end_date", "start_date"),)
     id = Column(Integer, primary_key=True, index=True)
-    assignment_id = Column(Integer, ForeignKey("assignments.id"))
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), index=True)
     start_date = Column(Date)
     end_date = Column(Date)
     effort_percent = Column(Integer)
@@ -38,9 +42,102 @@ class Allocation(Base):
 class Billing(Base):
     __tablename__ = "billings"
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"))
-    billing_date = Column(Date)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    billing_date = Column(Date, index=True)
     amount = Column(Integer)
     status = Column(String)
 
     project = relationship("Project")
+
+class EmployeeMonthUtilization(Base):
+    # Materialized rollup of Allocation rows, maintained by app.rollup
+    __tablename__ = "employee_month_utilization"
+    employee_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True, index=True) # First day of the month
+    effort_percent = Column(Float, default=0.0) # Day-weighted sum of allocations
+
+class BillingMonthTotal(Base):
+    # Materialized monthly billing totals, maintained by app.revenue
+    __tablename__ = "billing_month_totals"
+    month = Column(Date, primary_key=True) # First day of the month
+    project_id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, primary_key=True) # "" for billings without a status
+    amount = Column(Integer, nullable=False, default=0)
+    billings = Column(Integer, nullable=False, default=0) # Number of billing rows
+
+class DashboardSnapshot(Base):
+    # Precomputed dashboard KPIs, refreshed by app.dashboard; id 1 is the whole portfolio
+    __tablename__ = "dashboard_snapshots"
+    id = Column(Integer, primary_key=True)
+    data = Column(Text) # JSON
+    versions = Column(Text) # JSON table versions the data was computed from
+    computed_at = Column(DateTime)
+
+class Scenario(Base):
+    # Named what-if sandbox; its allocations are a sparse overlay on the real ones (see app/scenarios.py)
+    __tablename__ = "scenarios"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    description = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    allocations = relationship("ScenarioAllocation", back_populates="scenario", cascade="all, delete-orphan")
+
+class ScenarioAllocation(Base):
+    # op: add (new allocation), change (replaces allocation_id), remove (hides allocation_id)
+    __tablename__ = "scenario_allocations"
+    __table_args__ = (Index("ix_scenario_allocations_scenario_allocation", "scenario_id", "allocation_id"),)
+    id = Column(Integer, primary_key=True, index=True)
+    scenario_id = Column(Integer, ForeignKey("scenarios.id"), nullable=False)
+    op = Column(String, nullable=False)
+    allocation_id = Column(Integer) # Base allocation for change / remove
+    # Row image after the change; NULL for remove
+    project_id = Column(Integer)
+    employee_id = Column(Integer)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    effort_percent = Column(Integer)
+
+    scenario = relationship("Scenario", back_populates="allocations")
+
+class Job(Base):
+    # Background job queue and results (see app/jobs.py)
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+        # At most one queued or running job per key, so concurrent submits can't both queue it
+        Index("ix_jobs_active_key", "key", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+    id = Column(String, primary_key=True) # uuid4 hex
+    kind = Column(String, nullable=False)
+    params = Column(Text) # JSON
+    key = Column(String, index=True) # kind, params and read-table versions, for result reuse
+    status = Column(String, nullable=False, default="queued") # queued / running / succeeded / failed / cancelled
+    owner = Column(String) # host:pid:token of the process running it
+    heartbeat_at = Column(DateTime) # refreshed by the owner while running
+    progress = Column(Float, default=0.0)
+    message = Column(String)
+    result = Column(Text) # JSON; {"path", "filename", "media_type"} for file results
+    error = Column(Text)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class TableVersion(Base):
+    # Bumped in the same transaction as every write to `name` (see app/versions.py)
+    __tablename__ = "table_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ChangeLog(Base):
+    # Written by triggers on the tracked tables (see app/changes.py); id is the feed cursor
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False) # insert / update / delete
+    data = Column(String) # JSON row image after the change; NULL for deletes
+    changed_at = Column(String, index=True)
@@ -0,0 +1,278 @@
+"""Capacity planning: staff pipeline projects from skill matches and free capacity.
+
+Each demand asks for `headcount` people matching a skill query at
+`effort_percent` over a date window (the project's by default). Candidates
+come from the resource-service skill index; their free capacity is taken
+day by day from stored allocations, so a plan never pushes anyone above
+the over-allocation threshold (see app.conflicts). Costs for every
+(demand, candidate) pair are priced in one vectorized pass of the P&L
+engine.
+
+The solver fills slots greedily by pair score, then improves the plan with
+local search (replace, swap and shift moves) until no move helps or the
+time budget runs out. Objectives:
+
+  margin    maximize revenue share - cost; slots that lose money stay empty
+  coverage  maximize staffed effort-days, margin as the tie-breaker
+
+Planning only reads committed data; nothing is written.
+"""
+import time
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import conflicts, costing, models
+from .staffing import CANDIDATE_LIMIT
+
+
+class PlanningError(ValueError):
+    """The request references unknown projects or empty windows."""
+
+
+def _demands(db: Session, requested) -> List[dict]:
+    project_ids = {d.project_id for d in requested}
+    projects = {p.id: p for p in db.query(models.Project).filter(models.Project.id.in_(project_ids))}
+    missing = sorted(project_ids - projects.keys())
+    if missing:
+        raise PlanningError(f"Projects {missing} not found")
+
+    demands = []
+    for index, d in enumerate(requested):
+        project = projects[d.project_id]
+        start, end = d.start_date or project.start_date, d.end_date or project.end_date
+        if start is None or end is None or end < start:
+            raise PlanningError(f"Demand {index} has no valid date window")
+        demands.append({
+            "index": index, "project_id": project.id, "q": d.q, "effort": d.effort_percent,
+            "headcount": d.headcount, "start": start.toordinal(), "end": end.toordinal(),
+            "effort_days": ((end - start).days + 1) * d.effort_percent / 100.0,
+        })
+
+    # A project's contract amount is shared across its demands by effort-days
+    by_project: Dict[int, float] = {}
+    for d in demands:
+        by_project[d["project_id"]] = by_project.get(d["project_id"], 0.0) + d["effort_days"] * d["headcount"]
+    for d in demands:
+        total = by_project[d["project_id"]]
+        d["value"] = (projects[d["project_id"]].contract_amount or 0) * d["effort_days"] / total if total else 0.0
+    return demands
+
+
+def _loads(db: Session, employee_ids: List[int], origin: int, days: int) -> Dict[int, np.ndarray]:
+    """Booked effort per day over the horizon for each candidate."""
+    loads = {emp: np.zeros(days) for emp in employee_ids}
+    first, last = date.fromordinal(origin), date.fromordinal(origin + days - 1)
+    for employee_id, rows in conflicts.load_intervals(db, employee_ids, first, last):
+        load = loads[employee_id]
+        for row in rows:
+            a, b = max(row.start, origin) - origin, min(row.end, origin + days - 1) - origin
+            if a <= b:
+                load[a:b + 1] += row.effort
+    return loads
+
+
+class _Search:
+    def __init__(self, demands, pairs, loads, origin, threshold, objective):
+        self.demands, self.pairs, self.loads = demands, pairs, loads
+        self.origin, self.threshold, self.objective = origin, threshold, objective
+        self.slots = [d["index"] for d in demands for _ in range(d["headcount"])]
+        self.assigned: List[Optional[int]] = [None] * len(self.slots)
+        self.staff = {d["index"]: set() for d in demands}
+        # Candidates per demand, best pair first
+        self.candidates = {d["index"]: [] for d in demands}
+        for (d, emp), pair in sorted(pairs.items(), key=lambda kv: (-kv[1]["score"], kv[0][1])):
+            self.candidates[d].append(emp)
+        # Gains below float noise (e.g. swapping equal-cost people) are not improvements
+        self.eps = 1e-9 * max((abs(pair["score"]) for pair in pairs.values()), default=0.0) + 1e-9
+        self.moves = 0
+
+    def _window(self, d):
+        demand = self.demands[d]
+        return demand["start"] - self.origin, demand["end"] - self.origin + 1
+
+    def fits(self, emp, d) -> bool:
+        if emp in self.staff[d]:
+            return False
+        a, b = self._window(d)
+        return self.loads[emp][a:b].max() + self.demands[d]["effort"] <= self.threshold + 1e-9
+
+    def _book(self, slot, emp):
+        d = self.slots[slot]
+        a, b = self._window(d)
+        if self.assigned[slot] is not None:
+            old = self.assigned[slot]
+            self.loads[old][a:b] -= self.demands[d]["effort"]
+            self.staff[d].discard(old)
+        self.assigned[slot] = emp
+        if emp is not None:
+            self.loads[emp][a:b] += self.demands[d]["effort"]
+            self.staff[d].add(emp)
+
+    def score(self, slot, emp=None) -> float:
+        emp = self.assigned[slot] if emp is None else emp
+        return 0.0 if emp is None else self.pairs[(self.slots[slot], emp)]["score"]
+
+    def worth(self, d, emp) -> bool:
+        # Under the margin objective a loss-making pair is worse than an empty slot
+        return self.objective == "coverage" or self.pairs[(d, emp)]["score"] > 0
+
+    def greedy(self):
+        order = sorted(
+            ((pair["score"], d, emp) for (d, emp), pair in self.pairs.items()),
+            key=lambda t: (-t[0], t[1], t[2]),
+        )
+        open_slots = {}
+        for slot, d in enumerate(self.slots):
+            open_slots.setdefault(d, []).append(slot)
+        for _, d, emp in order:
+            if open_slots.get(d) and self.worth(d, emp) and self.fits(emp, d):
+                self._book(open_slots[d].pop(0), emp)
+
+    def _replace(self) -> bool:
+        for slot, d in enumerate(self.slots):
+            current = self.score(slot)
+            for emp in self.candidates[d]:
+                if self.score(slot, emp) <= current + self.eps:
+                    break # candidates are sorted best first
+                if emp != self.assigned[slot] and self.worth(d, emp) and self.fits(emp, d):
+                    self._book(slot, emp)
+                    self.moves += 1
+                    return True
+        return False
+
+    def _swap(self) -> bool:
+        filled = [slot for slot, emp in enumerate(self.assigned) if emp is not None]
+        for i, s1 in enumerate(filled):
+            for s2 in filled[i + 1:]:
+                d1, d2 = self.slots[s1], self.slots[s2]
+                e1, e2 = self.assigned[s1], self.assigned[s2]
+                if d1 == d2 or (d2, e1) not in self.pairs or (d1, e2) not in self.pairs:
+                    continue
+                gain = self.score(s1, e2) + self.score(s2, e1) - self.score(s1) - self.score(s2)
+                if gain <= self.eps:
+                    continue
+                self._book(s1, None)
+                self._book(s2, None)
+                if self.fits(e2, d1) and self.fits(e1, d2):
+                    self._book(s1, e2)
+                    self._book(s2, e1)
+                    self.moves += 1
+                    return True
+                self._book(s1, e1)
+                self._book(s2, e2)
+        return False
+
+    def _shift(self) -> bool:
+        # Fill an empty slot with someone already placed, backfilling their slot with a free candidate
+        for empty, d in enumerate(self.slots):
+            if self.assigned[empty] is not None:
+                continue
+            for emp in self.candidates[d]:
+                if not self.worth(d, emp):
+                    continue
+                for slot, placed in enumerate(self.assigned):
+                    if placed != emp:
+                        continue
+                    other = self.slots[slot]
+                    self._book(slot, None)
+                    if not self.fits(emp, d):
+                        self._book(slot, emp)
+                        continue
+                    self._book(empty, emp)
+                    backfill = next((e for e in self.candidates[other] if self.worth(other, e) and self.fits(e, other)), None)
+                    gain = self.score(empty) + (self.score(slot, backfill) if backfill is not None else 0.0) - self.score(slot, emp)
+                    if backfill is not None and gain > self.eps:
+                        self._book(slot, backfill)
+                        self.moves += 1
+                        return True
+                    self._book(empty, None)
+                    self._book(slot, emp)
+        return False
+
+    def improve(self, deadline: float):
+        while time.perf_counter() < deadline:
+            if not (self._replace() or self._swap() or self._shift()):
+                return
+
+
+def plan(db: Session, resource_client, requested, objective: str = "margin",
+         threshold: float = conflicts.THRESHOLD, max_seconds: float = 2.0) -> dict:
+    started = time.perf_counter()
+    demands = _demands(db, requested)
+    if not demands:
+        return {"objective": objective, "revenue": 0, "cost": 0, "margin": 0, "filled": 0, "slots": 0,
+                "assignments": [], "unfilled": [], "missing_cost_employee_ids": [], "moves": 0}
+
+    hits = {}
+    for q in sorted({d["q"] for d in demands}):
+        hits[q] = resource_client.search_employees(q, limit=CANDIDATE_LIMIT, fields=["name", "role"])
+    people = {hit["id"]: hit for found in hits.values() for hit in found}
+
+    origin = min(d["start"] for d in demands)
+    days = max(d["end"] for d in demands) - origin + 1
+    loads = _loads(db, sorted(people), origin, days)
+
+    # Price every (demand, candidate) pair in one pass
+    keys = [(d["index"], hit["id"]) for d in demands for hit in hits[d["q"]]]
+    rows = costing.AllocationRows(
+        allocation_ids=np.arange(len(keys), dtype=np.int64),
+        assignment_ids=np.arange(len(keys), dtype=np.int64),
+        project_ids=np.array([demands[d]["project_id"] for d, _ in keys], dtype=np.int64),
+        employee_ids=np.array([emp for _, emp in keys], dtype=np.int64),
+        starts=np.array([demands[d]["start"] for d, _ in keys], dtype=np.int64),
+        ends=np.array([demands[d]["end"] for d, _ in keys], dtype=np.int64),
+        efforts=np.array([demands[d]["effort"] for d, _ in keys], dtype=np.float64),
+    )
+    first, last = date.fromordinal(origin), date.fromordinal(origin + days - 1)
+    cost_rows = resource_client.unit_costs({emp: (first, last) for emp in people}) if people else []
+    pair_costs, missing = costing.allocation_costs(rows, costing.CostTable(cost_rows))
+
+    value_scale = max((d["value"] for d in demands), default=0.0) or 1.0
+    pairs = {}
+    for (d, emp), cost in zip(keys, pair_costs.tolist()):
+        if emp in missing and objective == "margin":
+            continue # can't price them
+        margin = demands[d]["value"] - cost
+        score = margin if objective == "margin" else demands[d]["effort_days"] + 0.5 * margin / value_scale
+        pairs[(d, emp)] = {"cost": cost, "margin": margin, "score": score}
+
+    search = _Search(demands, pairs, loads, origin, threshold, objective)
+    search.greedy()
+    search.improve(started + max_seconds)
+
+    assignments, unfilled = [], []
+    for slot, d in enumerate(search.slots):
+        demand, emp = demands[d], search.assigned[slot]
+        if emp is None:
+            if not search.candidates[d]:
+                reason = "no matching candidate"
+            elif not any(search.worth(d, e) for e in search.candidates[d]):
+                reason = "no profitable candidate"
+            else:
+                reason = "no candidate with free capacity"
+            unfilled.append({"project_id": demand["project_id"], "demand_index": d, "reason": reason})
+            continue
+        pair, hit = pairs[(d, emp)], people[emp]
+        assignments.append({
+            "project_id": demand["project_id"], "demand_index": d, "employee_id": emp,
+            "name": hit.get("name"), "role": hit.get("role"), "fit_score": hit.get("score") or 0,
+            "start_date": date.fromordinal(demand["start"]), "end_date": date.fromordinal(demand["end"]),
+            "effort_percent": demand["effort"], "revenue": int(round(demand["value"])), "cost": int(round(pair["cost"])),
+        })
+    revenue = sum(a["revenue"] for a in assignments)
+    cost = sum(a["cost"] for a in assignments)
+    return {
+        "objective": objective,
+        "revenue": revenue,
+        "cost": cost,
+        "margin": revenue - cost,
+        "filled": len(assignments),
+        "slots": len(search.slots),
+        "assignments": assignments,
+        "unfilled": unfilled,
+        "missing_cost_employee_ids": sorted(missing),
+        "moves": search.moves,
+    }
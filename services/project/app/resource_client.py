@@ -0,0 +1,58 @@
+import os
+from datetime import date
+from typing import Dict, List, Tuple
+
+import requests
+
+RESOURCE_SERVICE_URL = os.getenv("RESOURCE_SERVICE_URL", "http://resource-service:8000")
+TIMEOUT = float(os.getenv("RESOURCE_SERVICE_TIMEOUT", 10.0))
+
+
+class ResourceClient:
+    """Thin HTTP client for resource-service, shared via a keep-alive Session."""
+
+    def __init__(self, base_url: str = RESOURCE_SERVICE_URL, session: requests.Session = None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+
+    def _get(self, path: str, **params):
+        resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=TIMEOUT)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _post(self, path: str, payload):
+        resp = self.session.post(f"{self.base_url}{path}", json=payload, timeout=TIMEOUT)
+        resp.raise_for_status()
+        return resp.json()
+
+    def unit_costs(self, ranges: Dict[int, Tuple[date, date]]) -> List[dict]:
+        """Unit cost segments as {employee_id, start_date, amount} rows for each employee's date range."""
+        if not ranges:
+            return []
+        lookups = self._post("/unit-costs:lookup", [
+            {"employee_id": emp_id, "start_date": start.isoformat(), "end_date": end.isoformat()}
+            for emp_id, (start, end) in sorted(ranges.items())
+        ])
+        return [
+            {"employee_id": lookup["employee_id"], **segment}
+            for lookup in lookups
+            for segment in lookup["segments"]
+        ]
+
+    def search_employees(self, q: str, limit: int = 20, fields: List[str] = None, offset: int = 0) -> List[dict]:
+        """Skill index hits ({id, score, ...fields}) best first, skipping the best `offset`."""
+        params = {"q": q, "limit": limit}
+        if offset:
+            params["offset"] = offset
+        if fields:
+            params["fields"] = ",".join(fields)
+        return self._get("/employees/search", **params)
+
+
+_client = None
+
+def get_resource_client() -> ResourceClient:
+    global _client
+    if _client is None:
+        _client = ResourceClient()
+    return _client
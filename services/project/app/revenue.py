@@ -0,0 +1,254 @@
+"""Billing aggregates and revenue forecast, computed in SQL.
+
+Billings are summed by month / project / status / customer with GROUP BY.
+Windows that start and end on month boundaries (or are open) are answered
+from billing_month_totals, a (month, project, status) rollup kept up to
+date in the same flush as Billing writes; other windows scan billings
+through the billing_date index.
+
+The forecast recognizes each contracted project's contract_amount
+straight-line over its start..end days and spreads it across calendar
+months, next to what is actually billed in each month.
+
+Backfill / repair: python -m app.revenue rebuild
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, Float, and_, cast, event, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from . import models, versions
+from .utilization import month_windows
+
+GROUPS = ["month", "project", "status", "customer"]
+FORECAST_STATUSES = ["Contracted"]
+
+Key = Tuple[date, int, str] # (first day of month, project_id, status)
+
+
+# --- Dialect helpers ---------------------------------------------------------
+
+def _sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def month_of(bind, column):
+    """First day of `column`'s month, as a date."""
+    if _sqlite(bind):
+        return func.date(column, "start of month", type_=Date)
+    return cast(func.date_trunc("month", column), Date)
+
+
+def _days(bind, end, start):
+    """Whole days from `start` to `end`."""
+    if _sqlite(bind):
+        return func.julianday(end) - func.julianday(start)
+    return end - start
+
+
+def _least(bind, a, b):
+    return func.min(a, b) if _sqlite(bind) else func.least(a, b)
+
+
+def _greatest(bind, a, b):
+    return func.max(a, b) if _sqlite(bind) else func.greatest(a, b)
+
+
+# --- Rollup maintenance ------------------------------------------------------
+
+def _month_aligned(start: Optional[date], end: Optional[date]) -> bool:
+    return (start is None or start.day == 1) and (end is None or (end + timedelta(days=1)).day == 1)
+
+
+def apply_deltas(db: Session, deltas: Dict[Key, List[int]]):
+    """Add [amount, count] deltas to billing_month_totals. Does not commit."""
+    deltas = {k: v for k, v in deltas.items() if any(v) and k[0] is not None}
+    if not deltas:
+        return
+    totals = models.BillingMonthTotal
+    stmt = versions.upsert(db, totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[totals.month, totals.project_id, totals.status],
+        set_={"amount": totals.amount + stmt.excluded.amount, "billings": totals.billings + stmt.excluded.billings},
+    )
+    db.connection().execute(stmt, [
+        {"month": month, "project_id": project_id, "status": status or "", "amount": amount, "billings": count}
+        for (month, project_id, status), (amount, count) in sorted(deltas.items(), key=lambda kv: (kv[0][0], kv[0][1] or 0, kv[0][2] or ""))
+    ])
+    versions.bump(db, totals.__tablename__)
+
+
+def _add(deltas, billing_date, project_id, status, amount, sign=1):
+    if billing_date is None:
+        return
+    entry = deltas[(billing_date.replace(day=1), project_id, status)]
+    entry[0] += sign * (amount or 0)
+    entry[1] += sign
+
+
+@event.listens_for(Session, "before_flush")
+def _track_billing_changes(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0])
+
+    changed = [obj for obj in session.dirty if isinstance(obj, models.Billing) and session.is_modified(obj)]
+    removed = [obj for obj in session.deleted if isinstance(obj, models.Billing)]
+    ids = [obj.id for obj in changed + removed if obj.id is not None]
+    if ids:
+        billing = models.Billing.__table__
+        stored = session.execute(
+            select(billing.c.billing_date, billing.c.project_id, billing.c.status, billing.c.amount)
+            .where(billing.c.id.in_(ids))
+        )
+        for billing_date, project_id, status, amount in stored:
+            _add(deltas, billing_date, project_id, status, amount, sign=-1)
+
+    for obj in [o for o in session.new if isinstance(o, models.Billing)] + changed:
+        _add(deltas, obj.billing_date, obj.project_id, obj.status, obj.amount)
+
+    apply_deltas(session, deltas)
+
+
+def rebuild(connection) -> int:
+    """Recompute billing_month_totals from billings with one INSERT ... SELECT. Returns rows written."""
+    billing = models.Billing.__table__
+    totals = models.BillingMonthTotal.__table__
+    month = month_of(connection, billing.c.billing_date)
+    status = func.coalesce(billing.c.status, "")
+    connection.execute(totals.delete())
+    result = connection.execute(totals.insert().from_select(
+        ["month", "project_id", "status", "amount", "billings"],
+        select(month, billing.c.project_id, status, func.coalesce(func.sum(billing.c.amount), 0), func.count())
+        .where(billing.c.billing_date.is_not(None))
+        .group_by(month, billing.c.project_id, status),
+    ))
+    # Core writes skip the flush hook that bumps table versions (ETags of /billings/summary)
+    versions.bump(connection, totals.name)
+    return result.rowcount
+
+
+def install(connection):
+    """Create missing billings indexes (older databases) and backfill an empty rollup."""
+    for index in models.Billing.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    has_totals = connection.execute(select(models.BillingMonthTotal.month).limit(1)).first()
+    has_billings = connection.execute(select(models.Billing.id).limit(1)).first()
+    if has_billings and not has_totals:
+        rebuild(connection)
+
+
+# --- Queries -----------------------------------------------------------------
+
+def aggregate(db: Session, group_by: Sequence[str], start: Optional[date] = None, end: Optional[date] = None,
+              statuses: Optional[List[str]] = None, project_ids: Optional[List[int]] = None) -> dict:
+    """{"total", "count", "groups": [{<group columns>, "amount", "count"}]} of billings in [start, end]."""
+    bind = db.get_bind()
+    if _month_aligned(start, end):
+        source = models.BillingMonthTotal
+        date_col, month_col, status_col = source.month, source.month, source.status
+        amount, count = func.sum(source.amount), func.sum(source.billings)
+    else:
+        source = models.Billing
+        date_col, status_col = source.billing_date, source.status
+        month_col = month_of(bind, source.billing_date)
+        amount, count = func.sum(source.amount), func.count()
+
+    columns = {
+        "month": [month_col.label("month")],
+        "project": [source.project_id.label("project_id"), models.Project.name.label("project_name")],
+        "status": [status_col.label("status")],
+        "customer": [models.Project.customer_id.label("customer_id")],
+    }
+    selected = [c for group in group_by for c in columns[group]]
+    query = select(*selected, func.coalesce(amount, 0).label("amount"), func.coalesce(count, 0).label("count"))
+    if {"project", "customer"} & set(group_by):
+        query = query.select_from(source).join(models.Project, models.Project.id == source.project_id, isouter=True)
+    else:
+        query = query.select_from(source)
+    if start:
+        query = query.where(date_col >= start)
+    if end:
+        query = query.where(date_col <= end)
+    if statuses:
+        query = query.where(status_col.in_(statuses))
+    if project_ids:
+        query = query.where(source.project_id.in_(project_ids))
+    if selected:
+        query = query.group_by(*selected).order_by(*selected)
+
+    groups = []
+    for row in db.execute(query).mappings():
+        group = dict(row)
+        if group.get("status") == "":
+            group["status"] = None
+        group["amount"], group["count"] = int(group["amount"]), int(group["count"])
+        if not group["count"]:
+            continue # rollup cells emptied by updates / deletes
+        if "month" in group:
+            group["month"] = group["month"].strftime("%Y-%m")
+        groups.append(group)
+    return {
+        "group_by": list(group_by),
+        "total": sum(g["amount"] for g in groups),
+        "count": sum(g["count"] for g in groups),
+        "groups": groups,
+    }
+
+
+def forecast(db: Session, start: date, months: int, statuses: Sequence[str] = FORECAST_STATUSES) -> dict:
+    """Straight-line recognized contract revenue and billed amounts per calendar month."""
+    bind = db.get_bind()
+    windows = month_windows(start, months)
+    calendar = union_all(*[
+        select(literal(first, Date).label("first"), literal(last, Date).label("last"))
+        for first, last in windows
+    ]).subquery("calendar")
+
+    project = models.Project
+    overlap = _days(bind, _least(bind, project.end_date, calendar.c.last), _greatest(bind, project.start_date, calendar.c.first)) + 1
+    length = _days(bind, project.end_date, project.start_date) + 1
+    recognized = (
+        select(calendar.c.first, func.sum(cast(project.contract_amount, Float) * overlap / length))
+        .select_from(calendar)
+        .join(project, and_(
+            project.start_date <= calendar.c.last,
+            project.end_date >= calendar.c.first,
+            project.end_date >= project.start_date,
+            project.status.in_(statuses),
+        ))
+        .group_by(calendar.c.first)
+    )
+    recognized = {first: value or 0.0 for first, value in db.execute(recognized)}
+
+    billed = aggregate(db, ["month"], windows[0][0], windows[-1][1])
+    billed = {g["month"]: g["amount"] for g in billed["groups"]}
+
+    rows = []
+    for first, _ in windows:
+        label = first.strftime("%Y-%m")
+        rows.append({"month": label, "recognized": int(round(recognized.get(first, 0.0))), "billed": billed.get(label, 0)})
+    return {
+        "statuses": list(statuses),
+        "months": rows,
+        "recognized": sum(r["recognized"] for r in rows),
+        "billed": sum(r["billed"] for r in rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the billing_month_totals rollup")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Recompute monthly billing totals from billings")
+    args = parser.parse_args(argv)
+
+    from .database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        written = rebuild(conn)
+    print(f"Rebuilt {written} billing total rows")
+
+
+if __name__ == "__main__":
+    main()
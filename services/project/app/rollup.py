@@ -0,0 +1,163 @@
+"""Per-employee, per-month utilization rollup, updated in the same flush as Allocation writes.
+
+Backfill / repair: python -m app.rollup rebuild [--employee-id ID ...]
+"""
+import argparse
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Numeric, cast, event, func, select
+from sqlalchemy.orm import Session
+
+from . import events, models, versions
+from .utilization import month_windows
+
+Key = Tuple[int, date] # (employee_id, first day of month)
+
+
+def allocation_contributions(start: date, end: date, effort_percent: int) -> Dict[date, float]:
+    """{month: percent} that one allocation adds to each month it overlaps."""
+    contributions = {}
+    if start is None or end is None or end < start or not effort_percent:
+        return contributions
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    for first, last in month_windows(start, months):
+        overlap_days = (min(end, last) - max(start, first)).days + 1
+        days_in_month = (last - first).days + 1
+        contributions[first] = effort_percent * overlap_days / days_in_month
+    return contributions
+
+
+def add_allocation(deltas: Dict[Key, float], employee_id: int, start: date, end: date, effort_percent: int, sign: int = 1):
+    for month, percent in allocation_contributions(start, end, effort_percent).items():
+        deltas[(employee_id, month)] += sign * percent
+
+
+def _round(db: Session, value, digits: int = 6):
+    # PostgreSQL has round(numeric, int) but no round(double precision, int)
+    if db.get_bind().dialect.name == "postgresql":
+        return func.round(cast(value, Numeric), digits)
+    return func.round(value, digits)
+
+
+def upsert_statement(db: Session):
+    """INSERT ... ON CONFLICT adding effort_percent to existing rollup rows."""
+    rollup = models.EmployeeMonthUtilization
+    stmt = versions.upsert(db, rollup)
+    return stmt.on_conflict_do_update(
+        index_elements=[rollup.employee_id, rollup.month],
+        set_={"effort_percent": _round(db, rollup.effort_percent + stmt.excluded.effort_percent)},
+    )
+
+
+def apply_deltas(db: Session, deltas: Dict[Key, float]):
+    """Add `deltas` to the rollup rows, creating missing ones. Does not commit.
+
+    A single upsert, so concurrent writers touching the same employee-month
+    add up instead of racing to insert the row.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    rollup = models.EmployeeMonthUtilization
+    db.connection().execute(upsert_statement(db), [
+        {"employee_id": employee_id, "month": month, "effort_percent": round(delta, 6)}
+        for (employee_id, month), delta in sorted(deltas.items())
+    ])
+    versions.bump(db, rollup.__tablename__)
+
+
+def allocation_employee_id(session: Session, alloc: models.Allocation) -> Optional[int]:
+    """Employee of a (possibly pending) allocation, through its assignment."""
+    if alloc.assignment is not None:
+        return alloc.assignment.employee_id
+    if alloc.assignment_id is None:
+        return None
+    assignment = session.get(models.Assignment, alloc.assignment_id)
+    return assignment.employee_id if assignment else None
+
+
+def _stored_allocations(session: Session, ids: List[int]):
+    # Values as currently stored, i.e. before this flush is written
+    if not ids:
+        return []
+    alloc = models.Allocation.__table__
+    assign = models.Assignment.__table__
+    return session.execute(
+        select(assign.c.employee_id, alloc.c.start_date, alloc.c.end_date, alloc.c.effort_percent)
+        .select_from(alloc.join(assign, alloc.c.assignment_id == assign.c.id))
+        .where(alloc.c.id.in_(ids))
+    ).all()
+
+
+@event.listens_for(Session, "before_flush")
+def _track_allocation_changes(session, flush_context, instances):
+    deltas = defaultdict(float)
+
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, models.Allocation) and session.is_modified(obj)
+    ]
+    removed = [obj for obj in session.deleted if isinstance(obj, models.Allocation)]
+    for employee_id, start, end, effort in _stored_allocations(session, [obj.id for obj in changed + removed]):
+        add_allocation(deltas, employee_id, start, end, effort, sign=-1)
+
+    added = [obj for obj in session.new if isinstance(obj, models.Allocation)]
+    for obj in added + changed:
+        add_allocation(deltas, allocation_employee_id(session, obj), obj.start_date, obj.end_date, obj.effort_percent)
+
+    apply_deltas(session, {k: v for k, v in deltas.items() if k[0] is not None})
+
+
+def rebuild(db: Session, employee_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute the rollup from Allocation rows. Returns the number of rollup rows written."""
+    employee_ids = list(employee_ids) if employee_ids else None
+    rollup = models.EmployeeMonthUtilization
+
+    delete = db.query(rollup)
+    if employee_ids:
+        delete = delete.filter(rollup.employee_id.in_(employee_ids))
+    delete.delete(synchronize_session=False)
+
+    query = (
+        db.query(models.Assignment.employee_id, models.Allocation.start_date,
+                 models.Allocation.end_date, models.Allocation.effort_percent)
+        .join(models.Allocation, models.Allocation.assignment_id == models.Assignment.id)
+    )
+    if employee_ids:
+        query = query.filter(models.Assignment.employee_id.in_(employee_ids))
+
+    deltas = defaultdict(float)
+    for employee_id, start, end, effort in query.yield_per(1000):
+        add_allocation(deltas, employee_id, start, end, effort)
+
+    db.bulk_insert_mappings(rollup, [
+        {"employee_id": employee_id, "month": month, "effort_percent": round(percent, 6)}
+        for (employee_id, month), percent in deltas.items()
+    ])
+    events.touch(db, "utilization")
+    versions.bump(db, rollup.__tablename__)
+    db.commit()
+    return len(deltas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the employee_month_utilization rollup")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Recompute rollup rows from allocations")
+    rebuild_cmd.add_argument("--employee-id", type=int, action="append", dest="employee_ids")
+    args = parser.parse_args(argv)
+
+    from .database import Base, SessionLocal, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild(db, args.employee_ids)
+    finally:
+        db.close()
+    print(f"Rebuilt {written} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
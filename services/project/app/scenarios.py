@@ -0,0 +1,157 @@
+"""What-if scenarios as sparse overlays on the real allocations.
+
+A scenario stores only its differences in scenario_allocations: allocations
+it adds, base allocations it changes (full row image, possibly on another
+project or employee) and base allocations it removes. Nothing is copied,
+so a scenario costs as many rows as it has edits however many exist.
+
+Reads merge the overlay lazily: utilization starts from the rollup and
+applies the overlay rows' monthly contributions as deltas; P&L drops the
+hidden base rows and appends the overlay rows before pricing. Overlay rows
+appear in P&L breakdowns with assignment_id = -(overlay row id).
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models, rollup
+from .utilization import month_windows
+
+OPS = ("add", "change", "remove")
+
+
+class ScenarioNotFound(Exception):
+    pass
+
+
+def get(db: Session, scenario_id: int) -> models.Scenario:
+    scenario = db.get(models.Scenario, scenario_id)
+    if scenario is None:
+        raise ScenarioNotFound(f"Scenario {scenario_id} not found")
+    return scenario
+
+
+def overlay(db: Session, scenario_id: int) -> List[models.ScenarioAllocation]:
+    get(db, scenario_id)
+    return (
+        db.query(models.ScenarioAllocation)
+        .filter(models.ScenarioAllocation.scenario_id == scenario_id)
+        .order_by(models.ScenarioAllocation.id)
+        .all()
+    )
+
+
+def _base_rows(db: Session, allocation_ids):
+    """{allocation_id: (employee_id, start, end, effort)} as stored."""
+    if not allocation_ids:
+        return {}
+    return {
+        alloc_id: (employee_id, start, end, effort)
+        for alloc_id, employee_id, start, end, effort in (
+            db.query(models.Allocation.id, models.Assignment.employee_id, models.Allocation.start_date,
+                     models.Allocation.end_date, models.Allocation.effort_percent)
+            .join(models.Assignment, models.Assignment.id == models.Allocation.assignment_id)
+            .filter(models.Allocation.id.in_(list(allocation_ids)))
+        )
+    }
+
+
+def merge_utilization(db: Session, scenario_id: int, matrix: Dict[int, List[float]], start: date, months: int,
+                      employee_ids: Optional[List[int]] = None) -> Dict[int, List[float]]:
+    """Apply the scenario's overlay to a monthly_utilization() result."""
+    rows = overlay(db, scenario_id)
+    deltas = defaultdict(float)
+    base = _base_rows(db, {r.allocation_id for r in rows if r.op != "add"})
+    for row in rows:
+        if row.op != "add" and row.allocation_id in base:
+            employee_id, s, e, effort = base[row.allocation_id]
+            rollup.add_allocation(deltas, employee_id, s, e, effort, sign=-1)
+        if row.op != "remove":
+            rollup.add_allocation(deltas, row.employee_id, row.start_date, row.end_date, row.effort_percent)
+
+    index = {first: i for i, (first, _) in enumerate(month_windows(start, months))}
+    wanted = set(employee_ids) if employee_ids else None
+    for (employee_id, month), delta in deltas.items():
+        if month not in index or (wanted is not None and employee_id not in wanted) or not delta:
+            continue
+        percents = matrix.setdefault(employee_id, [0.0] * months)
+        percents[index[month]] = round(max(percents[index[month]] + delta, 0.0), 2)
+    return {emp: percents for emp, percents in matrix.items() if wanted is not None or any(percents)}
+
+
+def merge_rows(db: Session, scenario_id: int, rows, project_ids: List[int]):
+    """AllocationRows of `project_ids` with the scenario's overlay applied."""
+    overlay_rows = overlay(db, scenario_id)
+    hidden = [r.allocation_id for r in overlay_rows if r.op != "add" and r.allocation_id is not None]
+    keep = ~np.isin(rows.allocation_ids, hidden) if hidden else np.ones(len(rows.allocation_ids), dtype=bool)
+    projects = set(project_ids)
+    added = [
+        r for r in overlay_rows
+        if r.op != "remove" and r.project_id in projects and r.start_date is not None and r.end_date is not None
+    ]
+    extra = {
+        "allocation_ids": [r.allocation_id or 0 for r in added],
+        "assignment_ids": [-r.id for r in added],
+        "project_ids": [r.project_id for r in added],
+        "employee_ids": [r.employee_id for r in added],
+        "starts": [r.start_date.toordinal() for r in added],
+        "ends": [r.end_date.toordinal() for r in added],
+        "efforts": [r.effort_percent or 0 for r in added],
+    }
+    return type(rows)(**{
+        field: np.concatenate([getattr(rows, field)[keep], np.array(extra[field], dtype=getattr(rows, field).dtype)])
+        for field in rows._fields
+    })
+
+
+def record(db: Session, scenario: models.Scenario, change) -> models.ScenarioAllocation:
+    """Add an edit to the scenario's overlay. Editing the same base allocation again replaces the earlier edit.
+
+    Raises ValueError for edits that don't apply. Does not commit.
+    """
+    if change.op not in OPS:
+        raise ValueError(f"op must be one of {', '.join(OPS)}")
+    fields = {k: getattr(change, k) for k in ("project_id", "employee_id", "start_date", "end_date", "effort_percent")}
+
+    if change.op == "add":
+        missing = [k for k, v in fields.items() if v is None]
+        if missing:
+            raise ValueError(f"add requires {', '.join(missing)}")
+    else:
+        if change.allocation_id is None:
+            raise ValueError(f"{change.op} requires allocation_id")
+        base = (
+            db.query(models.Allocation, models.Assignment)
+            .join(models.Assignment, models.Assignment.id == models.Allocation.assignment_id)
+            .filter(models.Allocation.id == change.allocation_id)
+            .first()
+        )
+        if base is None:
+            raise ValueError(f"Allocation {change.allocation_id} not found")
+        alloc, assign = base
+        if change.op == "remove":
+            fields = dict.fromkeys(fields)
+        else:
+            # Unset fields keep the base allocation's values
+            current = {"project_id": assign.project_id, "employee_id": assign.employee_id, "start_date": alloc.start_date,
+                       "end_date": alloc.end_date, "effort_percent": alloc.effort_percent}
+            fields = {k: current[k] if v is None else v for k, v in fields.items()}
+
+    if fields["project_id"] is not None and db.get(models.Project, fields["project_id"]) is None:
+        raise ValueError(f"Project {fields['project_id']} not found")
+    if fields["start_date"] is not None and fields["end_date"] is not None and fields["start_date"] > fields["end_date"]:
+        raise ValueError(f"Allocation {fields['start_date']} - {fields['end_date']} ends before it starts")
+    if fields["effort_percent"] is not None and not 0 <= fields["effort_percent"] <= 100:
+        raise ValueError(f"effort_percent must be between 0 and 100, got {fields['effort_percent']}")
+
+    if change.op != "add":
+        db.query(models.ScenarioAllocation).filter(
+            models.ScenarioAllocation.scenario_id == scenario.id,
+            models.ScenarioAllocation.allocation_id == change.allocation_id,
+        ).delete(synchronize_session="fetch")
+    row = models.ScenarioAllocation(scenario_id=scenario.id, op=change.op, allocation_id=change.allocation_id if change.op != "add" else None, **fields)
+    db.add(row)
+    return row
@@ -1,6 +1,6 @@
 from typing import List, Optional
-from pydantic import BaseModel
-from datetime import date
+from pydantic import BaseModel, Field
+from datetime import date, datetime
 
 class AllocationBase(BaseModel):
     start_date: date
@@ -16,6 +16,18 @@ class AssignmentCreate(BaseModel):
     employee_id: int
     allocations: List[AllocationBase]
 
+class BulkAssignmentCreate(AssignmentCreate):
+    project_id: int
+
+class BulkError(BaseModel):
+    index: Optional[int] = None # Position among parsed rows
+    line: Optional[int] = None # Source line for file uploads
+    detail: str
+
+class BulkResult(BaseModel):
+    created: List[int]
+    errors: List[BulkError]
+
 class Assignment(BaseModel):
     id: int
     employee_id: int
@@ -32,14 +44,16 @@ class ProjectCreate(BaseModel):
     contract_amount: int
     start_date: date
     end_date: date
+    status: str = "Lead"
 
-class Project(ProjectCreate):
+class ProjectSummary(ProjectCreate):
     id: int
-    status: str
-    assignments: List[Assignment] = []
     class Config:
         from_attributes = True
 
+class Project(ProjectSummary):
+    assignments: List[Assignment] = []
+
 class Billing(BaseModel):
     id: int
     project_id: int
@@ -48,3 +62,212 @@ class Billing(BaseModel):
     status: str
     class Config:
         from_attributes = True
+
+class BillingGroup(BaseModel):
+    # Only the grouped columns are set
+    month: Optional[str] = None # YYYY-MM
+    project_id: Optional[int] = None
+    project_name: Optional[str] = None
+    status: Optional[str] = None
+    customer_id: Optional[int] = None
+    amount: int
+    count: int
+
+class BillingSummary(BaseModel):
+    group_by: List[str]
+    total: int
+    count: int
+    groups: List[BillingGroup]
+
+class RevenueMonth(BaseModel):
+    month: str # YYYY-MM
+    recognized: int # Straight-line share of contract amounts
+    billed: int
+
+class RevenueForecast(BaseModel):
+    statuses: List[str]
+    months: List[RevenueMonth]
+    recognized: int
+    billed: int
+
+class UtilizationRow(BaseModel):
+    employee_id: int
+    percents: List[float]
+
+class Utilization(BaseModel):
+    months: List[str]
+    rows: List[UtilizationRow]
+
+class OverAllocation(BaseModel):
+    employee_id: int
+    start_date: date
+    end_date: date
+    peak_percent: float
+    allocation_ids: List[int] # stored allocations involved
+
+class OverAllocationReport(BaseModel):
+    threshold: float
+    conflicts: List[OverAllocation]
+
+class StaffingCandidate(BaseModel):
+    employee_id: int
+    name: Optional[str] = None
+    role: Optional[str] = None
+    fit_score: float
+    rank_score: float
+    percents: List[float] # booked effort per month
+    remaining: List[float] # free capacity per month
+    peak_percent: float
+
+class StaffingSearch(BaseModel):
+    months: List[str]
+    candidates: List[StaffingCandidate]
+    truncated: bool = False # more matches than STAFFING_MAX_CANDIDATES; only the best-fitting were ranked
+
+class PlanDemand(BaseModel):
+    project_id: int
+    q: str # Skill query, e.g. "+java spring"
+    effort_percent: int = Field(100, ge=1, le=100)
+    headcount: int = Field(1, ge=1, le=50)
+    start_date: Optional[date] = None # Defaults to the project's window
+    end_date: Optional[date] = None
+
+class PlanRequest(BaseModel):
+    demands: List[PlanDemand]
+    objective: str = Field("margin", pattern="^(margin|coverage)$")
+    threshold: Optional[float] = Field(None, ge=0) # Max booked percent per day; defaults to OVERALLOCATION_THRESHOLD
+    max_seconds: float = Field(2.0, gt=0, le=30) # Local search budget
+
+class PlannedAssignment(BaseModel):
+    project_id: int
+    demand_index: int
+    employee_id: int
+    name: Optional[str] = None
+    role: Optional[str] = None
+    fit_score: float
+    start_date: date
+    end_date: date
+    effort_percent: int
+    revenue: int # Share of the contract amount
+    cost: int
+
+class PlanGap(BaseModel):
+    project_id: int
+    demand_index: int
+    reason: str
+
+class Plan(BaseModel):
+    objective: str
+    revenue: int
+    cost: int
+    margin: int
+    filled: int
+    slots: int
+    assignments: List[PlannedAssignment]
+    unfilled: List[PlanGap]
+    missing_cost_employee_ids: List[int] = []
+    moves: int # Local search improvements applied
+
+class CostBreakdown(BaseModel):
+    assignment_id: int
+    employee_id: int
+    effort: int # Day-weighted average effort percent
+    cost: int
+
+class ProjectPnl(BaseModel):
+    project_id: int
+    revenue: int
+    cost: int
+    profit: int
+    margin_percent: float
+    breakdown: List[CostBreakdown] = []
+    missing_cost_employee_ids: List[int] = []
+
+class PortfolioPnl(BaseModel):
+    revenue: int
+    cost: int
+    profit: int
+    margin_percent: float
+    projects: List[ProjectPnl]
+    missing_cost_employee_ids: List[int] = []
+
+class ScenarioCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+
+class ScenarioChange(BaseModel):
+    op: str = Field(..., pattern="^(add|change|remove)$")
+    allocation_id: Optional[int] = None # Base allocation for change / remove
+    # add: all required; change: only the fields that differ from the base allocation
+    project_id: Optional[int] = None
+    employee_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    effort_percent: Optional[int] = None
+
+class ScenarioAllocation(ScenarioChange):
+    id: int
+    class Config:
+        from_attributes = True
+
+class Scenario(ScenarioCreate):
+    id: int
+    created_at: Optional[datetime] = None
+    changes: int = 0 # Overlay rows
+    class Config:
+        from_attributes = True
+
+class ScenarioDetail(Scenario):
+    allocations: List[ScenarioAllocation] = []
+
+class StatusTotal(BaseModel):
+    status: Optional[str] = None
+    projects: int
+    contract_amount: int
+
+class UtilizationMonth(BaseModel):
+    month: str # YYYY-MM
+    employees: int # with any allocation in the month
+    average_percent: float
+    over_allocated: int # monthly average above the threshold
+
+class Dashboard(BaseModel):
+    computed_at: datetime
+    stale: bool # projects or allocations changed since computed_at
+    projects: int
+    contract_amount: int
+    statuses: List[StatusTotal]
+    pipeline_statuses: List[str]
+    pipeline_projects: int
+    pipeline_value: int
+    utilization: List[UtilizationMonth]
+
+class JobCreate(BaseModel):
+    kind: str
+    params: dict = {}
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    params: dict = {}
+    status: str # queued / running / succeeded / failed / cancelled
+    progress: float = 0.0
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    reused: bool = False # an earlier identical job was returned
+
+class Change(BaseModel):
+    cursor: int
+    table: str
+    row_id: int
+    op: str # insert / update / delete
+    data: Optional[dict] = None # row after the change; None for deletes
+    changed_at: str
+
+class ChangeFeed(BaseModel):
+    changes: List[Change]
+    next_cursor: int # pass back as ?since= to continue
+    has_more: bool
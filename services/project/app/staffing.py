@@ -0,0 +1,75 @@
+"""Staffing search: skill matches from resource-service joined with free capacity.
+
+Candidates come back from the resource-service skill index already ranked
+by fit, CANDIDATE_LIMIT per page. Every page is read (a poorly fitting but
+free candidate can still rank first), each with one utilization rollup
+query, and the best `limit` are kept with a bounded heap, so only K
+candidates are ever held in the result set. Searches matching more than
+STAFFING_MAX_CANDIDATES employees rank only the best-fitting ones and are
+reported as truncated.
+"""
+import heapq
+import os
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import utilization
+
+CANDIDATE_LIMIT = 500 # max hits resource-service returns per search (page size)
+MAX_CANDIDATES = int(os.getenv("STAFFING_MAX_CANDIDATES", 5000))
+
+
+def _candidates(hits: List[dict], booked: dict, months: int, max_booked: Optional[float], fit_weight: float,
+                best_fit: float) -> Iterator[dict]:
+    for hit in hits:
+        percents = booked.get(hit["id"]) or [0.0] * months
+        peak = max(percents, default=0.0)
+        if max_booked is not None and peak > max_booked:
+            continue
+        remaining = [round(max(100.0 - p, 0.0), 2) for p in percents]
+        fit = (hit.get("score") or 0) / best_fit
+        # Worst month decides availability: a candidate booked solid in one month can't take the role
+        availability = min(remaining, default=100.0) / 100.0
+        yield {
+            "employee_id": hit["id"],
+            "name": hit.get("name"),
+            "role": hit.get("role"),
+            "fit_score": hit.get("score") or 0,
+            "rank_score": round(fit_weight * fit + (1 - fit_weight) * availability, 4),
+            "percents": percents,
+            "remaining": remaining,
+            "peak_percent": peak,
+        }
+
+
+def _pages(resource_client, q: str, truncated: list) -> Iterator[List[dict]]:
+    offset = 0
+    while offset < MAX_CANDIDATES:
+        hits = resource_client.search_employees(q, limit=CANDIDATE_LIMIT, fields=["name", "role"], offset=offset)
+        if hits:
+            yield hits
+        if len(hits) < CANDIDATE_LIMIT:
+            return
+        offset += len(hits)
+    # Stopped at the cap; anything left fits worse than every candidate ranked
+    truncated.append(bool(resource_client.search_employees(q, limit=1, fields=["name"], offset=offset)))
+
+
+def search(db: Session, resource_client, q: str, start: date, months: int,
+           max_booked: Optional[float] = None, limit: int = 10, fit_weight: float = 0.5) -> Tuple[List[dict], bool]:
+    """Top `limit` employees matching `q`, ranked by fit and free capacity over the months, and whether
+    matches beyond MAX_CANDIDATES were left out."""
+    truncated = []
+
+    def candidates():
+        best_fit = None
+        for hits in _pages(resource_client, q, truncated):
+            if best_fit is None:
+                best_fit = (hits[0].get("score") or 0) or 1 # pages come best first
+            booked = utilization.monthly_utilization(db, start, months, [hit["id"] for hit in hits])
+            yield from _candidates(hits, booked, months, max_booked, fit_weight, best_fit)
+
+    found = heapq.nlargest(limit, candidates(), key=lambda c: (c["rank_score"], -c["employee_id"]))
+    return found, any(truncated)
@@ -0,0 +1,44 @@
+from calendar import monthrange
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def month_windows(start: date, months: int) -> List[tuple]:
+    """[(first_day, last_day), ...] for `months` calendar months starting at `start`'s month."""
+    windows = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        _, last_day = monthrange(year, month)
+        windows.append((date(year, month, 1), date(year, month, last_day)))
+        if month == 12:
+            year, month = year + 1, 1
+        else:
+            month += 1
+    return windows
+
+
+def monthly_utilization(db: Session, start: date, months: int, employee_ids: Optional[List[int]] = None) -> dict:
+    """Day-weighted monthly effort per employee, read from the employee_month_utilization rollup.
+
+    Returns {employee_id: [percent, ...]} with one value per month window.
+    """
+    windows = month_windows(start, months)
+    index = {first: i for i, (first, _) in enumerate(windows)}
+    rollup = models.EmployeeMonthUtilization
+
+    query = db.query(rollup.employee_id, rollup.month, rollup.effort_percent).filter(
+        rollup.month >= windows[0][0], rollup.month <= windows[-1][0]
+    )
+    if employee_ids:
+        query = query.filter(rollup.employee_id.in_(employee_ids))
+
+    result = {emp_id: [0.0] * months for emp_id in employee_ids or []}
+    for emp_id, month, percent in query:
+        if not percent:
+            continue
+        result.setdefault(emp_id, [0.0] * months)[index[month]] = round(percent, 2)
+    return result
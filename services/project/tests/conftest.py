@@ -0,0 +1,66 @@
+import pytest
+import pytest_asyncio
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.main import app, get_db
+from app.database import Base, get_async_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_project.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def setup_db():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def db_session(setup_db):
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture
+def override_get_db(db_session):
+    def _get_db():
+        yield db_session
+    app.dependency_overrides[get_db] = _get_db
+    yield
+    app.dependency_overrides.clear()
+
+@pytest_asyncio.fixture
+async def override_get_async_db(override_get_db):
+    # Same test database through aiosqlite, for the /async routes
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test_project.db")
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async def _get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    app.dependency_overrides[get_async_db] = _get_async_db
+    yield
+    await async_engine.dispose()
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting the SQL statements executed on the test engine.
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) <= 3
+    """
+    @contextmanager
+    def _count():
+        statements = []
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+    return _count
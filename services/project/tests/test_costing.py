@@ -0,0 +1,139 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from datetime import date
+from app.main import app
+from app.resource_client import get_resource_client
+
+
+class FakeResourceClient:
+    def __init__(self, unit_costs):
+        self._unit_costs = unit_costs
+        self.calls = 0
+
+    def unit_costs(self, ranges):
+        self.calls += 1
+        ids = set(ranges)
+        return [c for c in self._unit_costs if c["employee_id"] in ids]
+
+
+@pytest.fixture
+def resource_client(override_get_db):
+    client = FakeResourceClient([
+        # Employee 1 gets a raise on 2026-05-01
+        {"employee_id": 1, "amount": 600000, "start_date": "2026-01-01", "end_date": "2026-04-30"},
+        {"employee_id": 1, "amount": 900000, "start_date": "2026-05-01", "end_date": None},
+        # Employee 2's first record starts after the assignment: it applies backwards
+        {"employee_id": 2, "amount": 310000, "start_date": "2026-06-01", "end_date": None},
+    ])
+    app.dependency_overrides[get_resource_client] = lambda: client
+    yield client
+
+
+@pytest.mark.asyncio
+async def test_project_pnl_honors_unit_cost_history(resource_client):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "P&L", "contract_amount": 3000000, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-05-31"
+        })).json()["id"]
+        await ac.post(f"/projects/{proj_id}/assignments", json={
+            "employee_id": 1,
+            "allocations": [{"start_date": "2026-04-16", "end_date": "2026-05-31", "effort_percent": 100}]
+        })
+        await ac.post(f"/projects/{proj_id}/assignments", json={
+            "employee_id": 2,
+            "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 50}]
+        })
+        await ac.post(f"/projects/{proj_id}/assignments", json={
+            "employee_id": 3,
+            "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 50}]
+        })
+
+        resp = await ac.get(f"/projects/{proj_id}/pnl")
+
+    assert resp.status_code == 200
+    data = resp.json()
+    # 15/30 of April at 600k + all of May at 900k, and half of May at 310k
+    assert [(b["employee_id"], b["cost"]) for b in data["breakdown"]] == [(1, 1200000), (2, 155000), (3, 0)]
+    assert data["cost"] == 1355000
+    assert data["profit"] == 3000000 - 1355000
+    assert data["margin_percent"] == round(1645000 / 3000000 * 100, 2)
+    assert data["missing_cost_employee_ids"] == [3]
+
+
+@pytest.mark.asyncio
+async def test_portfolio_pnl_is_one_batched_call(resource_client, count_queries):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for i in range(20):
+            proj_id = (await ac.post("/projects/", json={
+                "name": f"P{i}", "contract_amount": 1000000, "customer_id": 1,
+                "start_date": "2026-05-01", "end_date": "2026-05-31", "status": "Contracted"
+            })).json()["id"]
+            await ac.post(f"/projects/{proj_id}/assignments", json={
+                "employee_id": 1 + i % 2,
+                "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 10}]
+            })
+
+        with count_queries() as statements:
+            resp = await ac.get("/pnl", params={"status": "Contracted"})
+
+    data = resp.json()
+    assert len(data["projects"]) == 20
+    assert data["cost"] == 10 * 90000 + 10 * 31000
+    assert data["revenue"] == 20 * 1000000
+    assert resource_client.calls == 1
+    assert len(statements) <= 2
+
+
+@pytest.mark.asyncio
+async def test_scenario_overlay_changes_pnl_and_utilization_only_in_scenario(resource_client):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        project_a, project_b = [
+            (await ac.post("/projects/", json={
+                "name": name, "contract_amount": amount, "customer_id": 1,
+                "start_date": "2026-05-01", "end_date": "2026-05-31"
+            })).json()["id"]
+            for name, amount in [("A", 3000000), ("B", 1000000)]
+        ]
+        alloc_1 = (await ac.post(f"/projects/{project_a}/assignments", json={
+            "employee_id": 1, "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 100}]
+        })).json()["allocations"][0]["id"]
+        alloc_2 = (await ac.post(f"/projects/{project_a}/assignments", json={
+            "employee_id": 2, "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 50}]
+        })).json()["allocations"][0]["id"]
+        assignments = (await ac.get("/assignments")).json()
+
+        scenario = (await ac.post("/scenarios", json={"name": "Move Baba"})).json()["id"]
+        assert (await ac.post("/scenarios", json={"name": "Move Baba"})).status_code == 409
+        changes = f"/scenarios/{scenario}/allocations"
+        # Move employee 2 to B (re-editing the same allocation replaces the earlier edit)
+        await ac.post(changes, json={"op": "change", "allocation_id": alloc_2, "project_id": project_b})
+        resp = await ac.post(changes, json={"op": "change", "allocation_id": alloc_2, "project_id": project_b, "effort_percent": 100})
+        assert resp.status_code == 201
+        await ac.post(changes, json={"op": "remove", "allocation_id": alloc_1})
+        await ac.post(changes, json={"op": "add", "project_id": project_a, "employee_id": 1,
+                                     "start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 50})
+        assert (await ac.post(changes, json={"op": "add", "project_id": project_a})).status_code == 400
+        assert (await ac.get(f"/scenarios/{scenario}")).json()["changes"] == 3
+
+        base = (await ac.get("/pnl", params={"ids": f"{project_a},{project_b}"})).json()
+        what_if = (await ac.get("/pnl", params={"ids": f"{project_a},{project_b}", "scenario_id": scenario})).json()
+        assert [p["cost"] for p in base["projects"]] == [900000 + 155000, 0]
+        assert [p["cost"] for p in what_if["projects"]] == [450000, 310000]
+
+        params = {"from": "2026-05-01", "months": 1}
+        assert (await ac.get("/utilization", params=params)).json()["rows"] == [
+            {"employee_id": 1, "percents": [100.0]}, {"employee_id": 2, "percents": [50.0]}
+        ]
+        assert (await ac.get("/utilization", params={**params, "scenario_id": scenario})).json()["rows"] == [
+            {"employee_id": 1, "percents": [50.0]}, {"employee_id": 2, "percents": [100.0]}
+        ]
+        assert (await ac.get("/utilization", params={**params, "scenario_id": 999})).status_code == 404
+
+        # The real tables were never touched
+        assert (await ac.get("/assignments")).json() == assignments
+        assert (await ac.delete(f"/scenarios/{scenario}")).status_code == 204
+        assert (await ac.get("/scenarios")).json() == []
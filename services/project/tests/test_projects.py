@@ -1,37 +1,8 @@
 import pytest
 from httpx import AsyncClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app, get_db
-from app.database import Base
+from app.main import app
 from datetime import date
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_project.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture
-def setup_db():
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def db_session(setup_db):
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@pytest.fixture
-def override_get_db(db_session):
-    def _get_db():
-        yield db_session
-    app.dependency_overrides[get_db] = _get_db
-    yield
-    app.dependency_overrides.clear()
-
 @pytest.mark.asyncio
 async def test_create_project_with_daily_allocation(override_get_db):
     from httpx import ASGITransport
@@ -64,3 +35,718 @@ async def test_create_project_with_daily_allocation(override_get_db):
         assert len(data["allocations"]) == 2
         assert data["allocations"][0]["effort_percent"] == 50
         assert data["allocations"][1]["effort_percent"] == 100
+
+@pytest.mark.asyncio
+async def test_monthly_utilization_is_day_weighted(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        resp_proj = await ac.post("/projects/", json={
+            "name": "Heatmap Project", "contract_amount": 1000000,
+            "start_date": "2026-04-01", "end_date": "2026-05-31", "customer_id": 1
+        })
+        proj_id = resp_proj.json()["id"]
+        await ac.post(f"/projects/{proj_id}/assignments", json={
+            "employee_id": 7,
+            "allocations": [
+                {"start_date": "2026-04-01", "end_date": "2026-04-15", "effort_percent": 50},
+                {"start_date": "2026-04-16", "end_date": "2026-05-15", "effort_percent": 100}
+            ]
+        })
+
+        resp = await ac.get("/utilization", params={"employee_ids": "7,8", "from": "2026-04-01", "months": 3})
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["months"] == ["2026-04", "2026-05", "2026-06"]
+    rows = {r["employee_id"]: r["percents"] for r in data["rows"]}
+    # April: 15 days @50% + 15 days @100% over 30 days, May: 15 of 31 days @100%
+    assert rows[7] == [75.0, round(15 / 31 * 100, 2), 0.0]
+    assert rows[8] == [0.0, 0.0, 0.0]
+
+def test_utilization_rollup_tracks_allocation_writes(db_session):
+    from app import rollup
+    from app.models import Project, Assignment, Allocation, EmployeeMonthUtilization
+
+    def rollup_rows():
+        return {
+            (r.employee_id, r.month.isoformat()): r.effort_percent
+            for r in db_session.query(EmployeeMonthUtilization) if r.effort_percent
+        }
+
+    proj = Project(name="Rollup", customer_id=1, contract_amount=0,
+                   start_date=date(2026, 4, 1), end_date=date(2026, 6, 30))
+    assign = Assignment(project=proj, employee_id=3, start_date=date(2026, 4, 1), end_date=date(2026, 5, 31))
+    alloc = Allocation(assignment=assign, start_date=date(2026, 4, 16), end_date=date(2026, 5, 31), effort_percent=60)
+    db_session.add_all([proj, assign, alloc])
+    db_session.commit()
+    assert rollup_rows() == {(3, "2026-04-01"): 30.0, (3, "2026-05-01"): 60.0}
+
+    alloc.start_date = date(2026, 5, 1)
+    alloc.effort_percent = 100
+    db_session.commit()
+    assert rollup_rows() == {(3, "2026-05-01"): 100.0}
+
+    # Rebuild from scratch agrees with the incrementally maintained rows
+    rollup.rebuild(db_session)
+    assert rollup_rows() == {(3, "2026-05-01"): 100.0}
+
+    db_session.delete(alloc)
+    db_session.commit()
+    assert rollup_rows() == {}
+
+def test_rollup_upsert_compiles_for_postgresql():
+    # PostgreSQL has no round(double precision, int); the rollup upsert must round a NUMERIC there
+    from sqlalchemy import create_mock_engine
+    from sqlalchemy.orm import Session
+    from app import rollup
+    pg = Session(bind=create_mock_engine("postgresql://", executor=None))
+    sql = str(rollup.upsert_statement(pg).compile(dialect=pg.get_bind().dialect))
+    assert "ON CONFLICT (employee_id, month) DO UPDATE" in sql
+    assert "round(CAST(employee_month_utilization.effort_percent + excluded.effort_percent AS NUMERIC), " in sql
+
+def test_allocation_overlap_query_uses_interval_index(db_session, count_queries):
+    from app import intervals
+    from app.models import Assignment, Allocation
+
+    assign = Assignment(project_id=None, employee_id=1)
+    db_session.add(assign)
+    db_session.flush()
+    ranges = [("2026-01-01", "2026-01-31"), ("2026-02-10", "2026-03-10"), ("2026-04-01", "2026-04-30")]
+    allocs = [
+        Allocation(assignment_id=assign.id, start_date=date.fromisoformat(s), end_date=date.fromisoformat(e), effort_percent=50)
+        for s, e in ranges
+    ]
+    db_session.add_all(allocs)
+    db_session.commit()
+    assert intervals._has_rtree(db_session)
+
+    def overlapping(start, end):
+        query = intervals.filter_overlapping(db_session.query(Allocation), db_session, start, end)
+        return sorted(a.id for a in query)
+
+    with count_queries() as statements:
+        assert overlapping(date(2026, 1, 31), date(2026, 2, 10)) == [allocs[0].id, allocs[1].id]
+    # One query through the R*Tree; its presence is remembered from install()
+    assert len(statements) == 1 and "allocation_rtree" in statements[0]
+    assert overlapping(date(2026, 3, 11), date(2026, 3, 31)) == []
+    assert overlapping(date(2026, 3, 1), None) == [allocs[1].id, allocs[2].id]
+
+    # Triggers keep the R*Tree in step with updates and deletes
+    allocs[2].start_date = date(2026, 3, 20)
+    db_session.delete(allocs[0])
+    db_session.commit()
+    assert overlapping(date(2026, 1, 1), date(2026, 1, 31)) == []
+    assert overlapping(date(2026, 3, 11), date(2026, 3, 31)) == [allocs[2].id]
+
+def test_install_adds_indexes_missing_from_older_databases(db_session):
+    from sqlalchemy import inspect
+    from app import intervals
+    engine = db_session.get_bind()
+    with engine.begin() as conn:
+        for name in ("ix_allocations_end_start", "ix_allocations_assignment_id", "ix_assignments_employee_id"):
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+    with engine.begin() as conn:
+        intervals.install(conn)
+    inspector = inspect(engine)
+    assert {"ix_allocations_end_start", "ix_allocations_assignment_id"} <= {i["name"] for i in inspector.get_indexes("allocations")}
+    assert "ix_assignments_employee_id" in {i["name"] for i in inspector.get_indexes("assignments")}
+
+@pytest.mark.asyncio
+async def test_project_reads_do_not_issue_per_assignment_queries(override_get_db, count_queries):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        resp_proj = await ac.post("/projects/", json={
+            "name": "Large Project", "contract_amount": 1000000,
+            "start_date": "2026-04-01", "end_date": "2026-09-30", "customer_id": 1
+        })
+        proj_id = resp_proj.json()["id"]
+        for emp_id in range(1, 11):
+            await ac.post(f"/projects/{proj_id}/assignments", json={
+                "employee_id": emp_id,
+                "allocations": [
+                    {"start_date": "2026-04-01", "end_date": "2026-06-30", "effort_percent": 50},
+                    {"start_date": "2026-07-01", "end_date": "2026-09-30", "effort_percent": 100}
+                ]
+            })
+
+        with count_queries() as statements:
+            resp = await ac.get(f"/projects/{proj_id}")
+        assert resp.status_code == 200
+        assert len(resp.json()["assignments"]) == 10
+        assert all(len(a["allocations"]) == 2 for a in resp.json()["assignments"])
+        assert len(statements) <= 3
+
+        with count_queries() as statements:
+            resp = await ac.get("/assignments")
+        assert len(resp.json()) == 10
+        assert len(statements) <= 3 # including the ETag version lookup
+
+@pytest.mark.asyncio
+async def test_list_projects_keyset_pagination_and_ndjson(override_get_db):
+    from httpx import ASGITransport
+    import json
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for i in range(5):
+            await ac.post("/projects/", json={
+                "name": f"Project {i}", "contract_amount": 100 * i, "customer_id": 1 + i % 2,
+                "start_date": "2026-04-01", "end_date": "2026-09-30",
+                "status": "Contracted" if i % 2 else "Lead"
+            })
+
+        resp = await ac.get("/projects/", params={"limit": 2})
+        assert [p["name"] for p in resp.json()] == ["Project 0", "Project 1"]
+        assert "assignments" not in resp.json()[0]
+        cursor = resp.headers["X-Next-Cursor"]
+
+        resp = await ac.get("/projects/", params={"limit": 2, "after": cursor})
+        assert [p["name"] for p in resp.json()] == ["Project 2", "Project 3"]
+
+        resp = await ac.get("/projects/", params={"limit": 2, "after": resp.headers["X-Next-Cursor"]})
+        assert [p["name"] for p in resp.json()] == ["Project 4"]
+        assert "X-Next-Cursor" not in resp.headers
+
+        resp = await ac.get("/projects/", params={"status": "Contracted", "view": "full"})
+        assert [p["name"] for p in resp.json()] == ["Project 1", "Project 3"]
+        assert resp.json()[0]["assignments"] == []
+
+        resp = await ac.get("/projects/", params={"format": "ndjson", "customer_id": 1, "from": "2026-09-30"})
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [p["name"] for p in rows] == ["Project 0", "Project 2", "Project 4"]
+
+        resp = await ac.get("/projects/", params={"to": "2026-03-31"})
+        assert resp.json() == []
+
+@pytest.mark.asyncio
+async def test_bulk_assignment_ingestion_reports_row_errors(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        resp_proj = await ac.post("/projects/", json={
+            "name": "Program", "contract_amount": 1000000,
+            "start_date": "2026-04-01", "end_date": "2026-06-30", "customer_id": 1
+        })
+        proj_id = resp_proj.json()["id"]
+        april = [{"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 100}]
+
+        resp = await ac.post("/assignments:bulk", json=[
+            {"project_id": proj_id, "employee_id": 1, "allocations": april},
+            {"project_id": 999, "employee_id": 2, "allocations": april},
+            {"project_id": proj_id, "employee_id": 3, "allocations": [
+                {"start_date": "2026-05-31", "end_date": "2026-05-01", "effort_percent": 50}
+            ]},
+            {"project_id": proj_id, "employee_id": 4, "allocations": april},
+        ])
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(data["created"]) == 2
+        assert [(e["index"], e["detail"]) for e in data["errors"]] == [
+            (1, "Project 999 not found"),
+            (2, "Allocation 2026-05-31 - 2026-05-01 ends before it starts"),
+        ]
+
+        csv_body = (
+            "project_id,employee_id,start_date,end_date,effort_percent\n"
+            f"{proj_id},5,2026-05-01,2026-05-31,50\n"
+            f"{proj_id},5,2026-06-01,2026-06-30,100\n"
+            f"{proj_id},6,not-a-date,2026-06-30,100\n"
+        )
+        resp = await ac.post("/assignments:import", files={"file": ("plan.csv", csv_body, "text/csv")})
+        data = resp.json()
+        assert len(data["created"]) == 1
+        assert [e["line"] for e in data["errors"]] == [4]
+
+        resp = await ac.get(f"/projects/{proj_id}")
+        by_employee = {a["employee_id"]: a for a in resp.json()["assignments"]}
+        assert sorted(by_employee) == [1, 4, 5]
+        assert len(by_employee[5]["allocations"]) == 2
+
+        # Bulk inserts keep the utilization rollup current
+        resp = await ac.get("/utilization", params={"employee_ids": "1,5", "from": "2026-04-01", "months": 3})
+        rows = {r["employee_id"]: r["percents"] for r in resp.json()["rows"]}
+        assert rows == {1: [100.0, 0.0, 0.0], 5: [0.0, 50.0, 100.0]}
+
+@pytest.mark.asyncio
+async def test_committed_writes_publish_change_topics(override_get_db):
+    from httpx import ASGITransport
+    from app import events
+    published = []
+    events.subscribe(published.append)
+    transport = ASGITransport(app=app)
+    try:
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            proj_id = (await ac.post("/projects/", json={
+                "name": "Events", "contract_amount": 1, "customer_id": 1,
+                "start_date": "2026-04-01", "end_date": "2026-04-30"
+            })).json()["id"]
+            await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 1, "allocations": [
+                {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 50}
+            ]})
+            await ac.post("/assignments:bulk", json=[{"project_id": proj_id, "employee_id": 2, "allocations": [
+                {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 50}
+            ]}])
+            # Invalid rows only: nothing committed, nothing published
+            await ac.post("/assignments:bulk", json=[{"project_id": 999, "employee_id": 2, "allocations": []}])
+    finally:
+        events.unsubscribe(published.append)
+
+    assert published[0] == ["project:%d" % proj_id, "projects"]
+    for topics in published[1:]:
+        assert {"assignments", "allocations", "utilization", f"project:{proj_id}"} <= set(topics)
+    assert len(published) == 3
+
+@pytest.mark.asyncio
+async def test_etags_roll_over_on_the_utc_date(override_get_db, monkeypatch):
+    from httpx import ASGITransport
+    from app import versions
+    # The same clock as default windows and dashboard staleness, whatever the host's time zone
+    monkeypatch.setattr(versions, "utc_today", lambda: date(2026, 1, 31))
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        resp = await ac.get("/utilization", params={"months": 1})
+        assert resp.json()["months"] == ["2026-01"]
+        etag = resp.headers["etag"]
+        assert (await ac.get("/utilization", params={"months": 1}, headers={"If-None-Match": etag})).status_code == 304
+        monkeypatch.setattr(versions, "utc_today", lambda: date(2026, 2, 1))
+        resp = await ac.get("/utilization", params={"months": 1}, headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.json()["months"] == ["2026-02"]
+
+@pytest.mark.asyncio
+async def test_list_endpoints_answer_if_none_match_with_304(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "ETag", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })).json()["id"]
+        resp = await ac.get("/assignments")
+        etag = resp.headers["etag"]
+
+        resp = await ac.get("/assignments", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        # Other tables' writes leave the tag alone
+        await ac.put(f"/projects/{proj_id}", json={
+            "name": "Renamed", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })
+        assert (await ac.get("/assignments", headers={"If-None-Match": etag})).status_code == 304
+
+        await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 1, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 50}
+        ]})
+        resp = await ac.get("/assignments", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] != etag
+        assert len(resp.json()) == 1
+
+        # Core bulk inserts bump the version too
+        etag = resp.headers["etag"]
+        await ac.post("/assignments:bulk", json=[{"project_id": proj_id, "employee_id": 2, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 50}
+        ]}])
+        assert (await ac.get("/assignments", headers={"If-None-Match": etag})).status_code == 200
+
+@pytest.mark.asyncio
+async def test_change_feed_reports_inserts_updates_and_deletes(override_get_db, db_session):
+    from httpx import ASGITransport
+    from app import models
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "Feed", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })).json()["id"]
+        cursor = (await ac.get("/changes")).json()["next_cursor"]
+
+        assign = (await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 1, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 50}
+        ]})).json()
+        await ac.post("/assignments:bulk", json=[{"project_id": proj_id, "employee_id": 2, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-15", "effort_percent": 20}
+        ]}])
+        alloc = db_session.get(models.Allocation, assign["allocations"][0]["id"])
+        alloc.effort_percent = 80
+        db_session.commit()
+        db_session.delete(alloc)
+        db_session.commit()
+
+        resp = await ac.get("/changes", params={"since": cursor, "limit": 3})
+        page = resp.json()
+        assert page["has_more"] is True
+        resp = await ac.get("/changes", params={"since": page["next_cursor"]})
+        rest = resp.json()
+        assert rest["has_more"] is False
+        feed = [(c["table"], c["op"]) for c in page["changes"] + rest["changes"]]
+        assert feed == [
+            ("assignments", "insert"), ("allocations", "insert"),
+            ("assignments", "insert"), ("allocations", "insert"),
+            ("allocations", "update"), ("allocations", "delete"),
+        ]
+        update = rest["changes"][-2]
+        assert update["row_id"] == alloc.id
+        assert update["data"]["effort_percent"] == 80
+        assert update["data"]["start_date"] == "2026-04-01"
+
+        # Nothing new since the last cursor
+        assert (await ac.get("/changes", params={"since": rest["next_cursor"]})).json()["changes"] == []
+
+@pytest.mark.asyncio
+async def test_async_routes_match_sync_routes(override_get_async_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "Async", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-05-31"
+        })).json()["id"]
+        resp = await ac.post(f"/async/projects/{proj_id}/assignments", json={"employee_id": 7, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 40}
+        ]})
+        assert resp.status_code == 201
+        assert len(resp.json()["allocations"]) == 1
+        assert (await ac.post("/async/projects/999/assignments", json={"employee_id": 7, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 40}
+        ]})).status_code == 404
+
+        for path in [f"/projects/{proj_id}", "/assignments"]:
+            sync, async_ = await ac.get(path), await ac.get(f"/async{path}")
+            assert async_.status_code == 200
+            assert async_.json() == sync.json()
+
+        # Flush hooks ran on the async session: the rollup is current and ETags work
+        params = {"employee_ids": "7", "from": "2026-04-01", "months": 2}
+        resp = await ac.get("/async/utilization", params=params)
+        assert resp.json()["rows"] == [{"employee_id": 7, "percents": [40.0, 0.0]}]
+        resp = await ac.get("/async/utilization", params=params, headers={"If-None-Match": resp.headers["etag"]})
+        assert resp.status_code == 304
+
+        resp = await ac.get("/async/allocations", params={"start_date": "2026-04-15", "end_date": "2026-04-20"})
+        assert len(resp.json()) == 1
+
+@pytest.mark.asyncio
+async def test_streaming_exports_csv_and_xlsx(override_get_db, db_session):
+    import csv, io, zipfile
+    from httpx import ASGITransport
+    from app import models
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "請求 & Co", "contract_amount": 1, "customer_id": 3,
+            "start_date": "2026-04-01", "end_date": "2026-05-31"
+        })).json()["id"]
+        await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 9, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 60}
+        ]})
+        db_session.add_all([
+            models.Billing(project_id=proj_id, billing_date=date(2026, 4, 30), amount=1000 + i, status="Sent")
+            for i in range(2500)
+        ])
+        db_session.commit()
+
+        resp = await ac.get("/billings/export", params={"format": "csv"})
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert "attachment" in resp.headers["content-disposition"]
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert rows[0][:3] == ["billing_id", "project_id", "project_name"]
+        assert len(rows) == 2501
+        assert rows[1][2:7] == ["請求 & Co", "3", "2026-04-30", "1000", "Sent"]
+
+        resp = await ac.get("/billings/export", params={"format": "xlsx", "to": "2026-03-31"})
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            assert zf.testzip() is None
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+        assert sheet.count("<row>") == 1 # header only
+
+        resp = await ac.get("/billings/export", params={"format": "xlsx"})
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+        assert sheet.count("<row>") == 2501
+        assert "請求 &amp; Co" in sheet
+        assert '<c s="1"><v>46142</v></c>' in sheet # 2026-04-30 as an Excel date
+
+        resp = await ac.get("/allocations/export", params={"start_date": "2026-04-10", "end_date": "2026-04-12"})
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert [r[3:] for r in rows[1:]] == [["9", "2026-04-01", "2026-04-30", "60"]]
+
+        resp = await ac.get("/utilization/export", params={"from": "2026-04-01", "months": 2})
+        rows = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        assert rows == [["employee_id", "2026-04", "2026-05"], ["9", "60.0", "0.0"]]
+
+@pytest.mark.asyncio
+async def test_billing_summary_and_revenue_forecast(override_get_db, db_session):
+    from httpx import ASGITransport
+    from app import models, revenue
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = (await ac.post("/projects/", json={
+            "name": "Contracted", "customer_id": 1, "contract_amount": 3_000_000,
+            "start_date": "2026-04-01", "end_date": "2026-06-30", "status": "Contracted"
+        })).json()["id"]
+        second = (await ac.post("/projects/", json={
+            "name": "Lead", "customer_id": 2, "contract_amount": 900_000,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })).json()["id"]
+        db_session.add_all([
+            models.Billing(project_id=first, billing_date=date(2026, 4, 30), amount=1_000_000, status="Paid"),
+            models.Billing(project_id=first, billing_date=date(2026, 5, 31), amount=1_000_000, status="Sent"),
+            models.Billing(project_id=second, billing_date=date(2026, 4, 15), amount=900_000, status="Sent"),
+        ])
+        db_session.commit()
+        moved = db_session.query(models.Billing).filter_by(amount=900_000).one()
+        moved.status = "Paid"
+        db_session.commit()
+
+        # Month-aligned window: served from the rollup, kept current by the flush hook
+        resp = await ac.get("/billings/summary", params={"group_by": "month,status", "from": "2026-04-01", "to": "2026-05-31"})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["total"] == 2_900_000 and body["count"] == 3
+        assert [(g["month"], g["status"], g["amount"]) for g in body["groups"]] == [
+            ("2026-04", "Paid", 1_900_000), ("2026-05", "Sent", 1_000_000)
+        ]
+
+        # Mid-month window scans billings directly
+        resp = await ac.get("/billings/summary", params={"group_by": "project", "from": "2026-04-20"})
+        assert [(g["project_name"], g["amount"]) for g in resp.json()["groups"]] == [("Contracted", 2_000_000)]
+
+        resp = await ac.get("/billings/summary", params={"group_by": "customer"})
+        assert {g["customer_id"]: g["amount"] for g in resp.json()["groups"]} == {1: 2_000_000, 2: 900_000}
+        assert (await ac.get("/billings/summary", params={"group_by": "week"})).status_code == 400
+
+        # A rollup rebuild invalidates cached summaries
+        etag = (await ac.get("/billings/summary")).headers["etag"]
+        assert (await ac.get("/billings/summary", headers={"If-None-Match": etag})).status_code == 304
+        revenue.rebuild(db_session.connection())
+        db_session.commit()
+        assert (await ac.get("/billings/summary", headers={"If-None-Match": etag})).status_code == 200
+
+        # Only the contracted project is recognized, spread by days per month
+        resp = await ac.get("/revenue/forecast", params={"from": "2026-04-01", "months": 4})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert [(m["month"], m["recognized"], m["billed"]) for m in body["months"]] == [
+            ("2026-04", 989_011, 1_900_000), ("2026-05", 1_021_978, 1_000_000),
+            ("2026-06", 989_011, 0), ("2026-07", 0, 0),
+        ]
+
+@pytest.mark.asyncio
+async def test_over_allocating_writes_are_rejected_and_audited(override_get_db, db_session):
+    from httpx import ASGITransport
+    from app.models import Allocation, Assignment, EmployeeMonthUtilization
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "Busy", "customer_id": 1, "contract_amount": 1000,
+            "start_date": "2026-04-01", "end_date": "2026-06-30"
+        })).json()["id"]
+        resp = await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 7, "allocations": [
+            {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 60}
+        ]})
+        assert resp.status_code == 201
+        booked_id = resp.json()["allocations"][0]["id"]
+
+        resp = await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 7, "allocations": [
+            {"start_date": "2026-04-20", "end_date": "2026-05-10", "effort_percent": 50}
+        ]})
+        assert resp.status_code == 409
+        assert resp.json()["conflicts"] == [{
+            "employee_id": 7, "start_date": "2026-04-20", "end_date": "2026-04-30",
+            "peak_percent": 110.0, "allocation_ids": [booked_id]
+        }]
+        # Nothing from the rejected write reached the rollup
+        db_session.rollback()
+        assert {r.month.isoformat(): r.effort_percent for r in db_session.query(EmployeeMonthUtilization)} == {"2026-04-01": 60.0}
+
+        # Bulk rows are checked against stored rows and earlier rows of the batch
+        resp = await ac.post("/assignments:bulk", json=[
+            {"project_id": proj_id, "employee_id": 8, "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 70}]},
+            {"project_id": proj_id, "employee_id": 8, "allocations": [{"start_date": "2026-05-15", "end_date": "2026-05-20", "effort_percent": 40}]},
+            {"project_id": proj_id, "employee_id": 7, "allocations": [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 100}]},
+        ])
+        body = resp.json()
+        assert len(body["created"]) == 2
+        assert [e["index"] for e in body["errors"]] == [1]
+
+        # Over-allocation written with the check turned off shows up in the audit
+        db_session.info["check_allocations"] = False
+        db_session.add(Assignment(project_id=proj_id, employee_id=9, allocations=[
+            Allocation(start_date=date(2026, 6, 1), end_date=date(2026, 6, 30), effort_percent=80),
+            Allocation(start_date=date(2026, 6, 10), end_date=date(2026, 6, 12), effort_percent=30),
+            Allocation(start_date=date(2026, 6, 12), end_date=date(2026, 6, 20), effort_percent=30),
+        ]))
+        db_session.commit()
+        resp = await ac.get("/conflicts")
+        assert [(c["employee_id"], c["start_date"], c["end_date"], c["peak_percent"]) for c in resp.json()["conflicts"]] == [
+            (9, "2026-06-10", "2026-06-20", 140.0)
+        ]
+        resp = await ac.get("/conflicts", params={"start_date": "2026-06-15", "threshold": 150})
+        assert resp.json()["conflicts"] == []
+
+@pytest.mark.asyncio
+async def test_jobs_queue_run_and_reuse_results(override_get_db, db_session, tmp_path, monkeypatch):
+    from httpx import ASGITransport
+    from app import jobs, models
+    monkeypatch.setattr(jobs, "JOB_DIR", str(tmp_path))
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "Month end", "customer_id": 1, "contract_amount": 1000,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })).json()["id"]
+        db_session.add(models.Billing(project_id=proj_id, billing_date=date(2026, 4, 30), amount=1000, status="Sent"))
+        db_session.commit()
+
+        export = {"kind": "export", "params": {"name": "billings", "format": "csv"}}
+        resp = await ac.post("/jobs", json=export)
+        assert resp.status_code == 202
+        job = resp.json()
+        assert (job["status"], job["reused"]) == ("queued", False)
+        assert (await ac.get(f"/jobs/{job['id']}/result")).status_code == 409
+        # Submitting again while queued returns the same job
+        assert (await ac.post("/jobs", json=export)).json()["id"] == job["id"]
+
+        assert jobs.run_next(db_session) == job["id"]
+        assert jobs.run_next(db_session) is None
+        done = (await ac.get(f"/jobs/{job['id']}")).json()
+        assert (done["status"], done["progress"]) == ("succeeded", 1.0)
+        resp = await ac.get(f"/jobs/{job['id']}/result")
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert resp.text.splitlines()[1].split(",")[:3] == ["1", str(proj_id), "Month end"]
+
+        # Cached until a table it reads changes
+        again = (await ac.post("/jobs", json=export)).json()
+        assert (again["id"], again["reused"]) == (job["id"], True)
+        db_session.add(models.Billing(project_id=proj_id, billing_date=date(2026, 5, 31), amount=500, status="Sent"))
+        db_session.commit()
+        fresh = (await ac.post("/jobs", json=export)).json()
+        assert fresh["id"] != job["id"]
+        assert (await ac.delete(f"/jobs/{fresh['id']}")).status_code == 204
+        assert (await ac.delete(f"/jobs/{fresh['id']}")).status_code == 409
+
+        bad = (await ac.post("/jobs", json={"kind": "export", "params": {"name": "secrets"}})).json()
+        jobs.run_next(db_session)
+        failed = (await ac.get(f"/jobs/{bad['id']}")).json()
+        assert failed["status"] == "failed" and "ValueError" in failed["error"]
+        assert (await ac.post("/jobs", json={"kind": "nope"})).status_code == 400
+        assert [j["status"] for j in (await ac.get("/jobs")).json()] == ["failed", "cancelled", "succeeded"]
+
+@pytest.mark.asyncio
+async def test_dashboard_reads_snapshot_and_reports_staleness(override_get_db, db_session):
+    from datetime import timedelta
+    from httpx import ASGITransport
+    from sqlalchemy.orm import sessionmaker
+    from app import dashboard, jobs, models
+    from app.utilization import month_windows
+    first, last = month_windows(date.today().replace(day=1), 1)[0]
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for name, status, amount in [("Won", "Contracted", 3000), ("Maybe", "Lead", 1000), ("Maybe too", "Lead", 500)]:
+            proj_id = (await ac.post("/projects/", json={
+                "name": name, "customer_id": 1, "contract_amount": amount, "status": status,
+                "start_date": first.isoformat(), "end_date": last.isoformat()
+            })).json()["id"]
+        await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": 1, "allocations": [
+            {"start_date": first.isoformat(), "end_date": last.isoformat(), "effort_percent": 50}
+        ]})
+
+        # Requests never compute or queue the snapshot; the refresher queues it when it starts
+        resp = await ac.get("/dashboard")
+        assert resp.status_code == 503 and resp.headers["Retry-After"]
+        assert (await ac.get("/jobs")).json() == []
+        refresher = dashboard.Refresher(sessionmaker(autocommit=False, autoflush=False, bind=db_session.get_bind()), interval=3600)
+        refresher.start()
+        refresher.stop()
+        queued = (await ac.get("/jobs", params={"kind": "refresh_dashboard"})).json()
+        assert [j["status"] for j in queued] == ["queued"]
+        assert jobs.run_next(db_session) == queued[0]["id"]
+
+        snap = (await ac.get("/dashboard")).json()
+        assert snap["stale"] is False
+        assert (snap["projects"], snap["contract_amount"]) == (3, 4500)
+        assert {s["status"]: s["projects"] for s in snap["statuses"]} == {"Contracted": 1, "Lead": 2}
+        assert (snap["pipeline_projects"], snap["pipeline_value"]) == (2, 1500)
+        assert snap["utilization"][0] == {"month": first.strftime("%Y-%m"), "employees": 1, "average_percent": 50.0, "over_allocated": 0}
+        assert len(snap["utilization"]) == 6
+
+        # Reads never recompute: a change only flags the snapshot until a refresh job runs
+        resp = await ac.post("/projects/", json={"name": "New lead", "customer_id": 1, "contract_amount": 200, "status": "Lead",
+                                                 "start_date": first.isoformat(), "end_date": last.isoformat()})
+        assert resp.status_code == 201
+        snap = (await ac.get("/dashboard")).json()
+        assert (snap["stale"], snap["pipeline_value"]) == (True, 1500)
+        job = (await ac.post("/jobs", json={"kind": "refresh_dashboard"})).json()
+        assert jobs.run_next(db_session) == job["id"]
+        snap = (await ac.get("/dashboard")).json()
+        assert (snap["stale"], snap["pipeline_value"], snap["projects"]) == (False, 1700, 4)
+
+    # computed_at is UTC, so the month rollover is judged on the UTC date too
+    row = db_session.get(models.DashboardSnapshot, dashboard.PORTFOLIO)
+    assert not dashboard.is_stale(db_session, row, row.computed_at.date())
+    assert dashboard.is_stale(db_session, row, row.computed_at.date() + timedelta(days=32))
+
+def test_runners_sharing_a_queue_only_requeue_abandoned_jobs(db_session, monkeypatch):
+    import socket
+    from datetime import datetime, timedelta
+    import jobqueue
+    from sqlalchemy.orm import sessionmaker
+    from app import jobs, models
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db_session.get_bind())
+    first, second = jobqueue.Runner(jobs.queue, factory), jobqueue.Runner(jobs.queue, factory)
+
+    job, _ = jobs.submit(db_session, "rebuild_utilization")
+    first.heartbeat.start()
+    try:
+        assert jobs.claim(db_session, first.owner) == job.id
+        # Another runner starting up leaves the live runner's job alone
+        assert second.requeue_stale() == 0
+        db_session.refresh(job)
+        assert (job.status, job.owner) == ("running", first.owner)
+
+        # ... until its heartbeat goes quiet
+        job.heartbeat_at = datetime.utcnow() - timedelta(seconds=jobqueue.HEARTBEAT_TIMEOUT + 1)
+        db_session.commit()
+        assert second.requeue_stale() == 1
+        db_session.refresh(job)
+        assert (job.status, job.owner) == ("queued", None)
+
+        # A fresh heartbeat doesn't help an owner that has exited
+        assert jobs.claim(db_session, f"{socket.gethostname()}:{2 ** 22 + 7}:gone") == job.id
+        monkeypatch.setattr(jobqueue.os, "kill", lambda pid, sig: (_ for _ in ()).throw(ProcessLookupError()))
+        assert second.requeue_stale() == 1
+    finally:
+        first.heartbeat.stop()
+    # Its own owner is no longer live once the heartbeat stops
+    assert jobs.claim(db_session, first.owner) == job.id
+    assert second.requeue_stale() == 1
+
+def test_concurrent_submits_of_one_key_queue_one_job(db_session, monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+    from app import jobs, models
+    other = sessionmaker(autocommit=False, autoflush=False, bind=db_session.get_bind())()
+    lookup = jobs.queue._pending
+    theirs = {}
+
+    def racing(db, key):
+        found = lookup(db, key)
+        if db is db_session and not theirs:
+            # Another process submits the same job between this lookup and the INSERT
+            theirs["id"] = jobs.submit(other, "rebuild_utilization")[0].id
+        return found
+
+    monkeypatch.setattr(jobs.queue, "_pending", racing)
+    try:
+        ours, reused = jobs.submit(db_session, "rebuild_utilization")
+    finally:
+        other.close()
+    assert reused and ours.id == theirs["id"]
+    assert db_session.query(models.Job).count() == 1
+
+    # Finished jobs don't hold the key
+    assert jobs.run_next(db_session) == ours.id
+    again, reused = jobs.submit(db_session, "rebuild_utilization")
+    assert not reused and again.id != ours.id
@@ -0,0 +1,132 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.resource_client import get_resource_client
+
+
+class FakeResourceClient:
+    def __init__(self, hits):
+        self.hits = hits
+
+    def search_employees(self, q, limit=20, fields=None, offset=0):
+        return self.hits[offset:offset + limit]
+
+
+@pytest.mark.asyncio
+async def test_staffing_search_ranks_by_fit_and_capacity(override_get_db):
+    app.dependency_overrides[get_resource_client] = lambda: FakeResourceClient([
+        {"id": 1, "name": "Aoki", "role": "Consultant", "score": 9.0},
+        {"id": 2, "name": "Baba", "role": "Consultant", "score": 8.0},
+        {"id": 3, "name": "Chiba", "role": "Engineer", "score": 3.0},
+    ])
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "SAP rollout", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-06-30"
+        })).json()["id"]
+        # Aoki is fully booked in May, Baba half booked throughout
+        for emp_id, allocations in [
+            (1, [{"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 100}]),
+            (2, [{"start_date": "2026-04-01", "end_date": "2026-06-30", "effort_percent": 50}]),
+        ]:
+            await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": emp_id, "allocations": allocations})
+
+        params = {"q": "+sap", "from": "2026-04-01", "to": "2026-06-30"}
+        resp = await ac.get("/staffing/search", params={**params, "max_booked": 50})
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["months"] == ["2026-04", "2026-05", "2026-06"]
+        assert [c["employee_id"] for c in body["candidates"]] == [2, 3]
+        assert body["candidates"][0]["remaining"] == [50.0, 50.0, 50.0]
+
+        resp = await ac.get("/staffing/search", params={**params, "limit": 2, "fit_weight": 1})
+        assert [c["employee_id"] for c in resp.json()["candidates"]] == [1, 2]
+        assert resp.json()["truncated"] is False
+
+
+@pytest.mark.asyncio
+async def test_staffing_search_pages_past_the_first_hits(override_get_db, monkeypatch):
+    from app import staffing
+    monkeypatch.setattr(staffing, "CANDIDATE_LIMIT", 2)
+    monkeypatch.setattr(staffing, "MAX_CANDIDATES", 4)
+    hits = [{"id": i, "name": f"E{i}", "score": 10.0 - i} for i in range(1, 7)]
+    app.dependency_overrides[get_resource_client] = lambda: FakeResourceClient(hits)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        proj_id = (await ac.post("/projects/", json={
+            "name": "Busy", "contract_amount": 1, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-04-30"
+        })).json()["id"]
+        for emp_id in (1, 2, 3):
+            await ac.post(f"/projects/{proj_id}/assignments", json={"employee_id": emp_id, "allocations": [
+                {"start_date": "2026-04-01", "end_date": "2026-04-30", "effort_percent": 100}
+            ]})
+        params = {"q": "+sap", "from": "2026-04-01", "to": "2026-04-30", "limit": 1, "fit_weight": 0.2}
+        # Employee 4 is on the second page but the only free one in the first four
+        body = (await ac.get("/staffing/search", params=params)).json()
+        assert [c["employee_id"] for c in body["candidates"]] == [4]
+        assert body["truncated"] is True
+
+        monkeypatch.setattr(staffing, "MAX_CANDIDATES", 6)
+        assert (await ac.get("/staffing/search", params=params)).json()["truncated"] is False
+
+
+class FakePlanningClient:
+    def __init__(self, hits, monthly_costs):
+        self.hits, self.monthly_costs = hits, monthly_costs
+
+    def search_employees(self, q, limit=20, fields=None):
+        return self.hits.get(q, [])[:limit]
+
+    def unit_costs(self, ranges):
+        return [
+            {"employee_id": emp_id, "start_date": start.isoformat(), "amount": self.monthly_costs[emp_id]}
+            for emp_id, (start, _) in ranges.items() if emp_id in self.monthly_costs
+        ]
+
+
+@pytest.mark.asyncio
+async def test_plan_respects_capacity_and_objective_without_writing(override_get_db):
+    app.dependency_overrides[get_resource_client] = lambda: FakePlanningClient(
+        {
+            "+sap": [{"id": 1, "name": "Aoki", "score": 5.0}, {"id": 2, "name": "Baba", "score": 4.0}, {"id": 3, "name": "Chiba", "score": 3.0}],
+            "+java": [{"id": 2, "name": "Baba", "score": 6.0}, {"id": 4, "name": "Doi", "score": 2.0}],
+        },
+        {1: 300_000, 2: 600_000, 3: 100_000, 4: 400_000},
+    )
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        busy = (await ac.post("/projects/", json={
+            "name": "Running", "contract_amount": 1, "customer_id": 1, "status": "Contracted",
+            "start_date": "2026-05-01", "end_date": "2026-05-31"
+        })).json()["id"]
+        await ac.post(f"/projects/{busy}/assignments", json={"employee_id": 3, "allocations": [
+            {"start_date": "2026-05-01", "end_date": "2026-05-31", "effort_percent": 100}
+        ]})
+        lead = (await ac.post("/projects/", json={
+            "name": "Pipeline", "contract_amount": 3_000_000, "customer_id": 1,
+            "start_date": "2026-04-01", "end_date": "2026-06-30"
+        })).json()["id"]
+        demands = [
+            {"project_id": lead, "q": "+sap", "effort_percent": 50, "headcount": 2},
+            {"project_id": lead, "q": "+java"},
+        ]
+        before = (await ac.get("/assignments")).json()
+
+        # Baba loses money on either demand and Chiba is booked in May
+        resp = await ac.post("/plans", json={"demands": demands, "objective": "margin"})
+        assert resp.status_code == 200
+        plan = resp.json()
+        assert sorted((a["demand_index"], a["employee_id"]) for a in plan["assignments"]) == [(0, 1), (1, 4)]
+        assert plan["unfilled"] == [{"project_id": lead, "demand_index": 0, "reason": "no candidate with free capacity"}]
+        assert (plan["revenue"], plan["cost"], plan["margin"]) == (2_250_000, 1_650_000, 600_000)
+
+        resp = await ac.post("/plans", json={"demands": demands, "objective": "coverage"})
+        plan = resp.json()
+        assert plan["filled"] == plan["slots"] == 3
+        assert sorted((a["demand_index"], a["employee_id"]) for a in plan["assignments"]) == [(0, 1), (0, 2), (1, 4)]
+
+        assert (await ac.get("/assignments")).json() == before
+        resp = await ac.post("/plans", json={"demands": [{"project_id": 999, "q": "+sap"}]})
+        assert resp.status_code == 400
@@ -0,0 +1,120 @@
+"""In-memory, time-versioned UnitCost lookup.
+
+Each employee's cost history is cached as sorted arrays of start days so
+"cost for employee X over [start, end]" is a bisect plus a short scan.
+Every lookup first compares the unit_costs table version (app/versions.py)
+with the one the cache was filled at and drops all entries when it moved,
+so writes are seen whichever process made them (the API, job workers, CLI
+imports). Entries also expire after UNIT_COST_CACHE_TTL seconds.
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas, versions
+
+TTL = float(os.getenv("UNIT_COST_CACHE_TTL", 300))
+TABLES = ("unit_costs",)
+
+
+class _History:
+    __slots__ = ("starts", "ends", "amounts", "loaded_at")
+
+    def __init__(self, records: List[models.UnitCost]):
+        records = sorted(records, key=lambda r: (r.start_date, r.id or 0))
+        self.starts = [r.start_date for r in records]
+        self.amounts = [r.amount for r in records]
+        # A record runs until its end_date, or until the next record starts
+        self.ends = []
+        for i, r in enumerate(records):
+            end = r.end_date
+            if i + 1 < len(records):
+                next_end = records[i + 1].start_date - timedelta(days=1)
+                end = min(end, next_end) if end else next_end
+            self.ends.append(end)
+        self.loaded_at = time.monotonic()
+
+    def segments(self, start: Optional[date], end: Optional[date]) -> List[dict]:
+        i = max(bisect_right(self.starts, start) - 1, 0) if start else 0
+        result = []
+        while i < len(self.starts) and (end is None or self.starts[i] <= end):
+            seg_start, seg_end = self.starts[i], self.ends[i]
+            if seg_end is None or start is None or seg_end >= start:
+                if start and seg_start < start:
+                    seg_start = start
+                if end and (seg_end is None or seg_end > end):
+                    seg_end = end
+                if seg_end is None or seg_start <= seg_end:
+                    result.append({"start_date": seg_start, "end_date": seg_end, "amount": self.amounts[i]})
+            i += 1
+        return result
+
+
+class UnitCostCache:
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[int, _History] = {}
+        self.versions = None # table versions the entries reflect
+
+    def _sync(self, db: Session):
+        # Versions are read before loading: a write landing meanwhile clears the cache on the next lookup
+        state = versions.current(db, TABLES)
+        with self._lock:
+            if state != self.versions:
+                self._entries.clear()
+                self.versions = state
+
+    def _histories(self, db: Session, employee_ids: Iterable[int]) -> Dict[int, _History]:
+        self._sync(db)
+        now = time.monotonic()
+        with self._lock:
+            found = {
+                emp_id: h for emp_id in set(employee_ids)
+                if (h := self._entries.get(emp_id)) is not None and now - h.loaded_at < self.ttl
+            }
+        missing = set(employee_ids) - set(found)
+        if missing:
+            by_employee = {emp_id: [] for emp_id in missing}
+            for record in db.query(models.UnitCost).filter(models.UnitCost.employee_id.in_(missing)):
+                by_employee[record.employee_id].append(record)
+            loaded = {emp_id: _History(records) for emp_id, records in by_employee.items()}
+            with self._lock:
+                self._entries.update(loaded)
+            found.update(loaded)
+        return found
+
+    def lookup(self, db: Session, ranges: List[schemas.UnitCostRange]) -> List[dict]:
+        histories = self._histories(db, [r.employee_id for r in ranges])
+        return [
+            {
+                "employee_id": r.employee_id,
+                "start_date": r.start_date,
+                "end_date": r.end_date,
+                "segments": histories[r.employee_id].segments(r.start_date, r.end_date),
+            }
+            for r in ranges
+        ]
+
+    def invalidate(self, employee_ids: Optional[Iterable[int]] = None):
+        with self._lock:
+            if employee_ids is None:
+                self._entries.clear()
+            else:
+                for emp_id in employee_ids:
+                    self._entries.pop(emp_id, None)
+
+
+def install(conn):
+    """Create the unit_costs indexes lookups filter on; create_all() skips indexes of existing tables."""
+    for index in models.UnitCost.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+cache = UnitCostCache()
+
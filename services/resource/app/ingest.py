@@ -0,0 +1,146 @@
+"""Bulk employee import: JSON payloads, CSV uploads and the CLI.
+
+    python -m app.ingest employees.csv [--dry-run]
+
+CSV columns: name,email,role,skills,unit_cost (skills separated by ';').
+"""
+import argparse
+import csv
+import io
+from datetime import date
+from typing import List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import events, models, schemas, versions
+from .skill_index import index as skill_index
+
+CSV_COLUMNS = ["name", "email", "role", "skills", "unit_cost"]
+
+
+def employee_errors(emp: schemas.EmployeeCreate) -> Optional[str]:
+    if not emp.name.strip():
+        return "name required"
+    if "@" not in emp.email:
+        return f"Invalid email {emp.email!r}"
+    if emp.unit_cost < 0:
+        return f"unit_cost must not be negative, got {emp.unit_cost}"
+    return None
+
+
+def resolve_skills(db: Session, names) -> dict:
+    """{name: skill_id}, creating missing skills with INSERT ... ON CONFLICT DO NOTHING."""
+    names = sorted({n.strip() for n in names if n and n.strip()})
+    if not names:
+        return {}
+    db.execute(
+        versions.upsert(db, models.Skill).on_conflict_do_nothing(index_elements=[models.Skill.name]),
+        [{"name": name} for name in names],
+    )
+    return dict(db.execute(select(models.Skill.name, models.Skill.id).where(models.Skill.name.in_(names))).all())
+
+
+def bulk_create_employees(db: Session, rows: List[Tuple[Optional[int], schemas.EmployeeCreate]],
+                          commit: bool = True, validate: bool = True) -> dict:
+    """Validate and insert employees, skill links and initial unit costs in one transaction.
+
+    `rows` pairs each employee with the source line it came from (None for
+    JSON). Invalid rows are reported and skipped; validate=False only
+    refuses duplicate emails, like single POST /employees always has.
+    """
+    errors = []
+    emails = [row.email for _, row in rows]
+    taken = {
+        email for (email,) in db.query(models.Employee.email).filter(models.Employee.email.in_(emails))
+    } if emails else set()
+
+    valid = []
+    for index, (line, row) in enumerate(rows):
+        detail = employee_errors(row) if validate else None
+        if not detail and row.email in taken:
+            detail = f"Email {row.email} already registered"
+        if detail:
+            errors.append({"index": index, "line": line, "detail": detail})
+            continue
+        taken.add(row.email) # later duplicates within the batch are errors too
+        valid.append(row)
+
+    if not valid:
+        return {"created": [], "errors": errors}
+
+    skill_ids = resolve_skills(db, (name for row in valid for name in row.skills))
+    employee_ids = db.scalars(
+        insert(models.Employee).returning(models.Employee.id, sort_by_parameter_order=True),
+        [{"name": row.name, "email": row.email, "role": row.role} for row in valid],
+    ).all()
+
+    links = {
+        (emp_id, skill_ids[name.strip()])
+        for emp_id, row in zip(employee_ids, valid)
+        for name in row.skills if name and name.strip()
+    }
+    if links:
+        db.execute(insert(models.EmployeeSkill), [{"employee_id": e, "skill_id": s} for e, s in sorted(links)])
+    today = date.today()
+    db.execute(insert(models.UnitCost), [
+        {"employee_id": emp_id, "amount": row.unit_cost, "start_date": today}
+        for emp_id, row in zip(employee_ids, valid)
+    ])
+
+    # Core INSERTs bypass the flush hooks; bump versions / publish explicitly
+    versions.bump(db, "employees", "skills", "employee_skills", "unit_costs")
+    events.touch(db, "employees", "unit_costs", *(f"employee:{emp_id}" for emp_id in employee_ids))
+    if commit:
+        db.commit()
+        skill_index.mark_stale(set(employee_ids))
+    return {"created": list(employee_ids), "errors": errors}
+
+
+def parse_csv(text: str):
+    """Parse a CSV employee list into ([(line, EmployeeCreate)], errors)."""
+    rows, errors = [], []
+    reader = csv.DictReader(io.StringIO(text))
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        return [], [{"index": None, "line": 1, "detail": f"Missing columns: {', '.join(sorted(missing))}"}]
+    for record in reader:
+        try:
+            rows.append((reader.line_num, schemas.EmployeeCreate(
+                name=record["name"].strip(),
+                email=record["email"].strip(),
+                role=(record["role"] or "").strip(),
+                skills=[s.strip() for s in (record["skills"] or "").split(";") if s.strip()],
+                unit_cost=int(record["unit_cost"]),
+            )))
+        except (ValueError, TypeError, AttributeError, ValidationError) as e:
+            errors.append({"index": None, "line": reader.line_num, "detail": str(e)})
+    return rows, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import employees from a CSV file")
+    parser.add_argument("path")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and roll back")
+    args = parser.parse_args(argv)
+
+    with open(args.path, encoding="utf-8-sig") as f:
+        rows, errors = parse_csv(f.read())
+
+    from .database import Base, SessionLocal, engine
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = bulk_create_employees(db, rows, commit=not args.dry_run)
+        if args.dry_run:
+            db.rollback()
+    finally:
+        db.close()
+    for error in errors + result["errors"]:
+        print(f"line {error['line']}: {error['detail']}")
+    print(f"{'Validated' if args.dry_run else 'Created'} {len(result['created'])} employees, {len(errors) + len(result['errors'])} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Resource-service background jobs.
+
+The queue itself (claiming, heartbeats, the process pool and the CLI) is
+shared with project-service; see services/common/jobqueue.py. This module
+builds resource-service's queue over models.Job and registers the job
+kinds it runs.
+
+    python -m app.jobs worker [--workers N]     # drain the queue until interrupted
+    python -m app.jobs run-once                 # run queued jobs inline
+    python -m app.jobs prune --keep-days N      # delete old jobs
+"""
+from jobqueue import JobQueue, UnknownJobKind # noqa: F401 (re-exported)
+from sqlalchemy.orm import Session
+
+from . import ingest, models, versions
+from . import events # noqa: F401 (register hooks)
+from .database import SessionLocal, make_engine
+
+queue = JobQueue(models.Job, SessionLocal, make_engine, versions.current, module="app.jobs")
+kind = queue.kind
+submit = queue.submit
+claim = queue.claim
+cancel = queue.cancel
+run_next = queue.run_next
+result_file = queue.result_file
+lifespan = queue.lifespan
+
+
+@kind("import_employees")
+def _import_employees(db: Session, params: dict, progress):
+    # params: {"csv": "<file contents>"}, same columns as POST /employees:import
+    rows, parse_errors = ingest.parse_csv(params.get("csv") or "")
+    progress(0.0, f"Importing {len(rows)} rows")
+    result = ingest.bulk_create_employees(db, rows, commit=False)
+    result["errors"] = parse_errors + result["errors"]
+    return result
+
+
+if __name__ == "__main__":
+    queue.main()
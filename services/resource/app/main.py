@@ -1,43 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Response, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+import json
 from typing import List, Optional
-from . import models, schemas
-from .database import engine, get_db
+from . import models, schemas, events, versions, ingest, jobs, cost_cache
+from .cost_cache import cache as unit_cost_cache
+from .skill_index import index as skill_index
+from datetime import timedelta
+from .database import DB_PROFILE, engine, get_async_db, get_db, warm_up
 
 models.Base.metadata.create_all(bind=engine)
+with engine.begin() as conn:
+    # create_all() skips indexes of tables that already exist
+    cost_cache.install(conn)
+    jobs.queue.install(conn)
+if DB_PROFILE == "production":
+    warm_up(engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=jobs.lifespan)
+
+# Tables an employee read depends on, for ETags
+EMPLOYEE_TABLES = ("employees", "skills", "employee_skills", "unit_costs")
 
 @app.post("/employees/", response_model=schemas.Employee, status_code=201)
 def create_employee(emp: schemas.EmployeeCreate, db: Session = Depends(get_db)):
-    # Check email
-    db_emp = db.query(models.Employee).filter(models.Employee.email == emp.email).first()
-    if db_emp:
+    if db.query(models.Employee.id).filter(models.Employee.email == emp.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create Employee
-    new_emp = models.Employee(name=emp.name, email=emp.email, role=emp.role)
-    db.add(new_emp)
-    db.commit()
-    db.refresh(new_emp)
-    
-    # Handle Skills (Normalize)
-    for skill_name in emp.skills:
-        skill = db.query(models.Skill).filter(models.Skill.name == skill_name).first()
-        if not skill:
-            skill = models.Skill(name=skill_name)
-            db.add(skill)
-            db.commit()
-            db.refresh(skill)
-        new_emp.skills.append(skill)
-    
-    # Handle Unit Cost (Initial History)
-    initial_cost = models.UnitCost(employee_id=new_emp.id, amount=emp.unit_cost)
-    db.add(initial_cost)
-    
-    db.commit()
-    db.refresh(new_emp)
-    return new_emp
+    # Employee, skills and initial unit cost in one transaction (same path as bulk import, without its row checks)
+    result = ingest.bulk_create_employees(db, [(None, emp)], validate=False)
+    if result["errors"]:
+        raise HTTPException(status_code=400, detail=result["errors"][0]["detail"])
+    return db.query(models.Employee).filter(models.Employee.id == result["created"][0]).one()
+
+@app.post("/employees:bulk", response_model=schemas.BulkResult)
+def bulk_create_employees(rows: List[schemas.EmployeeCreate], db: Session = Depends(get_db)):
+    return ingest.bulk_create_employees(db, [(None, row) for row in rows])
+
+@app.post("/employees:import", response_model=schemas.BulkResult)
+def import_employees(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    # CSV: name,email,role,skills,unit_cost with skills separated by ';'
+    rows, parse_errors = ingest.parse_csv(file.file.read().decode("utf-8-sig"))
+    result = ingest.bulk_create_employees(db, rows)
+    result["errors"] = parse_errors + result["errors"]
+    return result
+
+@app.get("/employees/search", dependencies=[Depends(versions.conditional(*EMPLOYEE_TABLES))])
+def search_employees(q: str, limit: int = 20, fields: Optional[str] = None, offset: int = 0, db: Session = Depends(get_db)):
+    # e.g. ?q=+python +aws -junior react* (see app/skill_index.py for the syntax); page on with offset
+    hits = skill_index.search(db, q, limit=min(max(limit, 1), 500), offset=max(offset, 0))
+    if not hits:
+        return []
+    by_id = {emp["id"]: emp for emp in find_employees(
+        db, ids=[emp_id for emp_id, _ in hits],
+        fields=(["id"] + fields.split(",")) if fields else None
+    )}
+    return [{**by_id[emp_id], "score": score} for emp_id, score in hits if emp_id in by_id]
 
 @app.get("/employees/{employee_id}", response_model=schemas.Employee)
 def read_employee(employee_id: int, db: Session = Depends(get_db)):
@@ -46,9 +63,174 @@ def read_employee(employee_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Employee not found")
     return db_emp
 
-@app.get("/employees/", response_model=List[schemas.Employee])
-def list_employees(skill: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(models.Employee)
+EMPLOYEE_FIELDS = set(schemas.Employee.model_fields)
+
+def parse_ids(value: Optional[str], name: str) -> Optional[List[int]]:
+    # Comma separated integer lists, e.g. ?ids=1,2,3
+    if not value:
+        return None
+    try:
+        return [int(i) for i in value.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be comma separated integers")
+
+def find_employees(db: Session, ids: Optional[List[int]] = None, skill: Optional[str] = None,
+                   fields: Optional[List[str]] = None) -> List[dict]:
+    """Employees as dicts, optionally projected to `fields`, with related rows eager-loaded."""
+    fields = set(fields) if fields else None
+    if fields and not fields <= EMPLOYEE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(fields - EMPLOYEE_FIELDS))}")
+
+    query = db.query(models.Employee).order_by(models.Employee.id)
+    if ids is not None:
+        query = query.filter(models.Employee.id.in_(ids))
     if skill:
         query = query.join(models.Employee.skills).filter(models.Skill.name == skill)
-    return query.all()
+    # Only load the relationships the projection needs, each in one SELECT ... IN
+    if fields is None or "skills" in fields:
+        query = query.options(selectinload(models.Employee.skills))
+    if fields is None or "unit_cost" in fields:
+        query = query.options(selectinload(models.Employee.unit_costs))
+
+    return [
+        schemas.Employee.model_validate(emp, from_attributes=True).model_dump(mode="json", include=fields)
+        for emp in query.all()
+    ]
+
+@app.get("/employees/", dependencies=[Depends(versions.conditional(*EMPLOYEE_TABLES))])
+def list_employees(
+    skill: Optional[str] = None,
+    ids: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return find_employees(
+        db, ids=parse_ids(ids, "ids"), skill=skill,
+        fields=fields.split(",") if fields else None
+    )
+
+@app.post("/employees:batch")
+def batch_employees(batch: schemas.EmployeeBatch, db: Session = Depends(get_db)):
+    return find_employees(db, ids=batch.ids, fields=batch.fields)
+
+@app.get("/unit-costs", response_model=List[schemas.UnitCost], dependencies=[Depends(versions.conditional("unit_costs"))])
+def list_unit_costs(employee_ids: Optional[str] = None, db: Session = Depends(get_db)):
+    query = db.query(models.UnitCost)
+    if employee_ids:
+        query = query.filter(models.UnitCost.employee_id.in_(parse_ids(employee_ids, "employee_ids")))
+    return query.order_by(models.UnitCost.employee_id, models.UnitCost.start_date).all()
+
+@app.post("/employees/{employee_id}/unit-costs", response_model=schemas.UnitCost, status_code=201)
+def change_unit_cost(employee_id: int, change: schemas.UnitCostChange, db: Session = Depends(get_db)):
+    if not db.query(models.Employee.id).filter(models.Employee.id == employee_id).first():
+        raise HTTPException(status_code=404, detail="Employee not found")
+
+    history = db.query(models.UnitCost).filter(models.UnitCost.employee_id == employee_id).all()
+    if any(c.start_date >= change.start_date for c in history):
+        raise HTTPException(status_code=400, detail="New unit cost must start after the existing history")
+
+    # Close the currently open record the day before the new one starts
+    for c in history:
+        if c.end_date is None or c.end_date >= change.start_date:
+            c.end_date = change.start_date - timedelta(days=1)
+
+    new_cost = models.UnitCost(employee_id=employee_id, amount=change.amount, start_date=change.start_date)
+    db.add(new_cost)
+    db.commit()
+    db.refresh(new_cost)
+    return new_cost
+
+@app.post("/unit-costs:lookup", response_model=List[schemas.UnitCostLookup])
+def lookup_unit_costs(ranges: List[schemas.UnitCostRange], db: Session = Depends(get_db)):
+    # Piecewise cost segments per (employee_id, date range), served from the in-memory cache
+    return unit_cost_cache.lookup(db, ranges)
+
+def job_response(job: models.Job, reused: bool = False) -> dict:
+    return {
+        **{c: getattr(job, c) for c in ("id", "kind", "status", "progress", "message", "error", "created_at", "started_at", "finished_at")},
+        "params": json.loads(job.params or "{}"),
+        "reused": reused,
+    }
+
+@app.post("/jobs", response_model=schemas.Job, status_code=202)
+def create_job(req: schemas.JobCreate, db: Session = Depends(get_db)):
+    # e.g. {"kind": "import_employees", "params": {"csv": "..."}}; poll GET /jobs/{id}
+    try:
+        job, reused = jobs.submit(db, req.kind, req.params)
+    except jobs.UnknownJobKind as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_response(job, reused)
+
+@app.get("/jobs", response_model=List[schemas.Job])
+def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = db.query(models.Job).order_by(models.Job.created_at.desc())
+    if status:
+        query = query.filter(models.Job.status.in_(status.split(",")))
+    if kind:
+        query = query.filter(models.Job.kind == kind)
+    return [job_response(job) for job in query.limit(limit)]
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@app.get("/jobs/{job_id}/result")
+def read_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    return json.loads(job.result)
+
+@app.delete("/jobs/{job_id}", status_code=204)
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    if db.get(models.Job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not jobs.cancel(db, job_id):
+        raise HTTPException(status_code=409, detail="Job already started")
+    return Response(status_code=204)
+
+# --- Async variants ---------------------------------------------------------
+# Same responses on the async session (aiosqlite / asyncpg), so a request
+# waiting on the database holds no threadpool thread. Query building is
+# shared with the sync routes through run_sync.
+
+@app.get("/async/employees/search", dependencies=[Depends(versions.async_conditional(*EMPLOYEE_TABLES))])
+async def search_employees_async(q: str, limit: int = 20, fields: Optional[str] = None, offset: int = 0, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda s: search_employees(q, limit, fields, offset, s))
+
+@app.get("/async/employees/{employee_id}", response_model=schemas.Employee)
+async def read_employee_async(employee_id: int, db: AsyncSession = Depends(get_async_db)):
+    found = await db.run_sync(find_employees, ids=[employee_id])
+    if not found:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return found[0]
+
+@app.get("/async/employees/", dependencies=[Depends(versions.async_conditional(*EMPLOYEE_TABLES))])
+async def list_employees_async(
+    skill: Optional[str] = None,
+    ids: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(
+        find_employees, ids=parse_ids(ids, "ids"), skill=skill,
+        fields=fields.split(",") if fields else None
+    )
+
+@app.post("/async/employees:batch")
+async def batch_employees_async(batch: schemas.EmployeeBatch, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(find_employees, ids=batch.ids, fields=batch.fields)
+
+@app.post("/async/unit-costs:lookup", response_model=List[schemas.UnitCostLookup])
+async def lookup_unit_costs_async(ranges: List[schemas.UnitCostRange], db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(unit_cost_cache.lookup, ranges)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Date, DateTime, Float, Index, text
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import date
@@ -13,6 +13,15 @@ class Employee(Base):
     skills = relationship("Skill", secondary="employee_skills", back_populates="employees")
     unit_costs = relationship("UnitCost", back_populates="employee")
 
+    @property
+    def unit_cost(self):
+        # Amount of the record in force today (latest start on or before today)
+        today = date.today()
+        current = [c for c in self.unit_costs if c.start_date and c.start_date <= today]
+        if not current:
+            current = self.unit_costs
+        return max(current, key=lambda c: c.start_date or today).amount if current else None
+
 class Skill(Base):
     __tablename__ = "skills"
     id = Column(Integer, primary_key=True, index=True)
@@ -28,9 +37,40 @@ class EmployeeSkill(Base):
 class UnitCost(Base):
     __tablename__ = "unit_costs"
     id = Column(Integer, primary_key=True, index=True)
-    employee_id = Column(Integer, ForeignKey("employees.id"))
+    employee_id = Column(Integer, ForeignKey("employees.id"), index=True)
     amount = Column(Integer)
     start_date = Column(Date, default=date.today)
     end_date = Column(Date, nullable=True) # None means 'Current'
 
     employee = relationship("Employee", back_populates="unit_costs")
+
+class Job(Base):
+    # Background job queue and results (see app/jobs.py)
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+        # At most one queued or running job per key, so concurrent submits can't both queue it
+        Index("ix_jobs_active_key", "key", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+    id = Column(String, primary_key=True) # uuid4 hex
+    kind = Column(String, nullable=False)
+    params = Column(Text) # JSON
+    key = Column(String, index=True) # kind, params and read-table versions, for result reuse
+    status = Column(String, nullable=False, default="queued") # queued / running / succeeded / failed / cancelled
+    owner = Column(String) # host:pid:token of the process running it
+    heartbeat_at = Column(DateTime) # refreshed by the owner while running
+    progress = Column(Float, default=0.0)
+    message = Column(String)
+    result = Column(Text) # JSON
+    error = Column(Text)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class TableVersion(Base):
+    # Bumped in the same transaction as every write to `name` (see app/versions.py)
+    __tablename__ = "table_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -1,6 +1,6 @@
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime
 
 class SkillBase(BaseModel):
     name: str
@@ -15,6 +15,30 @@ class UnitCostBase(BaseModel):
     start_date: date
     end_date: Optional[date] = None
 
+class UnitCost(UnitCostBase):
+    id: int
+    employee_id: int
+
+    class Config:
+        orm_mode = True
+
+class UnitCostChange(BaseModel):
+    amount: int
+    start_date: date
+
+class UnitCostRange(BaseModel):
+    employee_id: int
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+class UnitCostSegment(BaseModel):
+    start_date: date
+    end_date: Optional[date] = None # None means 'Current'
+    amount: int
+
+class UnitCostLookup(UnitCostRange):
+    segments: List[UnitCostSegment]
+
 class EmployeeCreate(BaseModel):
     name: str
     email: str
@@ -28,6 +52,37 @@ class Employee(BaseModel):
     email: str
     role: str
     skills: List[Skill] = []
+    unit_cost: Optional[int] = None # Current monthly unit cost
     
     class Config:
         orm_mode = True
+
+class EmployeeBatch(BaseModel):
+    ids: List[int]
+    fields: Optional[List[str]] = None
+
+class BulkError(BaseModel):
+    index: Optional[int] = None # position in the JSON payload
+    line: Optional[int] = None # line in the uploaded file
+    detail: str
+
+class BulkResult(BaseModel):
+    created: List[int]
+    errors: List[BulkError]
+
+class JobCreate(BaseModel):
+    kind: str
+    params: dict = {}
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    params: dict = {}
+    status: str # queued / running / succeeded / failed / cancelled
+    progress: float = 0.0
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    reused: bool = False # an earlier identical job was returned
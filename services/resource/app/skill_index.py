@@ -0,0 +1,260 @@
+"""Inverted index over employee skills, roles and names for staffing search.
+
+Every term maps to a bitset (a Python int, bit i = i-th indexed employee) per
+field, so AND / OR / NOT are single big-int operations and prefix queries
+are a bisect over the sorted term list. Hits are ranked by field weight
+times inverse document frequency of each matched query term.
+
+Query syntax (`q`): whitespace separated terms, quotes for phrases.
+    +term    required        -term    excluded
+    term     optional (any)  term*    prefix match
+With no required terms, at least one optional term must match.
+
+Commits in this process re-index just the employees they touched. Writes
+from other processes (job workers, CLI imports) are noticed through the
+employee tables' versions (app/versions.py) and trigger a full rebuild;
+SKILL_INDEX_TTL remains the backstop.
+"""
+import heapq
+import math
+import os
+import re
+import shlex
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models, versions
+
+FIELD_WEIGHTS = {"skill": 3.0, "role": 2.0, "name": 1.0}
+TTL = float(os.getenv("SKILL_INDEX_TTL", 300))
+TABLES = ("employees", "skills", "employee_skills")
+
+_WORD = re.compile(r"\w+")
+
+
+def _terms(text: Optional[str]) -> Set[str]:
+    # The whole value (e.g. "project management") plus each of its words
+    if not text:
+        return set()
+    text = text.strip().lower()
+    return {text, *_WORD.findall(text)}
+
+
+class SkillIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.versions = None # table versions the index reflects
+        self._stale_ids: Optional[Set[int]] = set()
+        self._reset()
+
+    def _reset(self):
+        self.employee_ids: List[Optional[int]] = []
+        self.positions: Dict[int, int] = {}
+        self.docs: Dict[int, Dict[str, Set[str]]] = {} # position -> field -> terms
+        self.postings: Dict[str, Dict[str, int]] = {f: defaultdict(int) for f in FIELD_WEIGHTS}
+        self.sorted_terms: Dict[str, Optional[List[str]]] = {f: None for f in FIELD_WEIGHTS}
+        self.alive = 0 # bitset of indexed (not removed) employees
+
+    # --- maintenance -----------------------------------------------------
+
+    def mark_stale(self, employee_ids: Optional[Set[int]] = None):
+        """Re-index these employees on next use (None = rebuild everything)."""
+        with self._lock:
+            if employee_ids is None or self._stale_ids is None:
+                self._stale_ids = None
+            else:
+                self._stale_ids |= employee_ids
+
+    def _load(self, db: Session, employee_ids: Optional[Set[int]] = None) -> Dict[int, Dict[str, Set[str]]]:
+        employees = db.query(models.Employee.id, models.Employee.name, models.Employee.role)
+        skills = (
+            db.query(models.EmployeeSkill.employee_id, models.Skill.name)
+            .join(models.Skill, models.Skill.id == models.EmployeeSkill.skill_id)
+        )
+        if employee_ids is not None:
+            employees = employees.filter(models.Employee.id.in_(employee_ids))
+            skills = skills.filter(models.EmployeeSkill.employee_id.in_(employee_ids))
+        docs = {emp_id: {"name": _terms(name), "role": _terms(role), "skill": set()} for emp_id, name, role in employees}
+        for emp_id, skill_name in skills:
+            if emp_id in docs:
+                docs[emp_id]["skill"] |= _terms(skill_name)
+        return docs
+
+    def _remove(self, emp_id: int):
+        pos = self.positions.pop(emp_id, None)
+        if pos is None:
+            return
+        bit = 1 << pos
+        for field, terms in self.docs.pop(pos).items():
+            for term in terms:
+                self.postings[field][term] &= ~bit
+        self.alive &= ~bit
+        self.employee_ids[pos] = None
+
+    def _add(self, emp_id: int, doc: Dict[str, Set[str]]):
+        pos = len(self.employee_ids)
+        self.employee_ids.append(emp_id)
+        self.positions[emp_id] = pos
+        self.docs[pos] = doc
+        bit = 1 << pos
+        for field, terms in doc.items():
+            for term in terms:
+                if term not in self.postings[field]:
+                    self.sorted_terms[field] = None
+                self.postings[field][term] |= bit
+        self.alive |= bit
+
+    def refresh(self, db: Session):
+        state = versions.current(db, TABLES)
+        with self._lock:
+            expired = self.built_at is None or time.monotonic() - self.built_at > TTL
+            stale = self._stale_ids
+            # Versions moved with nothing marked here: another process wrote
+            foreign = state != self.versions and stale is not None and not stale
+            if not expired and not foreign and stale is not None and not stale:
+                return
+            if expired or foreign or stale is None or len(self.docs) == 0:
+                self._reset()
+                for emp_id, doc in self._load(db).items():
+                    self._add(emp_id, doc)
+                self.built_at = time.monotonic()
+            else:
+                docs = self._load(db, stale)
+                for emp_id in stale:
+                    self._remove(emp_id)
+                    if emp_id in docs:
+                        self._add(emp_id, docs[emp_id])
+            self._stale_ids = set()
+            self.versions = state
+
+    # --- querying --------------------------------------------------------
+
+    def _field_matches(self, field: str, term: str) -> int:
+        postings = self.postings[field]
+        if not term.endswith("*"):
+            return postings.get(term, 0)
+        prefix = term[:-1]
+        if self.sorted_terms[field] is None:
+            self.sorted_terms[field] = sorted(postings)
+        terms = self.sorted_terms[field]
+        bits = 0
+        for i in range(bisect_left(terms, prefix), len(terms)):
+            if not terms[i].startswith(prefix):
+                break
+            bits |= postings[terms[i]]
+        return bits
+
+    def _matches(self, term: str) -> Dict[str, int]:
+        return {field: self._field_matches(field, term) for field in FIELD_WEIGHTS}
+
+    def search(self, db: Session, q: str, limit: int = 20, offset: int = 0) -> List[Tuple[int, float]]:
+        """[(employee_id, score), ...] best first, skipping the best `offset`."""
+        required, optional, excluded = parse_query(q)
+        self.refresh(db)
+        with self._lock:
+            total = max(_popcount(self.alive), 1)
+            scored_terms = []
+            result = self.alive
+            for term in required:
+                by_field = self._matches(term)
+                any_field = 0
+                for bits in by_field.values():
+                    any_field |= bits
+                result &= any_field
+                scored_terms.append(by_field)
+            if optional:
+                any_optional = 0
+                for term in optional:
+                    by_field = self._matches(term)
+                    for bits in by_field.values():
+                        any_optional |= bits
+                    scored_terms.append(by_field)
+                if not required:
+                    result &= any_optional
+            for term in excluded:
+                for bits in self._matches(term).values():
+                    result &= ~bits
+            if not required and not optional:
+                result = 0
+
+            scores = dict.fromkeys(_positions(result), 0.0)
+            for by_field in scored_terms:
+                for field, bits in by_field.items():
+                    hit = bits & result
+                    if hit:
+                        weight = FIELD_WEIGHTS[field] * math.log(1 + total / _popcount(bits))
+                        for pos in _positions(hit):
+                            scores[pos] += weight
+            best = heapq.nsmallest(offset + limit, scores.items(), key=lambda kv: (-kv[1], self.employee_ids[kv[0]]))[offset:]
+            return [(self.employee_ids[pos], round(score, 4)) for pos, score in best]
+
+
+def _popcount(bits: int) -> int:
+    return bits.bit_count()
+
+
+def _positions(bits: int) -> List[int]:
+    # Set bit positions; str.find skips runs of zeros in C
+    digits = bin(bits)[:1:-1]
+    positions = []
+    pos = digits.find("1")
+    while pos != -1:
+        positions.append(pos)
+        pos = digits.find("1", pos + 1)
+    return positions
+
+
+def parse_query(q: str) -> Tuple[List[str], List[str], List[str]]:
+    required, optional, excluded = [], [], []
+    try:
+        tokens = shlex.split(q or "")
+    except ValueError:
+        tokens = (q or "").split()
+    for token in tokens:
+        target = optional
+        if token[:1] == "+":
+            target, token = required, token[1:]
+        elif token[:1] == "-":
+            target, token = excluded, token[1:]
+        token = token.strip().lower()
+        if token and token != "*":
+            target.append(token)
+    return required, optional, excluded
+
+
+index = SkillIndex()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changed = session.info.setdefault("skill_index_changes", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Employee):
+            changed.add(obj.id)
+        elif isinstance(obj, models.EmployeeSkill):
+            changed.add(obj.employee_id)
+        elif isinstance(obj, models.Skill) and obj not in session.new:
+            # Renamed / removed skill: affects every holder
+            session.info["skill_index_full"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_stale_on_commit(session):
+    changed = session.info.pop("skill_index_changes", None)
+    if session.info.pop("skill_index_full", False):
+        index.mark_stale(None)
+    elif changed:
+        index.mark_stale(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("skill_index_changes", None)
+    session.info.pop("skill_index_full", None)
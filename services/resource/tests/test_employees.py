@@ -1,9 +1,11 @@
 import pytest
+import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app, get_db
-from app.database import Base
+from app.database import Base, get_async_db
 
 # Test DB Setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_resource.db"
@@ -32,6 +34,17 @@ def override_get_db(db_session):
     yield
     app.dependency_overrides.clear()
 
+@pytest_asyncio.fixture
+async def override_get_async_db(override_get_db):
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test_resource.db")
+    TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async def _get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    app.dependency_overrides[get_async_db] = _get_async_db
+    yield
+    await async_engine.dispose()
+
 @pytest.mark.asyncio
 async def test_create_employee_with_skills(override_get_db):
     from httpx import ASGITransport
@@ -75,3 +88,237 @@ async def test_search_employee_by_skill(override_get_db):
     data = response.json()
     assert len(data) == 1
     assert data[0]["name"] == "Pythonista"
+
+@pytest.mark.asyncio
+async def test_list_unit_costs_by_employee(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        ids = []
+        for i, cost in enumerate([500000, 900000]):
+            resp = await ac.post("/employees/", json={
+                "name": f"Emp {i}", "email": f"emp{i}@example.com", "role": "Dev",
+                "skills": [], "unit_cost": cost
+            })
+            ids.append(resp.json()["id"])
+
+        response = await ac.get("/unit-costs", params={"employee_ids": str(ids[1])})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [(c["employee_id"], c["amount"], c["end_date"]) for c in data] == [(ids[1], 900000, None)]
+
+def test_install_adds_indexes_missing_from_older_databases(db_session):
+    from sqlalchemy import inspect
+    from app import cost_cache
+    engine = db_session.get_bind()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_unit_costs_employee_id")
+    with engine.begin() as conn:
+        cost_cache.install(conn)
+    assert "ix_unit_costs_employee_id" in {i["name"] for i in inspect(engine).get_indexes("unit_costs")}
+
+@pytest.mark.asyncio
+async def test_unit_cost_lookup_returns_segments_and_sees_changes(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        resp = await ac.post("/employees/", json={
+            "name": "Costed", "email": "cost@example.com", "role": "Dev", "skills": [], "unit_cost": 500000
+        })
+        emp_id = resp.json()["id"]
+        await ac.post(f"/employees/{emp_id}/unit-costs", json={"amount": 600000, "start_date": "2099-01-01"})
+
+        lookup = [{"employee_id": emp_id, "start_date": "2098-12-01", "end_date": "2099-03-31"}]
+        resp = await ac.post("/unit-costs:lookup", json=lookup)
+        assert resp.status_code == 200
+        assert resp.json()[0]["segments"] == [
+            {"start_date": "2098-12-01", "end_date": "2098-12-31", "amount": 500000},
+            {"start_date": "2099-01-01", "end_date": "2099-03-31", "amount": 600000},
+        ]
+
+        # A new cost record invalidates the cached history
+        await ac.post(f"/employees/{emp_id}/unit-costs", json={"amount": 700000, "start_date": "2099-03-01"})
+        resp = await ac.post("/unit-costs:lookup", json=lookup)
+        assert [s["amount"] for s in resp.json()[0]["segments"]] == [500000, 600000, 700000]
+        assert resp.json()[0]["segments"][1]["end_date"] == "2099-02-28"
+
+        resp = await ac.post(f"/employees/{emp_id}/unit-costs", json={"amount": 1, "start_date": "2099-02-01"})
+        assert resp.status_code == 400
+
+@pytest.mark.asyncio
+async def test_bulk_employee_lookup_with_projection(override_get_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        ids = []
+        for i in range(4):
+            resp = await ac.post("/employees/", json={
+                "name": f"Member {i}", "email": f"m{i}@example.com", "role": "Dev",
+                "skills": ["Python"], "unit_cost": 500000 + i
+            })
+            ids.append(resp.json()["id"])
+
+        response = await ac.get("/employees/", params={"ids": f"{ids[0]},{ids[2]}"})
+        assert [(e["name"], e["unit_cost"], len(e["skills"])) for e in response.json()] == [
+            ("Member 0", 500000, 1), ("Member 2", 500002, 1)
+        ]
+
+        response = await ac.post("/employees:batch", json={"ids": ids[1:], "fields": ["id", "name"]})
+        assert response.json() == [{"id": ids[i], "name": f"Member {i}"} for i in (1, 2, 3)]
+
+        response = await ac.post("/employees:batch", json={"ids": ids, "fields": ["salary"]})
+        assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_skill_search_boolean_prefix_and_ranking(override_get_db):
+    from httpx import ASGITransport
+    from app.skill_index import index
+    index.mark_stale(None) # forget employees from earlier test databases
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        people = [
+            ("Aoki", "Backend Engineer", ["Python", "AWS"]),
+            ("Baba", "Python Trainer", ["Java"]),
+            ("Chiba", "Frontend Engineer", ["React", "TypeScript"]),
+            ("Doi", "Engineer", ["Python", "Project Management"]),
+        ]
+        ids = {}
+        for i, (name, role, skills) in enumerate(people):
+            resp = await ac.post("/employees/", json={
+                "name": name, "email": f"s{i}@example.com", "role": role, "skills": skills, "unit_cost": 1
+            })
+            ids[name] = resp.json()["id"]
+
+        async def search(q, **params):
+            resp = await ac.get("/employees/search", params={"q": q, **params})
+            assert resp.status_code == 200
+            return [e["name"] for e in resp.json()]
+
+        # Skill match outranks a role match
+        assert await search("python") == ["Aoki", "Doi", "Baba"]
+        assert await search("python", limit=2, offset=1) == ["Doi", "Baba"]
+        assert await search("+python +aws") == ["Aoki"]
+        assert await search("+python -aws") == ["Doi", "Baba"]
+        assert await search("react java") == ["Baba", "Chiba"]
+        assert await search("type*") == ["Chiba"]
+        assert await search('"project management"') == ["Doi"]
+        assert await search("+engineer -python", fields="name") == ["Chiba"]
+
+        # Index follows writes
+        await ac.post("/employees/", json={
+            "name": "Endo", "email": "s9@example.com", "role": "Dev", "skills": ["AWS"], "unit_cost": 1
+        })
+        assert await search("+aws") == ["Aoki", "Endo"]
+
+@pytest.mark.asyncio
+async def test_async_routes_match_sync_routes(override_get_async_db):
+    from httpx import ASGITransport
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        emp_id = (await ac.post("/employees/", json={
+            "name": "Async", "email": "async@example.com", "role": "Dev", "skills": ["Go"], "unit_cost": 450000
+        })).json()["id"]
+
+        for method, path, body in [
+            ("GET", f"/employees/{emp_id}", None),
+            ("GET", f"/employees/?ids={emp_id}&fields=id,name,skills", None),
+            ("GET", "/employees/search?q=%2Bgo", None),
+            ("POST", "/employees:batch", {"ids": [emp_id], "fields": ["id", "unit_cost"]}),
+            ("POST", "/unit-costs:lookup", [{"employee_id": emp_id}]),
+        ]:
+            sync = await ac.request(method, path, json=body)
+            async_ = await ac.request(method, f"/async{path}", json=body)
+            assert async_.status_code == 200, path
+            assert async_.json() == sync.json()
+
+        assert (await ac.get("/async/employees/999")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_bulk_employee_import_reports_row_errors(override_get_db, db_session):
+    from httpx import ASGITransport
+    from app import models
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        await ac.post("/employees/", json={
+            "name": "Existing", "email": "taken@example.com", "role": "PM", "skills": ["SAP"], "unit_cost": 1
+        })
+        person = lambda i, **kw: {"name": f"New {i}", "email": f"new{i}@example.com", "role": "Dev",
+                                  "skills": ["SAP", "Python"], "unit_cost": 500000, **kw}
+        resp = await ac.post("/employees:bulk", json=[
+            person(0),
+            person(1, email="taken@example.com"),
+            person(2, unit_cost=-1),
+            person(3),
+            person(4, email="new3@example.com"),
+        ])
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(data["created"]) == 2
+        assert [e["index"] for e in data["errors"]] == [1, 2, 4]
+        resp = await ac.post("/employees:bulk", json=[person(5, email="no-at-sign")])
+        assert resp.json()["errors"][0]["detail"] == "Invalid email 'no-at-sign'"
+
+        # Single create keeps its original checks: only duplicate emails are refused
+        assert (await ac.post("/employees/", json=person(5, email="no-at-sign"))).status_code == 201
+        resp = await ac.post("/employees/", json=person(6, email="taken@example.com"))
+        assert (resp.status_code, resp.json()["detail"]) == (400, "Email already registered")
+
+        csv_body = (
+            "name,email,role,skills,unit_cost\n"
+            "Csv A,csv.a@example.com,Dev,Python;Rust,450000\n"
+            "Csv B,csv.b@example.com,Dev,,not-a-number\n"
+        )
+        resp = await ac.post("/employees:import", files={"file": ("hr.csv", csv_body, "text/csv")})
+        data = resp.json()
+        assert len(data["created"]) == 1
+        assert [e["line"] for e in data["errors"]] == [3]
+
+        resp = await ac.get(f"/employees/{data['created'][0]}")
+        assert sorted(s["name"] for s in resp.json()["skills"]) == ["Python", "Rust"]
+        assert resp.json()["unit_cost"] == 450000
+        # Each skill exists once however many rows named it
+        assert sorted(name for (name,) in db_session.query(models.Skill.name)) == ["Python", "Rust", "SAP"]
+        assert [e["name"] for e in (await ac.get("/employees/search", params={"q": "+rust"})).json()] == ["Csv A"]
+
+@pytest.mark.asyncio
+async def test_import_job_runs_in_background_and_refreshes_search(override_get_db, db_session):
+    from httpx import ASGITransport
+    from app import jobs
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        csv_text = (
+            "name,email,role,skills,unit_cost\n"
+            "Job Jiro,jiro@example.com,Engineer,Rust;Go,700000\n"
+            "Bad Row,bad@example.com,Engineer,Go,lots\n"
+        )
+        assert (await ac.get("/employees/search", params={"q": "rust"})).json() == []
+        # Caches the (empty) cost history of the id the import is about to create
+        lookup = [{"employee_id": 1, "start_date": "2000-01-01", "end_date": "2999-12-31"}]
+        assert (await ac.post("/unit-costs:lookup", json=lookup)).json()[0]["segments"] == []
+        resp = await ac.post("/jobs", json={"kind": "import_employees", "params": {"csv": csv_text}})
+        assert resp.status_code == 202
+        job = resp.json()
+        assert job["status"] == "queued"
+
+        assert jobs.run_next(db_session) == job["id"]
+        done = (await ac.get(f"/jobs/{job['id']}")).json()
+        assert done["status"] == "succeeded"
+        result = (await ac.get(f"/jobs/{job['id']}/result")).json()
+        assert len(result["created"]) == 1 and result["errors"][0]["line"] == 3
+        assert result["created"] == [1]
+        # The job may have run in a worker process; the API's cost cache notices through the table versions
+        segments = (await ac.post("/unit-costs:lookup", json=lookup)).json()[0]["segments"]
+        assert [s["amount"] for s in segments] == [700000]
+
+        hits = (await ac.get("/employees/search", params={"q": "rust"})).json()
+        assert [h["name"] for h in hits] == ["Job Jiro"]
+
+        # Written by another process (a job worker): picked up through the table versions
+        from app import ingest
+        rows, _ = ingest.parse_csv("name,email,role,skills,unit_cost\nKoga,koga@example.com,Dev,Rust,1\n")
+        ingest.bulk_create_employees(db_session, rows, commit=False)
+        db_session.commit()
+        hits = (await ac.get("/employees/search", params={"q": "rust"})).json()
+        assert sorted(h["name"] for h in hits) == ["Job Jiro", "Koga"]
+        assert (await ac.post("/jobs", json={"kind": "pnl"})).status_code == 400